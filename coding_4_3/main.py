@@ -1,5 +1,8 @@
 import tkinter as tk
 
+# Лог событий — своя копия exam/log_panel.py, упражнение запускается само по себе
+from log_panel import ERROR, NOTICE, WARNING, LogPanel
+
 root = tk.Tk()
 root.title("UAS Control Module")
 root.geometry("600x400")
@@ -9,20 +12,19 @@ root.configure(bg="#2b2b2b")
 def check_systems():
     system_ok = True
     # Исправленная логика проверки
-    log_listbox.insert(tk.END, f"Проверка батареи: {battery_cells}")
+    log_panel.log(f"Проверка батареи: {battery_cells}")
     for voltage in battery_cells:
         if voltage < 4.0:
-            log_listbox.insert(tk.END, f"Low voltage: {voltage}")
+            log_panel.log(f"Low voltage: {voltage}", WARNING)
             system_ok = False
             break
         else:
-            log_listbox.insert(tk.END, "Cell OK")
+            log_panel.log("Cell OK")
+    # Цвет строки задаёт важность: NOTICE — зелёный, ERROR — красный
     if system_ok:
-        log_listbox.insert(tk.END, "Статус: ГОТОВ К АРМИНГУ")
-        log_listbox.itemconfig(tk.END, fg="green")
+        log_panel.log("Статус: ГОТОВ К АРМИНГУ", NOTICE)
     else:
-        log_listbox.insert(tk.END, "Статус: ОШИБКА БАТАРЕИ")
-        log_listbox.itemconfig(tk.END, fg="red")
+        log_panel.log("Статус: ОШИБКА БАТАРЕИ", ERROR)
 
 
 # Фреймы
@@ -51,20 +53,16 @@ btn_check.pack(pady=5, fill="x")  # Исправлено: Кнопки выст
 # Кнопка Арминга
 btn_arm = tk.Button(control_frame, text="2. ARM", bg="red", fg="white")
 btn_arm.pack(pady=5, fill="x")  # Исправлено: Кнопки выстроены вертикально
-# Добавляем Listbox и Scrollbar в log_frame
-log_listbox = tk.Listbox(log_frame, bg="#2b2b2b", fg="white")
-log_scrollbar = tk.Scrollbar(
-    log_frame, orient="vertical", command=log_listbox.yview)
-log_listbox.config(yscrollcommand=log_scrollbar.set)
-
-# Размещаем Listbox и Scrollbar в log_frame
-log_listbox.pack(side="left", fill="both", expand=True)
-log_scrollbar.pack(side="right", fill="y")
+# Журнал событий в log_frame: Listbox со своей полосой прокрутки.
+# Строки хранятся в кольцевом буфере (не больше capacity), в Listbox
+# попадают только видимые rows строк, раз в кадр — журнал не растёт
+# и не тормозит окно даже при тысячах сообщений в секунду
+log_panel = LogPanel(log_frame, capacity=5000, rows=20, bg="#2b2b2b")
+log_panel.pack(fill="both", expand=True)
 
-# Добавляем "рыбу" текста в listbox для демонстрации скролла
+# Добавляем "рыбу" текста в журнал для демонстрации скролла
 # for i in range(1, 51):
-#     log_listbox.insert(
-#         tk.END, f"Сообщение лога №{i}: Система работает нормально")
+#     log_panel.log(f"Сообщение лога №{i}: Система работает нормально")
 
 battery_cells = [4.15, 4.20, 4.50, 4.18]  # 3.50 - это сбойная ячейка
 
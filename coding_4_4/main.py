@@ -1,12 +1,26 @@
+import sys
 import tkinter as tk
 from tkinter import messagebox
 import time
 
+# Лог событий — своя копия exam/log_panel.py, упражнение запускается само по себе
+from log_panel import ERROR, INFO, NOTICE, LogPanel
+
+# Высота взлёта, м
+TAKEOFF_ALT_M = 50
+# Минимальный остаток батареи для ARM в режиме с аппаратом, %
+MIN_BATTERY_PCT = 30
+
 
 class DroneApp:
 
-    def __init__(self, root):
+    def __init__(self, root, master=None, state=None):
+        # master/state заданы — кнопки управляют аппаратом (см. connect_live),
+        # иначе работает имитация
         self.root = root
+        self.master = master
+        self.state = state
+        self.bridge = None
         self.root.title("Cистема проверки")
         self.root.geometry("400x500")
         self.root.configure(bg="#2b2b2b")
@@ -22,10 +36,9 @@ class DroneApp:
         self.lbl_status = tk.Label(root, textvariable=self.status_var,
                                    font=("Consolas", 14, "bold"), bg="#2b2b2b", fg="white")
         self.lbl_status.pack(pady=20)
-        # Лог событий
-        self.log_list = tk.Listbox(
-            root, height=10, width=40, bg="#3c3c3c", fg="white")
-        self.log_list.pack(pady=10)
+        # Лог событий: кольцевой буфер, в Listbox только видимые строки
+        self.log_panel = LogPanel(root, capacity=2000, rows=10, width=40)
+        self.log_panel.pack(pady=10)
         # Кнопки
         # Проверка систем
         self.btn_check = tk.Button(root, text="1. ПРОВЕРКА СИСТЕМ", width=30,
@@ -43,12 +56,13 @@ class DroneApp:
         self.btn_land = tk.Button(root, text="4. LAND", width=30, command=self.land_vehicle,
                                   bg="#505050", fg="white")
         self.btn_land.pack(pady=20)
+        if master is not None:
+            self.connect_live()
     # Логика
 
-    def log(self, message):
-        # Добавляет сообщение в список событий
-        self.log_list.insert(tk.END, f">> {message}")
-        self.log_list.yview(tk.END)
+    def log(self, message, severity=INFO):
+        # Добавляет сообщение в журнал (на экране — на ближайшем кадре)
+        self.log_panel.log(f">> {message}", severity)
 
     def check_systems(self):
         # Прверка заряда батареи
@@ -58,7 +72,7 @@ class DroneApp:
         for voltage in self.battery_cells:
             if voltage < 3.5:
                 check_result = False
-                self.log(f"ОШИБКА: Ячейка {voltage}V разряжена!")
+                self.log(f"ОШИБКА: Ячейка {voltage}V разряжена!", ERROR)
                 break
             # Здесь не хватает команды, которая прервет проверку или пометит сбой
             else:
@@ -67,7 +81,7 @@ class DroneApp:
         if check_result == True:
             self.is_system_checked = True
             self.status_var.set("СТАТУС: ГОТОВ")
-            self.log("Система исправна.")
+            self.log("Система исправна.", NOTICE)
         else:
             self.is_system_checked = False
             self.status_var.set("СТАТУС: ОШИБКА ПИТАНИЯ")
@@ -77,7 +91,7 @@ class DroneApp:
         # ЗАДАНИЕ 2
         # (Напишите здесь код if/return)
         if self.is_system_checked == False:
-            self.log("Ошибка. Сначала выполните проверку")
+            self.log("Ошибка. Сначала выполните проверку", ERROR)
             return
         self.is_armed = True
         self.status_var.set("СТАТУС: ARMED")
@@ -90,7 +104,7 @@ class DroneApp:
         # Добавьте проверку: если self.is_armed равно False, запретить взлет.
         # (Напишите здесь код проверки)
         if self.is_armed == False:
-            self.log("Ошибка. Дрон не запущен")
+            self.log("Ошибка. Дрон не запущен", ERROR)
             return
         self.current_altitude = 50
         self.status_var.set(f"СТАТУС: ПОЛЕТ (Высота {self.current_altitude}м)")
@@ -109,8 +123,129 @@ class DroneApp:
             self.log("Дрон уже на земле.")
 
 
+    # Работа с аппаратом
+    # Tk нельзя трогать из потока MAVLink: статус перерисовывает
+    # TelemetryBridge раз в кадр по последнему снимку DroneState,
+    # а команды выполняются вне потока Tk (они ждут COMMAND_ACK).
+
+    def connect_live(self):
+        import flight_control
+        from stream_rates import StreamRateManager
+        from ui_bridge import TelemetryBridge
+
+        self.flight_control = flight_control
+        # Частоты телеметрии по фазам полёта: взлёт и посадка — "precision",
+        # после набора высоты взлёта — "cruise"
+        self.rates = StreamRateManager(self.master)
+        self.bridge = TelemetryBridge(self.root, self.state, fps=20)
+        self.bridge.bind(self.render)
+        self.btn_check.config(command=self.check_live)
+        self.btn_arm.config(command=self.arm_live)
+        self.btn_takeoff.config(command=self.takeoff_live)
+        self.btn_land.config(command=self.land_live)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.log_panel.attach(self.master)   # STATUSTEXT автопилота
+        self.bridge.start()
+
+    def render(self, snapshot):
+        # Вызывается мостом в потоке Tk, не чаще 20 раз в секунду
+        self.is_armed = snapshot.armed
+        self.current_altitude = snapshot.alt_rel_m
+        if not snapshot.armed:
+            status = "DISARMED"
+        elif snapshot.alt_rel_m > 0.5:
+            status = f"ПОЛЕТ (Высота {snapshot.alt_rel_m:.0f}м)"
+        else:
+            status = "ARMED"
+        self.status_var.set(f"СТАТУС: {status} {snapshot.mode} "
+                            f"{snapshot.battery_voltage_v:.1f}V")
+        self.btn_arm.config(bg="green" if snapshot.armed else "red")
+
+    def command(self, name, fn, *args):
+        # Кнопка не блокирует окно: команда уходит в поток моста
+        self.log(f"{name}...")
+        self.bridge.run(fn, *args,
+                        on_done=lambda ack: self.log(f"{name}: принято"),
+                        on_error=lambda error: self.log(f"ОШИБКА {name}: {error}", ERROR))
+
+    def check_live(self):
+        snapshot = self.state.snapshot()
+        if snapshot.recv_time == 0:
+            self.is_system_checked = False
+            self.log("ОШИБКА: Нет телеметрии от аппарата!", ERROR)
+            return
+        if snapshot.battery_remaining_pct < MIN_BATTERY_PCT:
+            self.is_system_checked = False
+            self.status_var.set("СТАТУС: ОШИБКА ПИТАНИЯ")
+            self.log(f"ОШИБКА: Батарея {snapshot.battery_remaining_pct:.0f}%!", ERROR)
+            return
+        self.is_system_checked = True
+        self.log(f"Батарея {snapshot.battery_voltage_v:.1f}V "
+                 f"({snapshot.battery_remaining_pct:.0f}%) - Норма")
+
+    def arm_live(self):
+        if self.is_system_checked == False:
+            self.log("Ошибка. Сначала выполните проверку", ERROR)
+            return
+
+        def arm():
+            self.flight_control.set_mode_guided(self.master, self.state)
+            return self.flight_control.arm(self.master)
+        self.command("ARM", arm)
+
+    def takeoff_live(self):
+        if self.is_armed == False:
+            self.log("Ошибка. Дрон не запущен", ERROR)
+            return
+
+        def takeoff():
+            return self.flight_control.takeoff(self.master, TAKEOFF_ALT_M,
+                                              rates=self.rates, state=self.state)
+        self.command("TAKEOFF", takeoff)
+
+    def land_live(self):
+        def land():
+            return self.flight_control.land(self.master, rates=self.rates)
+        self.command("LAND", land)
+
+    def close(self):
+        self.rates.detach()
+        self.bridge.stop()
+        self.root.destroy()
+
+
+def connect_live(connection_string):
+    """
+    Подключение к аппарату и фоновый monitor_loop.
+    Возвращает (master, state) или (None, None), если аппарат не ответил.
+    Режим с аппаратом использует модули exam/ (drone_monitor, flight_control,
+    ui_bridge, ...): их каталог должен быть в PYTHONPATH.
+    """
+    import threading
+    try:
+        from drone_monitor import DroneState, monitor_loop
+        from return_base import connect
+    except ImportError as error:
+        sys.exit(f"Режим с аппаратом требует модули exam/ в PYTHONPATH "
+                 f"(PYTHONPATH=../exam python main.py {connection_string}): {error}")
+
+    master = connect(connection_string)
+    if master is None:
+        return None, None
+    state = DroneState()
+    threading.Thread(target=monitor_loop, args=(master, state), daemon=True).start()
+    return master, state
+
+
 # Запуск приложения
+# python main.py                              — имитация
+# PYTHONPATH=../exam python main.py tcp:127.0.0.1:14550 — управление аппаратом (SITL)
 if __name__ == "__main__":
+    master, state = None, None
+    if len(sys.argv) > 1:
+        master, state = connect_live(sys.argv[1])
+        if master is None:
+            sys.exit(f"Нет HEARTBEAT от {sys.argv[1]}")
     root = tk.Tk()
-    app = DroneApp(root)
+    app = DroneApp(root, master, state)
     root.mainloop()
@@ -14,6 +14,9 @@ from pyproj import Geod               # Точные геодезические
 # from flight_control import set_mode_guided
 # Математические функции (гипотенуза, углы)
 import math
+import time
+
+import numpy as np  # векторные расчёты для больших миссий
 
 # Для расчета координат
 geod = Geod(ellps="WGS84")  # ellps="WGS84" = стандарт Земли для GPS
@@ -145,6 +148,128 @@ def add_waypoint_offset_m(
     return lat_new, lon_new  # опционально можно использовать снаружи
 
 
+def offsets_to_latlon(base_lat_deg: float,
+                      base_lon_deg: float,
+                      north_m,
+                      east_m):
+    """
+    Пересчитать массивы смещений (север/восток, м) от базовой точки
+    в массивы lat/lon (градусы) одним векторным вызовом geod.fwd.
+    Возвращает (lat_deg, lon_deg) — массивы numpy.
+    """
+    north, east = np.broadcast_arrays(
+        np.asarray(north_m, dtype=np.float64),
+        np.asarray(east_m, dtype=np.float64),
+    )
+
+    # Те же формулы, что в add_waypoint_offset_m, но сразу для всех точек.
+    # arctan2(0, 0) = 0, поэтому точка без смещения получает азимут 0°.
+    distance = np.hypot(north, east)
+    azimuth_deg = np.degrees(np.arctan2(east, north))
+
+    lon_new, lat_new, _ = geod.fwd(
+        np.full(distance.shape, base_lon_deg),
+        np.full(distance.shape, base_lat_deg),
+        azimuth_deg,
+        distance,
+    )
+    return lat_new, lon_new
+
+
+def add_waypoints_latlon(
+    wp_loader: mavwp.MAVWPLoader,
+    master: mavutil.mavfile,
+    lat_deg,
+    lon_deg,
+    alt_m,
+    current_seq: int = None,
+    frame: int = None,
+    command: int = None,
+) -> mavwp.MAVWPLoader:
+    """
+    Пакетный вариант add_waypoint_latlon: добавить в конец wp_loader
+    точки из массивов lat_deg/lon_deg/alt_m (alt_m может быть числом).
+    current_seq: номер точки (внутри этого пакета), которая получит current=1.
+    """
+    if frame is None:
+        frame = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
+    if command is None:
+        command = mavutil.mavlink.MAV_CMD_NAV_WAYPOINT
+
+    lat, lon, alt = np.broadcast_arrays(
+        np.asarray(lat_deg, dtype=np.float64),
+        np.asarray(lon_deg, dtype=np.float64),
+        np.asarray(alt_m, dtype=np.float64),
+    )
+
+    # degE7 для всех точек сразу; trunc — как int() в add_waypoint_latlon
+    lat_int = np.trunc(lat.ravel() * 1e7).astype(np.int64).tolist()
+    lon_int = np.trunc(lon.ravel() * 1e7).astype(np.int64).tolist()
+    alt_list = alt.ravel().tolist()
+
+    target_system = master.target_system
+    target_component = master.target_component
+    item_cls = mavutil.mavlink.MAVLink_mission_item_int_message
+    first_seq = wp_loader.count()
+
+    items = [
+        item_cls(
+            target_system, target_component,
+            first_seq + i,                  # seq сразу правильный
+            frame, command,
+            1 if i == current_seq else 0,   # current
+            1,                              # autocontinue
+            0, 0, 0, 0,
+            lat_i, lon_i, alt_i,
+        )
+        for i, (lat_i, lon_i, alt_i) in enumerate(zip(lat_int, lon_int, alt_list))
+    ]
+
+    # MAVWPLoader.add(list) делает deepcopy каждой точки и переписывает seq —
+    # для тысяч точек это дороже самой геодезии. Точки созданы здесь же
+    # и уже пронумерованы, поэтому добавляем их в список загрузчика напрямую.
+    wp_loader.wpoints.extend(items)
+    wp_loader.last_change = time.time()
+    return wp_loader
+
+
+def build_mission_from_offsets(
+    master: mavutil.mavfile,
+    base_lat_deg: float,
+    base_lon_deg: float,
+    north_m,
+    east_m,
+    alt_m,
+    wp_loader: mavwp.MAVWPLoader = None,
+    current_seq: int = None,
+    frame: int = None,
+    command: int = None,
+) -> mavwp.MAVWPLoader:
+    """
+    Построить миссию из массивов смещений в метрах от базовой точки.
+
+    north_m, east_m, alt_m — массивы одинаковой длины (или числа);
+    расчёт координат выполняется одним вызовом geod.fwd, перевод в degE7 —
+    одной операцией numpy, а загрузчик заполняется за один проход.
+    Если wp_loader не передан, создаётся новый MAVWPLoader.
+    """
+    if wp_loader is None:
+        wp_loader = mavwp.MAVWPLoader()
+
+    lat, lon = offsets_to_latlon(base_lat_deg, base_lon_deg, north_m, east_m)
+
+    return add_waypoints_latlon(
+        wp_loader,
+        master,
+        lat,
+        lon,
+        alt_m,
+        current_seq=current_seq,
+        frame=frame,
+        command=command,
+    )
+
+
 def build_mission(master, lat_deg, lon_deg, alt_m=15.0):
     """
     Создаем список точек полета
@@ -0,0 +1,348 @@
+# async_link.py
+#
+# MAVLink на asyncio: одно событийное кольцо (event loop) обслуживает
+# десятки аппаратов без отдельного потока мониторинга на каждый.
+# Байты из сокета разбирает тот же парсер pymavlink, а сообщения проходят
+# через те же обработчики DroneState (drone_monitor.process_message).
+#
+#   link = await connect("tcp:127.0.0.1:14550")
+#   await link.set_mode("GUIDED")
+#   await link.arm()
+#   print(link.state.snapshot())
+#
+# Запуск из папки exam (несколько аппаратов в одном потоке):
+#   python async_link.py tcp:127.0.0.1:14550 tcp:127.0.0.1:14560
+
+import argparse
+import asyncio
+import time
+
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+from command_ack import CommandAttempts, CommandError, CommandStats, send_command_long
+from drone_monitor import DroneState, process_message, registry as default_registry, request_home_position
+from flight_control import arm_params, disarm_params, land_params, send_set_mode, takeoff_params
+from vehicle_profile import is_vehicle_heartbeat, request_autopilot_version
+
+
+def _parse_connection_string(connection_string: str):
+    """
+    "tcp:host:port" / "udp:host:port" (= udpin) / "udpout:host:port"
+    -> (вид, host, port)
+    """
+    kind, _, address = connection_string.partition(":")
+    host, _, port = address.rpartition(":")
+    kind = {"udp": "udpin"}.get(kind, kind)
+    if kind not in ("tcp", "udpin", "udpout") or not host or not port.isdigit():
+        raise ValueError(f"Неподдерживаемая строка подключения: {connection_string}")
+    return kind, host, int(port)
+
+
+class _StreamProtocol(asyncio.Protocol):
+    def __init__(self, link: "AsyncLink"):
+        self.link = link
+
+    def data_received(self, data: bytes) -> None:
+        self.link._feed(data)
+
+    def connection_lost(self, exc) -> None:
+        self.link._on_lost(exc)
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, link: "AsyncLink"):
+        self.link = link
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if self.link._reply_to_sender:
+            self.link._peer = addr   # udpin: отвечаем тому, кто прислал последним
+        self.link._feed(data)
+
+    def error_received(self, exc) -> None:
+        pass  # ICMP «порт недоступен» и т.п. — аппарат ещё не запущен
+
+    def connection_lost(self, exc) -> None:
+        self.link._on_lost(exc)
+
+
+class AsyncLink:
+    """
+    Соединение с одним аппаратом на asyncio.
+
+    По интерфейсу похоже на соединение pymavlink: есть mav, target_system,
+    target_component, sysid_state и message_hooks, поэтому функции
+    flight_control, vehicle_profile и TelemetryRecorder.attach работают
+    с ним без изменений.
+
+    Все методы вызываются из потока event loop; DroneState обновляется там же,
+    а читать state.snapshot() можно из любого потока.
+    """
+
+    def __init__(self,
+                 state: DroneState = None,
+                 registry=default_registry,
+                 history=None,
+                 source_system: int = 255,
+                 source_component: int = 0):
+        self.state = state if state is not None else DroneState()
+        self.registry = registry
+        self.history = history
+
+        # Парсер и упаковщик pymavlink; отправленные пакеты попадают в self.write()
+        self.mav = mavutil.mavlink.MAVLink(self, srcSystem=source_system, srcComponent=source_component)
+        self.mav.robust_parsing = True
+
+        self.target_system = 0        # первый аппарат, приславший HEARTBEAT
+        self.target_component = 0
+        self.sysid_state = {}         # sysid -> mavutil.mavfile_state (тип, автопилот)
+        self.message_hooks = []       # hook(link, msg) для каждого принятого сообщения
+        self.messages = 0             # Принято сообщений
+        self.command_stats = {}       # MAV_CMD_* -> CommandStats (как в command_ack)
+
+        self._transport = None
+        self._datagram = False        # UDP: отправка через sendto
+        self._peer = None             # адрес для ответа (UDP)
+        self._reply_to_sender = False
+        self._waiters = {}            # тип сообщения -> список (condition, future)
+
+    # ---------- транспорт ----------
+
+    async def open(self, connection_string: str) -> "AsyncLink":
+        kind, host, port = _parse_connection_string(connection_string)
+        loop = asyncio.get_running_loop()
+        if kind == "tcp":
+            self._transport, _ = await loop.create_connection(
+                lambda: _StreamProtocol(self), host, port)
+        elif kind == "udpin":
+            self._datagram = self._reply_to_sender = True
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(host, port))
+        else:
+            self._datagram = True
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), remote_addr=(host, port))
+        return self
+
+    def write(self, buf) -> None:
+        """
+        Вызывается из self.mav.send(): пакет уходит в сокет без ожидания.
+        """
+        self._write_to(buf, self._peer)
+
+    def _write_to(self, buf, peer) -> None:
+        transport = self._transport
+        if transport is None or transport.is_closing():
+            return
+        if self._datagram:
+            if self._reply_to_sender and peer is None:
+                return   # udpin: пока никто не прислал ни одного пакета
+            transport.sendto(bytes(buf), peer)
+        else:
+            transport.write(bytes(buf))
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+
+    def _on_lost(self, exc) -> None:
+        # Разбудить всех, кто ждёт сообщений: ответа уже не будет
+        error = ConnectionError(f"Соединение закрыто: {exc}" if exc else "Соединение закрыто")
+        for waiters in self._waiters.values():
+            for _, future in waiters:
+                if not future.done():
+                    future.set_exception(error)
+
+    # ---------- приём ----------
+
+    def _feed(self, data: bytes) -> None:
+        msgs = self.mav.parse_buffer(data)
+        if not msgs:
+            return
+        now = time.time()
+        for msg in msgs:
+            if msg.get_type() == 'BAD_DATA':
+                continue
+            msg._timestamp = now
+            self._post(msg)
+
+    def _post(self, msg) -> None:
+        """
+        То же, что mavfile.post_message + monitor_loop для одного сообщения.
+        """
+        self.messages += 1
+        msg_type = msg.get_type()
+
+        if msg_type == 'HEARTBEAT' and is_vehicle_heartbeat(msg):
+            src_system = msg.get_srcSystem()
+            sysid_state = self.sysid_state.get(src_system)
+            if sysid_state is None:
+                sysid_state = self.sysid_state[src_system] = mavutil.mavfile_state()
+            sysid_state.mav_type = msg.type
+            sysid_state.mav_autopilot = msg.autopilot
+            sysid_state.armed = bool(msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
+            if self.target_system == 0:
+                # как pymavlink: привязываемся к первому аппарату
+                self.target_system = src_system
+                self.target_component = msg.get_srcComponent()
+
+        for hook in self.message_hooks:
+            hook(self, msg)
+
+        process_message(self, msg, self.state, self.registry, self.history)
+        self._wake(msg)
+
+    def _wake(self, msg) -> None:
+        """
+        Отдать msg тем, кто ждёт его в recv().
+        """
+        waiters = self._waiters.get(msg.get_type())
+        if waiters:
+            for condition, future in waiters:
+                if not future.done() and (condition is None or condition(msg)):
+                    future.set_result(msg)
+
+    async def recv(self, type, condition=None, timeout: float = None):
+        """
+        Дождаться сообщения type (имя или список имён), для которого
+        condition(msg) истинно. Возвращает None по таймауту — как recv_match.
+        Обработчики DroneState получают все сообщения независимо от recv.
+        """
+        types = [type] if isinstance(type, str) else list(type)
+        future = asyncio.get_running_loop().create_future()
+        entry = (condition, future)
+        for msg_type in types:
+            self._waiters.setdefault(msg_type, []).append(entry)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            for msg_type in types:
+                waiters = self._waiters[msg_type]
+                waiters.remove(entry)
+                if not waiters:
+                    del self._waiters[msg_type]
+
+    async def wait_heartbeat(self, timeout: float = None):
+        return await self.recv('HEARTBEAT', is_vehicle_heartbeat, timeout)
+
+    # ---------- команды ----------
+
+    async def command(self, command: int, *params,
+                      timeout: float = 1.0, retries: int = 3):
+        """
+        COMMAND_LONG с ожиданием COMMAND_ACK именно на эту команду от
+        target_system (как command_ack.send_command, но через await).
+        Повторы и MAV_RESULT_IN_PROGRESS — по тем же правилам
+        (command_ack.CommandAttempts).
+        Возвращает COMMAND_ACK; при отказе или молчании — CommandError.
+        """
+        target = self.target_system
+        attempts = CommandAttempts(command, timeout, retries,
+                                   self.command_stats.setdefault(command, CommandStats()))
+
+        def is_reply(msg) -> bool:
+            return msg.command == command and msg.get_srcSystem() == target
+
+        while True:
+            send_command_long(self, command, params, attempts.confirmation)
+            attempts.sent()
+            while attempts.remaining() > 0:
+                ack = await self.recv('COMMAND_ACK', is_reply, attempts.remaining())
+                if ack is None:
+                    break
+                if ack.result == mavutil.mavlink.MAV_RESULT_IN_PROGRESS:
+                    attempts.in_progress()
+                    continue
+                attempts.acknowledged(ack)
+                return attempts.check(ack)
+            attempts.retry()
+
+    async def set_mode(self, mode_name: str, timeout: float = 5.0) -> None:
+        """
+        SET_MODE и ожидание подтверждения, как flight_control.set_mode:
+        режим считается установленным, когда HEARTBEAT показывает новый
+        custom_mode. COMMAND_ACK с command = SET_MODE (так отвечает
+        ArduPilot) лишь сообщает об отказе раньше — принятый ACK ещё не
+        значит, что режим сменился.
+        Отказ или таймаут -> CommandError.
+        """
+        custom_mode = send_set_mode(self, mode_name)
+        target = self.target_system
+
+        def is_reply(msg) -> bool:
+            if msg.get_srcSystem() != target:
+                return False
+            if msg.get_type() == 'HEARTBEAT':
+                return is_vehicle_heartbeat(msg) and msg.custom_mode == custom_mode
+            return msg.command == mavutil.mavlink.MAVLINK_MSG_ID_SET_MODE
+
+        deadline = time.monotonic() + timeout
+        while True:
+            # DroneState видит каждый HEARTBEAT, в том числе пришедший
+            # между двумя ожиданиями recv
+            if self.state.mode == mode_name:
+                return
+            remaining = deadline - time.monotonic()
+            msg = await self.recv(['HEARTBEAT', 'COMMAND_ACK'], is_reply, remaining) if remaining > 0 else None
+            if msg is None:
+                raise CommandError(f"Режим {mode_name} не подтверждён за {timeout} с")
+            if msg.get_type() == 'HEARTBEAT':
+                return
+            if msg.result not in (mavutil.mavlink.MAV_RESULT_ACCEPTED, mavutil.mavlink.MAV_RESULT_IN_PROGRESS):
+                raise CommandError(f"Режим {mode_name} отклонён: result={msg.result}")
+
+    async def arm(self, force: bool = False):
+        return await self.command(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, *arm_params(force))
+
+    async def disarm(self, force: bool = False):
+        return await self.command(mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, *disarm_params(force))
+
+    async def takeoff(self, alt_m: float):
+        return await self.command(mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, *takeoff_params(alt_m))
+
+    async def land(self):
+        return await self.command(mavutil.mavlink.MAV_CMD_NAV_LAND, *land_params())
+
+
+async def connect(connection_string: str = "tcp:127.0.0.1:14550",
+                  state: DroneState = None,
+                  registry=default_registry,
+                  history=None,
+                  timeout: float = 5.0) -> AsyncLink:
+    """
+    Асинхронный аналог return_base.connect: открыть соединение, дождаться
+    HEARTBEAT и запросить AUTOPILOT_VERSION и HOME_POSITION.
+    None, если аппарат не ответил.
+    """
+    link = AsyncLink(state, registry, history)
+    await link.open(connection_string)
+    if await link.wait_heartbeat(timeout) is None:
+        link.close()
+        return None
+    request_autopilot_version(link)
+    request_home_position(link)
+    return link
+
+
+async def _watch(connection_strings: list, seconds: float) -> None:
+    links = await asyncio.gather(*(connect(cs) for cs in connection_strings))
+    await asyncio.sleep(seconds)
+    for cs, link in zip(connection_strings, links):
+        if link is None:
+            print(f"{cs}: нет HEARTBEAT")
+            continue
+        print(f"{cs}: система {link.target_system}, сообщений {link.messages}, {link.state.snapshot()}")
+        link.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Мониторинг нескольких аппаратов в одном потоке")
+    parser.add_argument("connections", nargs="+", help="строки подключения, например tcp:127.0.0.1:14550")
+    parser.add_argument("--seconds", type=float, default=5.0, help="сколько слушать, с")
+    args = parser.parse_args()
+    asyncio.run(_watch(args.connections, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
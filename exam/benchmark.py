@@ -0,0 +1,1370 @@
+# benchmark.py
+#
+# Замеры производительности горячих путей проекта.
+# Всё, что требует автопилота, выполняется против fake_vehicle.py на loopback.
+# Запуск из папки exam:
+#   python benchmark.py                  -> все замеры
+#   python benchmark.py mission_builder  -> только выбранные
+#   python benchmark.py --json out.json  -> результаты в JSON
+#   python benchmark.py --baseline benchmark_baseline.json
+#                                        -> сравнение с эталоном; код выхода 1 при регрессии
+#   python benchmark.py --save-baseline benchmark_baseline.json
+#                                        -> записать новый эталон
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import struct
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from pymavlink import mavutil, mavwp
+
+from drone_monitor import DroneSnapshot, DroneState, monitor_loop, registry, subscribe, unsubscribe
+from telemetry_history import TelemetryHistory
+from telemetry_recorder import TelemetryRecorder
+from replay import replay_flight
+from mission_builder import add_waypoint_offset_m, build_mission_from_offsets, geod, offsets_to_latlon
+from route_planner import build_route_mission, densify_polygon, plan_route
+from coverage_planner import build_coverage_mission, plan_coverage
+from geo_frame import get_frame, local_transformer
+from geofence import FenceTracker, Geofence
+from proximity import KDTree, ProximityMonitor
+from patrol_partition import PatrolPartitioner, build_patrol_missions
+from mission_transfer import upload_mission, upload_mission_incremental
+from fake_vehicle import COPTER_MODES, FakeVehicle
+from command_ack import CommandError, get_tracker
+from stream_rates import StreamRateManager
+import async_link
+from fleet import Fleet
+import flight_control
+from return_base import goto_local_ned
+from ui_bridge import TelemetryBridge
+from log_panel import DEBUG, ERROR, INFO, WARNING, LogBuffer, format_entry
+
+# имя замера -> функция без обязательных аргументов, возвращающая dict с результатами
+BENCHMARKS = {}
+
+# Базовая точка для синтетических миссий
+BASE_LAT_DEG = 55.7558
+BASE_LON_DEG = 37.6173
+
+
+def benchmark(name: str):
+    """
+    Декоратор регистрации замера в BENCHMARKS.
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def _fake_master():
+    """
+    Объект с target_system/target_component — всё, что нужно построителю миссии.
+    """
+    return SimpleNamespace(target_system=1, target_component=1)
+
+
+@benchmark("mission_builder")
+def bench_mission_builder(n_points: int = 10_000) -> dict:
+    """
+    Построение миссии из n_points смещений: поточечно (add_waypoint_offset_m)
+    и пакетно (build_mission_from_offsets).
+    """
+    master = _fake_master()
+    rng = np.random.default_rng(0)
+    north_m = rng.uniform(-2000.0, 2000.0, n_points)
+    east_m = rng.uniform(-2000.0, 2000.0, n_points)
+    alt_m = np.full(n_points, 30.0)
+
+    start = time.perf_counter()
+    wp = mavwp.MAVWPLoader()
+    for north, east, alt in zip(north_m.tolist(), east_m.tolist(), alt_m.tolist()):
+        add_waypoint_offset_m(wp, master, BASE_LAT_DEG, BASE_LON_DEG, north, east, alt)
+    per_point_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wp_batch = build_mission_from_offsets(
+        master, BASE_LAT_DEG, BASE_LON_DEG, north_m, east_m, alt_m)
+    batch_s = time.perf_counter() - start
+
+    # Пакетный путь должен давать те же самые точки
+    assert wp_batch.count() == wp.count()
+    for seq in (0, n_points // 2, n_points - 1):
+        a, b = wp.wp(seq), wp_batch.wp(seq)
+        assert (a.seq, a.x, a.y) == (b.seq, b.x, b.y), seq
+
+    return {
+        "points": n_points,
+        "per_point_s": per_point_s,
+        "batch_s": batch_s,
+        "per_point_points_per_s": n_points / per_point_s,
+        "batch_points_per_s": n_points / batch_s,
+        "speedup": per_point_s / batch_s,
+    }
+
+
+def _loopback_link(loss: float = 0.0, **vehicle_opts):
+    """
+    Пара (vehicle, master): запущенная имитация автопилота на свободном
+    TCP-порту и подключённое к ней соединение (HEARTBEAT уже получен).
+    """
+    vehicle = FakeVehicle(port=0, loss=loss, **vehicle_opts).start()
+    master = mavutil.mavlink_connection(vehicle.connection_string)
+    master.wait_heartbeat(timeout=5)
+    return vehicle, master
+
+
+def _close_loopback_link(vehicle, master):
+    master.close()
+    vehicle.stop()
+
+
+@benchmark("route_planner")
+def bench_route_planner(checkpoint_counts=(100, 500), perimeter_vertices: int = 64,
+                        spacing_m: float = 5.0, side_m: float = 3000.0) -> dict:
+    """
+    Планирование облёта: ближайший сосед + 2-opt для N контрольных точек
+    (случайных в квадрате side_m), выигрыш 2-opt, уплотнение периметра
+    и сборка MAVWPLoader.
+    """
+    rng = np.random.default_rng(0)
+    result = {}
+    for n in checkpoint_counts:
+        lat, lon = offsets_to_latlon(BASE_LAT_DEG, BASE_LON_DEG,
+                                     rng.uniform(-side_m / 2, side_m / 2, n),
+                                     rng.uniform(-side_m / 2, side_m / 2, n))
+        checkpoints = np.column_stack([lat, lon])
+        start = time.perf_counter()
+        plan = plan_route(BASE_LAT_DEG, BASE_LON_DEG, checkpoints)
+        result[f"checkpoints_{n}_plan_ms"] = (time.perf_counter() - start) * 1000
+        result[f"checkpoints_{n}_two_opt_gain"] = 1.0 - plan.length_m / plan.nearest_neighbour_length_m
+
+    # Периметр — окружность радиусом side_m / 2 из perimeter_vertices вершин
+    angle = np.linspace(0, 2 * np.pi, perimeter_vertices, endpoint=False)
+    per_lat, per_lon = offsets_to_latlon(BASE_LAT_DEG, BASE_LON_DEG,
+                                         np.cos(angle) * side_m / 2, np.sin(angle) * side_m / 2)
+    start = time.perf_counter()
+    dense_lat, _ = densify_polygon(per_lat, per_lon, spacing_m)
+    elapsed = time.perf_counter() - start
+    result["densify_points"] = len(dense_lat)
+    result["densify_points_per_s"] = len(dense_lat) / elapsed
+
+    # Миссия — по плану последнего (самого большого) набора точек
+    mission_checkpoints = checkpoint_counts[-1]
+    start = time.perf_counter()
+    build_route_mission(_fake_master(), plan, alt_m=30.0)
+    result[f"checkpoints_{mission_checkpoints}_mission_build_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+@benchmark("coverage_planner")
+def bench_coverage_planner(side_m: float = 2000.0, swath_m: float = 10.0,
+                           point_spacing_m: float = 20.0, n_geodesic: int = 2000) -> dict:
+    """
+    Облёт квадрата side_m змейкой (~20 тыс. точек): план через кэшированный
+    Transformer и сборка миссии, против расчёта каждой точки отдельным
+    geod.fwd (как add_waypoint_offset_m, на n_geodesic точках).
+    """
+    lat, lon = offsets_to_latlon(BASE_LAT_DEG, BASE_LON_DEG,
+                                 [0, side_m, side_m, 0], [0, 0, side_m, side_m])
+    polygon = np.column_stack([lat, lon])
+
+    get_frame.cache_clear()
+    local_transformer.cache_clear()
+    start = time.perf_counter()
+    plan_coverage(polygon, swath_m, 30.0, point_spacing_m)
+    first_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plan_lat, _ = plan_coverage(polygon, swath_m, 30.0, point_spacing_m)
+    plan_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wp_loader = build_coverage_mission(_fake_master(), polygon, swath_m, 30.0, 40.0, point_spacing_m)
+    build_s = time.perf_counter() - start
+
+    # Поточечно: один geod.fwd на точку
+    rng = np.random.default_rng(0)
+    north = rng.uniform(0, side_m, n_geodesic).tolist()
+    east = rng.uniform(0, side_m, n_geodesic).tolist()
+    start = time.perf_counter()
+    for north_m, east_m in zip(north, east):
+        geod.fwd(BASE_LON_DEG, BASE_LAT_DEG,
+                 math.degrees(math.atan2(east_m, north_m)), math.hypot(north_m, east_m))
+    per_point_s = (time.perf_counter() - start) / n_geodesic
+
+    return {
+        "points": len(plan_lat),
+        "first_plan_ms": first_s * 1000,
+        "plan_ms": plan_s * 1000,
+        "mission_build_ms": build_s * 1000,
+        "mission_points": wp_loader.count(),
+        "per_point_geodesic_ms": per_point_s * len(plan_lat) * 1000,
+        "speedup": per_point_s * len(plan_lat) / plan_s,
+    }
+
+
+@benchmark("geo_frame")
+def bench_geo_frame(n_scalar: int = 50_000, n_vector: int = 1_000_000) -> dict:
+    """
+    Система NED от home: пересчёт одной точки (как на каждый
+    GLOBAL_POSITION_INT), массива точек (построители миссий) и цена
+    get_frame из кэша против создания нового Transformer.
+    """
+    frame = get_frame(BASE_LAT_DEG, BASE_LON_DEG)
+    to_ned = frame.to_ned
+    lat, lon = BASE_LAT_DEG + 0.001, BASE_LON_DEG + 0.002
+    start = time.perf_counter()
+    for _ in range(n_scalar):
+        to_ned(lat, lon)
+    scalar_s = (time.perf_counter() - start) / n_scalar
+
+    rng = np.random.default_rng(0)
+    north = rng.uniform(-5000, 5000, n_vector)
+    east = rng.uniform(-5000, 5000, n_vector)
+    start = time.perf_counter()
+    lat_v, lon_v, _ = frame.to_geodetic(north, east)
+    frame.to_ned(lat_v, lon_v)
+    vector_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        get_frame(BASE_LAT_DEG, BASE_LON_DEG)
+    cached_s = (time.perf_counter() - start) / 1000
+
+    start = time.perf_counter()
+    for i in range(20):
+        local_transformer.__wrapped__(BASE_LAT_DEG + i * 1e-4, BASE_LON_DEG)
+    new_s = (time.perf_counter() - start) / 20
+
+    return {
+        "to_ned_scalar_us": scalar_s * 1e6,
+        "round_trip_points_per_s": n_vector / vector_s,
+        "get_frame_cached_us": cached_s * 1e6,
+        "new_transformer_ms": new_s * 1000,
+    }
+
+
+@benchmark("geofence")
+def bench_geofence(n_vertices: int = 400, n_zones: int = 20, n_points: int = 50_000,
+                   cell_m: float = 25.0) -> dict:
+    """
+    Геозона: периметр из n_vertices вершин и n_zones запретных зон.
+    Проверка случайных точек по сетке, трек аппарата (10 м/с, 20 Гц)
+    с запоминанием клетки и наивный «луч» по всем сторонам для сравнения.
+    """
+    frame = get_frame(BASE_LAT_DEG, BASE_LON_DEG)
+    rng = np.random.default_rng(0)
+    angle = np.linspace(0.0, 2 * np.pi, n_vertices, endpoint=False)
+    radius = 1500 + 400 * np.sin(7 * angle) + rng.uniform(-50, 50, n_vertices)
+    polygons_ned = [(radius * np.cos(angle), radius * np.sin(angle))]
+    zone_angle = np.linspace(0.0, 2 * np.pi, 30, endpoint=False)
+    for _ in range(n_zones):
+        centre = rng.uniform(-900, 900, 2)
+        zone_radius = rng.uniform(50, 150)
+        polygons_ned.append((centre[0] + zone_radius * np.cos(zone_angle),
+                             centre[1] + zone_radius * np.sin(zone_angle)))
+    polygons = []
+    for north, east in polygons_ned:
+        lat, lon, _ = frame.to_geodetic(north, east)
+        polygons.append(np.column_stack([lat, lon]))
+
+    start = time.perf_counter()
+    fence = Geofence(frame, perimeter=polygons[0], no_fly=polygons[1:], cell_m=cell_m)
+    build_s = time.perf_counter() - start
+
+    points = rng.uniform(-2200, 2200, (n_points, 2)).tolist()
+    start = time.perf_counter()
+    for north, east in points:
+        fence.check_ned(north, east)
+    check_s = (time.perf_counter() - start) / n_points
+
+    # Трек: 10 м/с при 20 Гц — 0.5 м между отсчётами
+    heading = np.cumsum(rng.normal(0.0, 0.05, n_points))
+    track = np.column_stack([np.cumsum(0.5 * np.cos(heading)), np.cumsum(0.5 * np.sin(heading))]).tolist()
+    tracker = FenceTracker(fence)
+    start = time.perf_counter()
+    for north, east in track:
+        tracker.update(north, east)
+    track_s = (time.perf_counter() - start) / n_points
+
+    # Наивно: чётность пересечений луча со всеми сторонами всех многоугольников
+    edges = []
+    for north, east in polygons_ned:
+        north, east = north.tolist(), east.tolist()
+        edges.append(list(zip(east, north, east[1:] + east[:1], north[1:] + north[:1])))
+
+    def naive(north, east) -> bool:
+        for i, polygon in enumerate(edges):
+            inside = False
+            for x1, y1, x2, y2 in polygon:
+                if (y1 > north) != (y2 > north) and east < x1 + (north - y1) * (x2 - x1) / (y2 - y1):
+                    inside = not inside
+            if inside != (i == 0):
+                return True
+        return False
+
+    n_naive = 2_000
+    mismatches = sum(naive(north, east) != fence.check_ned(north, east) for north, east in points[:n_naive])
+    start = time.perf_counter()
+    for north, east in points[:n_naive]:
+        naive(north, east)
+    naive_s = (time.perf_counter() - start) / n_naive
+
+    return {
+        "edges": sum(len(polygon) for polygon in edges),
+        "cells": fence.rows * fence.cols,
+        "boundary_cells": len(fence._mixed),
+        "build_ms": build_s * 1000,
+        "check_us": check_s * 1e6,
+        "track_check_us": track_s * 1e6,
+        "same_cell_fraction": tracker.same_cell / tracker.checks,
+        "naive_check_us": naive_s * 1e6,
+        "speedup": naive_s / check_s,
+        "mismatches": mismatches,
+    }
+
+
+@benchmark("proximity")
+def bench_proximity(fleet_sizes=(10, 50, 100, 200), ticks: int = 50,
+                    threshold_m: float = 15.0) -> dict:
+    """
+    Контроль сближения: такт ProximityMonitor.check (пересчёт позиций,
+    KD-дерево, поиск пар) для флотов до 200 аппаратов, разлетающихся
+    случайно по 1 км² на высотах 20-60 м. Для сравнения — проверка всех
+    пар матрицей расстояний numpy на тех же точках.
+    """
+    frame = get_frame(BASE_LAT_DEG, BASE_LON_DEG)
+    rng = np.random.default_rng(0)
+    result = {}
+    for size in fleet_sizes:
+        north = rng.uniform(-500, 500, size)
+        east = rng.uniform(-500, 500, size)
+        alt = rng.uniform(20, 60, size)
+        monitor = ProximityMonitor(threshold_m, frame=frame)
+        tick_s = tree_s = all_pairs_s = 0.0
+        mismatches = conflicts = 0
+        for tick in range(ticks):
+            # 10 м/с при 10 Гц — до 1 м за такт
+            north += rng.uniform(-1, 1, size)
+            east += rng.uniform(-1, 1, size)
+            lat, lon, _ = frame.to_geodetic(north, east)
+            snapshots = {
+                sysid + 1: DroneSnapshot(tick, 0.0, "AUTO", True, la, lo, al,
+                                         0.0, 0.0, 0.0, 0.0, 0)
+                for sysid, (la, lo, al) in enumerate(zip(lat.tolist(), lon.tolist(), alt.tolist()))
+            }
+
+            start = time.perf_counter()
+            conflicts += len(monitor.check(snapshots))
+            tick_s += time.perf_counter() - start
+
+            _, points = monitor.positions(snapshots)
+            start = time.perf_counter()
+            i, j, _ = KDTree(points).query_pairs(threshold_m)
+            tree_s += time.perf_counter() - start
+
+            start = time.perf_counter()
+            distance = np.sqrt(np.sum((points[:, None, :] - points[None, :, :]) ** 2, axis=2))
+            all_i, all_j = np.nonzero(np.triu(distance < threshold_m, 1))
+            all_pairs_s += time.perf_counter() - start
+
+            mismatches += set(zip(i.tolist(), j.tolist())) != set(zip(all_i.tolist(), all_j.tolist()))
+
+        result[f"vehicles_{size}_tick_ms"] = tick_s / ticks * 1000
+        result[f"vehicles_{size}_tree_ms"] = tree_s / ticks * 1000
+        result[f"vehicles_{size}_all_pairs_ms"] = all_pairs_s / ticks * 1000
+        result[f"vehicles_{size}_conflicts"] = conflicts
+        result[f"vehicles_{size}_mismatches"] = mismatches
+    return result
+
+
+@benchmark("patrol_partition")
+def bench_patrol_partition(n_checkpoints: int = 100, vehicles: int = 5,
+                           spacing_m: float = 200.0) -> dict:
+    """
+    Раздел контрольных точек и периметра 4x4 км между vehicles аппаратами
+    с разным запасом хода: построение матрицы, первый раздел, повторный
+    раздел после потери аппарата и сборка миссий. load_spread —
+    отношение наибольшей загрузки (длина / запас) к наименьшей.
+    """
+    rng = np.random.default_rng(0)
+    cp_lat, cp_lon = offsets_to_latlon(BASE_LAT_DEG, BASE_LON_DEG,
+                                       rng.uniform(-2000, 2000, n_checkpoints),
+                                       rng.uniform(-2000, 2000, n_checkpoints))
+    per_lat, per_lon = offsets_to_latlon(BASE_LAT_DEG, BASE_LON_DEG,
+                                         [-2100, 2100, 2100, -2100], [-2100, -2100, 2100, 2100])
+    budgets = {sysid: 15000.0 + 2500.0 * (sysid % 3) for sysid in range(1, vehicles + 1)}
+
+    start = time.perf_counter()
+    partitioner = PatrolPartitioner(BASE_LAT_DEG, BASE_LON_DEG,
+                                    list(zip(cp_lat, cp_lon)), list(zip(per_lat, per_lon)),
+                                    spacing_m=spacing_m)
+    matrix_s = time.perf_counter() - start
+
+    def spread(plans) -> float:
+        loads = [plans[sysid].length_m / budgets[sysid] for sysid in plans if len(plans[sysid])]
+        return max(loads) / min(loads)
+
+    start = time.perf_counter()
+    plans = partitioner.partition(budgets)
+    partition_s = time.perf_counter() - start
+    load_spread = spread(plans)
+
+    master = _fake_master()
+    start = time.perf_counter()
+    missions = build_patrol_missions(plans, 30.0, {sysid: master for sysid in plans})
+    missions_s = time.perf_counter() - start
+
+    # Аппарат 2 выбыл
+    del budgets[2]
+    start = time.perf_counter()
+    replans = partitioner.partition(budgets)
+    repartition_s = time.perf_counter() - start
+
+    return {
+        "points": len(partitioner),
+        "vehicles": vehicles,
+        "matrix_ms": matrix_s * 1000,
+        "partition_ms": partition_s * 1000,
+        "missions_ms": missions_s * 1000,
+        "mission_items": sum(wp.count() for wp in missions.values()),
+        "repartition_ms": repartition_s * 1000,
+        "load_spread": load_spread,
+        "repartition_load_spread": spread(replans),
+    }
+
+
+@benchmark("mission_upload")
+def bench_mission_upload(n_items: int = 5_000,
+                         loss: float = 0.01,
+                         budget_s: float = 5.0) -> dict:
+    """
+    Загрузка миссии из n_items пунктов в имитацию автопилота
+    с потерей пакетов loss. budget_s — допустимое время загрузки.
+    """
+    vehicle, master = _loopback_link(loss)
+
+    wp = build_mission_from_offsets(
+        master, BASE_LAT_DEG, BASE_LON_DEG,
+        np.linspace(0.0, 1000.0, n_items), np.zeros(n_items), 30.0)
+
+    try:
+        stats = upload_mission(master, wp, timeout=0.1, max_retries=20)
+    finally:
+        _close_loopback_link(vehicle, master)
+
+    return {
+        "items": stats.count,
+        "loss": loss,
+        "elapsed_s": stats.elapsed_s,
+        "items_per_s": stats.items_per_s,
+        "retries": stats.retries,
+        "duplicates": stats.duplicates,
+        "budget_s": budget_s,
+        "within_budget": stats.elapsed_s <= budget_s,
+    }
+
+
+@benchmark("mission_update")
+def bench_mission_update(n_items: int = 2_000) -> dict:
+    """
+    Сдвиг одной точки на периметре из n_items пунктов:
+    полная загрузка против upload_mission_incremental.
+    """
+    vehicle, master = _loopback_link()
+
+    angle = np.linspace(0.0, 2 * np.pi, n_items, endpoint=False)
+    north_m = 500.0 * np.cos(angle)
+    east_m = 500.0 * np.sin(angle)
+
+    try:
+        wp = build_mission_from_offsets(
+            master, BASE_LAT_DEG, BASE_LON_DEG, north_m, east_m, 30.0)
+        full = upload_mission_incremental(master, wp)
+
+        # Сдвигаем одну контрольную точку на 5 м к северу
+        north_m[n_items // 2] += 5.0
+        wp = build_mission_from_offsets(
+            master, BASE_LAT_DEG, BASE_LON_DEG, north_m, east_m, 30.0)
+        partial = upload_mission_incremental(master, wp)
+    finally:
+        _close_loopback_link(vehicle, master)
+
+    return {
+        "items": n_items,
+        "full_s": full.elapsed_s,
+        "partial_s": partial.elapsed_s,
+        "partial_items": partial.count,
+        "speedup": full.elapsed_s / partial.elapsed_s,
+    }
+
+
+def _mixed_traffic(mav) -> list:
+    """
+    Набор пакетов «как от автопилота»: подписанные типы вперемешку
+    с типами, которые мониторинг не использует.
+    """
+    mav.srcSystem = 1
+    mav.srcComponent = 1
+    return [
+        mav.heartbeat_encode(
+            mavutil.mavlink.MAV_TYPE_QUADROTOR, mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+            mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED, 4, 0).pack(mav),
+        mav.global_position_int_encode(0, 557558000, 376173000, 150000, 30000, 0, 0, 0, 0).pack(mav),
+        mav.sys_status_encode(0, 0, 0, 500, 12600, -1, 87, 0, 0, 0, 0, 0, 0).pack(mav),
+        mav.attitude_encode(0, 0.01, 0.02, 1.5, 0, 0, 0).pack(mav),
+        mav.vfr_hud_encode(5.0, 5.0, 90, 40, 30.0, 0.1).pack(mav),
+        mav.global_position_int_encode(0, 557558100, 376173100, 150000, 30000, 0, 0, 0, 0).pack(mav),
+        mav.gps_raw_int_encode(0, 3, 557558000, 376173000, 150000, 100, 100, 500, 0, 12).pack(mav),
+        mav.attitude_encode(0, 0.01, 0.02, 1.5, 0, 0, 0).pack(mav),
+    ]
+
+
+@benchmark("monitor_dispatch")
+def bench_monitor_dispatch(rate_hz: float = 1000.0,
+                           duration_s: float = 2.0,
+                           port: int = 14662) -> dict:
+    """
+    monitor_loop под смешанным потоком rate_hz сообщений/с через UDP loopback:
+    сколько сообщений диспетчеризовано и сколько CPU потока мониторинга
+    ушло на одно принятое сообщение.
+    """
+    vehicle = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}", source_system=1)
+    master = mavutil.mavlink_connection(f"udpout:127.0.0.1:{port}", source_system=255)
+    master.mav.heartbeat_send(mavutil.mavlink.MAV_TYPE_GCS, mavutil.mavlink.MAV_AUTOPILOT_INVALID, 0, 0, 0)
+    vehicle.recv_match(type='HEARTBEAT', blocking=True, timeout=1)  # адрес GCS для ответов
+
+    packets = _mixed_traffic(vehicle.mav)
+
+    dispatched = [0]
+
+    def count_message(master, msg, state):
+        dispatched[0] += 1
+
+    types = registry.types()
+    for msg_type in types:
+        subscribe(msg_type, count_message)
+
+    stop = {"stop": False}
+    cpu = {}
+
+    def run_monitor():
+        start = time.thread_time()
+        monitor_loop(master, DroneState(), lambda: stop["stop"])
+        cpu["s"] = time.thread_time() - start
+
+    monitor_thread = threading.Thread(target=run_monitor, daemon=True)
+    monitor_thread.start()
+
+    sent = 0
+    period = 1.0 / rate_hz
+    start = time.perf_counter()
+    next_send = start
+    while next_send - start < duration_s:
+        vehicle.write(packets[sent % len(packets)])
+        sent += 1
+        next_send += period
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - start
+
+    time.sleep(0.2)  # даём мониторингу дочитать очередь
+    stop["stop"] = True
+    monitor_thread.join(timeout=2.0)
+    for msg_type in types:
+        unsubscribe(msg_type, count_message)
+    master.close()
+    vehicle.close()
+
+    return {
+        "sent": sent,
+        "sent_per_s": sent / elapsed,
+        "dispatched": dispatched[0],
+        "dispatched_per_s": dispatched[0] / elapsed,
+        "monitor_cpu_us_per_msg": cpu["s"] / sent * 1e6,
+    }
+
+
+@benchmark("snapshot_read")
+def bench_snapshot_read(reader_counts=(1, 4, 16), reads_per_reader: int = 200_000) -> dict:
+    """
+    Стоимость чтения DroneState.snapshot() при одновременной публикации
+    снимков писателем; проверяется и отсутствие «разорванных» пар lat/lon.
+    """
+    result = {}
+    for n_readers in reader_counts:
+        state = DroneState()
+        stop = {"stop": False}
+        torn = [0]
+        cpu_s = []
+
+        def writer():
+            i = 0
+            while not stop["stop"]:
+                i += 1
+                state.lat_deg = float(i)
+                state.lon_deg = float(i)
+                state.publish(time.time())
+
+        def reader():
+            start = time.thread_time()
+            for _ in range(reads_per_reader):
+                snapshot = state.snapshot()
+                if snapshot.lat_deg != snapshot.lon_deg:
+                    torn[0] += 1
+            cpu_s.append(time.thread_time() - start)
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+        readers = [threading.Thread(target=reader) for _ in range(n_readers)]
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        stop["stop"] = True
+        writer_thread.join()
+
+        result[f"readers_{n_readers}_ns_per_read"] = sum(cpu_s) / (n_readers * reads_per_reader) * 1e9
+        result[f"readers_{n_readers}_torn"] = torn[0]
+    return result
+
+
+@benchmark("wait_until")
+def bench_wait_until(rate_hz: float = 50.0, n_events: int = 100, n_publish: int = 200_000) -> dict:
+    """
+    Задержка реакции DroneState.wait_until: от публикации снимка, который
+    удовлетворяет условию, до пробуждения ждущего потока (сообщения идут
+    с частотой rate_hz). Плюс цена publish без ждущих.
+    """
+    state = DroneState()
+    published_at = {}
+    latencies = []
+
+    def writer():
+        for i in range(1, n_events + 1):
+            time.sleep(1.0 / rate_hz)
+            state.alt_rel_m = float(i)
+            published_at[i] = time.perf_counter()
+            state.publish(time.time())
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    for i in range(1, n_events + 1):
+        snapshot = state.wait_until(lambda s, i=i: s.alt_rel_m >= i, timeout=2.0)
+        if snapshot is not None:
+            latencies.append(time.perf_counter() - published_at[int(snapshot.alt_rel_m)])
+    writer_thread.join()
+
+    idle = DroneState()
+    start = time.perf_counter()
+    for _ in range(n_publish):
+        idle.publish(0.0)
+    publish_ns = (time.perf_counter() - start) / n_publish * 1e9
+
+    return {
+        "events": len(latencies),
+        "wake_p50_ms": _percentile_ms(latencies, 50),
+        "wake_p99_ms": _percentile_ms(latencies, 99),
+        "publish_no_waiters_ns": publish_ns,
+    }
+
+
+@benchmark("ui_bridge")
+def bench_ui_bridge(msg_rates=(100, 1000, 10000), fps: float = 20.0, duration_s: float = 1.0) -> dict:
+    """
+    TelemetryBridge: перерисовок за кадр и время кадра при разной частоте
+    сообщений. Кадры вызываются напрямую (без окна Tk), перерисовка —
+    форматирование строки статуса, как в coding_4_4/main.py.
+    """
+    result = {}
+    for msg_rate in msg_rates:
+        state = DroneState()
+        bridge = TelemetryBridge(SimpleNamespace(), state, fps)
+        labels = {}
+        bridge.bind(lambda s: labels.update(status=f"{s.mode} {s.alt_rel_m:.0f}м {s.battery_voltage_v:.1f}V"))
+        stop = {"stop": False}
+        published = [0]
+
+        def writer():
+            period = 1.0 / msg_rate
+            next_time = time.perf_counter()
+            while not stop["stop"]:
+                # на высокой частоте — пачками: sleep точнее 1 мс не бывает
+                next_time += period
+                state.alt_rel_m += 0.01
+                state.publish(time.time())
+                published[0] += 1
+                delay = next_time - time.perf_counter()
+                if delay > 0.001:
+                    time.sleep(delay)
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+        end = time.perf_counter() + duration_s
+        while time.perf_counter() < end:
+            bridge.frame()
+            time.sleep(1.0 / fps)
+        stop["stop"] = True
+        writer_thread.join()
+        bridge.stop()
+
+        result[f"rate_{msg_rate}_msgs_per_frame"] = published[0] / bridge.frames
+        result[f"rate_{msg_rate}_repaints_per_frame"] = bridge.repaints / bridge.frames
+        result[f"rate_{msg_rate}_frame_us"] = bridge.frame_time_s / bridge.frames * 1e6
+    return result
+
+
+@benchmark("log_panel")
+def bench_log_panel(n_lines: int = 200_000, capacity: int = 5000, rows: int = 15,
+                    frame_lines=(10, 100, 1000)) -> dict:
+    """
+    LogBuffer журнала событий: скорость записи строк и стоимость кадра
+    (окно из rows строк, как его строит LogPanel.refresh) при разном
+    числе строк, пришедших за кадр, — без фильтра и с фильтром WARNING.
+    """
+    buffer = LogBuffer(capacity)
+    severities = [INFO] * 8 + [WARNING, ERROR]
+    start = time.perf_counter()
+    for i in range(n_lines):
+        buffer.append("PreArm: Compass not calibrated", severities[i % 10])
+    result = {"append_per_s": n_lines / (time.perf_counter() - start)}
+
+    for min_severity, label in ((DEBUG, "all"), (WARNING, "warn")):
+        for per_frame in frame_lines:
+            n_frames = 200
+            frame_s = 0.0
+            for _ in range(n_frames):
+                for i in range(per_frame):
+                    buffer.append("EKF3 IMU0 is using GPS", severities[i % 10])
+                frame_start = time.perf_counter()
+                entries, _, _ = buffer.view(rows, None, min_severity)
+                [format_entry(entry) for entry in entries]
+                frame_s += time.perf_counter() - frame_start
+            result[f"{label}_{per_frame}_lines_frame_us"] = frame_s / n_frames * 1e6
+    return result
+
+
+@benchmark("telemetry_history")
+def bench_telemetry_history(capacity: int = 36_000, n_records: int = 200_000) -> dict:
+    """
+    Кольцевой буфер истории: скорость записи и стоимость запроса окна
+    после многократного переполнения (память не растёт, окна — view).
+    """
+    history = TelemetryHistory(capacity)
+    state = DroneState()
+
+    start = time.perf_counter()
+    for i in range(n_records):
+        state.alt_rel_m = float(i % 100)
+        history.append(state.publish(i * 0.1))
+    append_s = time.perf_counter() - start
+
+    n_queries = 10_000
+    start = time.perf_counter()
+    for _ in range(n_queries):
+        window = history.last_seconds(60.0)
+    query_s = time.perf_counter() - start
+
+    return {
+        "records": n_records,
+        "capacity": capacity,
+        "buffer_bytes": history._buf.nbytes,
+        "append_us": append_s / n_records * 1e6,
+        "window_query_us": query_s / n_queries * 1e6,
+        "window_len": len(window),
+        "window_is_view": bool(np.shares_memory(window, history._buf)),
+    }
+
+
+def _parsed_traffic(n_messages: int) -> list:
+    """
+    n_messages разобранных сообщений смешанного потока (как после recv_match).
+    """
+    sender = mavutil.mavlink.MAVLink(None)
+    packets = _mixed_traffic(sender)
+    parser = mavutil.mavlink.MAVLink(None)
+    messages = []
+    for i in range(n_messages):
+        msg = parser.decode(bytearray(packets[i % len(packets)]))
+        msg._timestamp = i * 0.001
+        messages.append(msg)
+    return messages
+
+
+@benchmark("telemetry_recorder")
+def bench_telemetry_recorder(n_messages: int = 200_000) -> dict:
+    """
+    Накладные расходы записи .tlog на поток приёма: стоимость хука
+    на одно сообщение; затем файл читается обратно через pymavlink.
+    """
+    messages = _parsed_traffic(n_messages)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.tlog")
+        # очередь вмещает весь всплеск: замеряем хук, а не переполнение
+        recorder = TelemetryRecorder(path, max_queue=n_messages)
+        on_message = recorder._on_message
+
+        start = time.perf_counter()
+        for msg in messages:
+            on_message(None, msg)
+        hook_s = time.perf_counter() - start
+        recorder.close()
+
+        replay = mavutil.mavlink_connection(path)
+        read_back = 0
+        while replay.recv_msg() is not None:
+            read_back += 1
+        replay.close()
+
+    return {
+        "messages": n_messages,
+        "hook_us_per_msg": hook_s / n_messages * 1e6,
+        "recorded": recorder.recorded,
+        "dropped": recorder.dropped,
+        "read_back": read_back,
+        "bytes_written": recorder.bytes_written,
+    }
+
+
+def _write_synthetic_tlog(path: str, duration_s: float) -> int:
+    """
+    Синтетический .tlog: GLOBAL_POSITION_INT 10 Гц, SYS_STATUS 2 Гц,
+    HEARTBEAT 1 Гц и неиспользуемые ATTITUDE 10 Гц. Возвращает число пакетов.
+    """
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    heartbeat = mav.heartbeat_encode(
+        mavutil.mavlink.MAV_TYPE_QUADROTOR, mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+        mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED, 4, 0)
+    t0 = 1_700_000_000.0
+    block = bytearray()
+    count = 0
+    for tick in range(int(duration_s * 10)):
+        t = t0 + tick * 0.1
+        msgs = [
+            mav.global_position_int_encode(
+                tick * 100, 557558000 + tick, 376173000, 150000, 30000, 0, 0, 0, 0),
+            mav.attitude_encode(tick * 100, 0.01, 0.02, 1.5, 0, 0, 0),
+        ]
+        if tick % 5 == 0:
+            msgs.append(mav.sys_status_encode(0, 0, 0, 500, 12600, -1, 87, 0, 0, 0, 0, 0, 0))
+        if tick % 10 == 0:
+            msgs.append(heartbeat)
+        for msg in msgs:
+            block += struct.pack(">Q", int(t * 1e6))
+            block += msg.pack(mav)
+            count += 1
+    with open(path, "wb") as f:
+        f.write(block)
+    return count
+
+
+@benchmark("replay")
+def bench_replay(duration_s: float = 3600.0) -> dict:
+    """
+    Повтор часа полёта через monitor_loop как можно быстрее.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "flight.tlog")
+        packets = _write_synthetic_tlog(path, duration_s)
+        history = TelemetryHistory()
+        stats = replay_flight(path, history=history)
+
+    return {
+        "log_packets": packets,
+        "log_duration_s": stats.log_duration_s,
+        "dispatched": stats.messages,
+        "elapsed_s": stats.elapsed_s,
+        "messages_per_s": stats.messages_per_s,
+        "speedup": stats.speedup,
+        "history_len": len(history),
+    }
+
+
+def _percentile_ms(samples: list, pct: float) -> float:
+    return float(np.percentile(samples, pct)) * 1000.0
+
+
+def _wait_ack(master, command: int, timeout: float = 1.0):
+    """
+    Дождаться COMMAND_ACK именно для command (чужие ACK пропускаются).
+    """
+    end_time = time.perf_counter() + timeout
+    while True:
+        remaining = end_time - time.perf_counter()
+        if remaining <= 0:
+            return None
+        ack = master.recv_match(type='COMMAND_ACK', blocking=True, timeout=remaining)
+        if ack is not None and ack.command == command:
+            return ack
+
+
+@benchmark("command_ack")
+def bench_command_ack(repeats: int = 200) -> dict:
+    """
+    Задержка COMMAND_ACK для arm / takeoff / set_mode из flight_control
+    и пакет из трёх команд «в полёте» одновременно (command_ack.CommandTracker).
+    """
+    vehicle, master = _loopback_link()
+    latencies = {"arm": [], "takeoff": [], "set_mode": [], "batch_of_3": []}
+    lost = 0
+    tracker = get_tracker(master)
+    batch = (
+        (mavutil.mavlink.MAV_CMD_DO_SET_MODE,
+         (mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED, COPTER_MODES['GUIDED'])),
+        (mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL,
+         (mavutil.mavlink.MAVLINK_MSG_ID_SYS_STATUS, 500_000)),
+        (mavutil.mavlink.MAV_CMD_REQUEST_MESSAGE,
+         (mavutil.mavlink.MAVLINK_MSG_ID_AUTOPILOT_VERSION,)),
+    )
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            flight_control.set_mode(master, "GUIDED", timeout=0)
+            if _wait_ack(master, mavutil.mavlink.MAVLINK_MSG_ID_SET_MODE) is None:
+                lost += 1
+            else:
+                latencies["set_mode"].append(time.perf_counter() - start)
+
+            for name, call in (("arm", lambda: flight_control.arm(master)),
+                               ("takeoff", lambda: flight_control.takeoff(master, 10.0)),
+                               ("batch_of_3", lambda: [pending.result() for pending in
+                                                       [tracker.submit(command, params)
+                                                        for command, params in batch]])):
+                start = time.perf_counter()
+                try:
+                    call()
+                except CommandError:
+                    lost += 1
+                    continue
+                latencies[name].append(time.perf_counter() - start)
+    finally:
+        _close_loopback_link(vehicle, master)
+
+    result = {"repeats": repeats, "lost_acks": lost,
+              "retries": sum(stats.retries for stats in tracker.stats.values())}
+    for name, samples in latencies.items():
+        result[f"{name}_p50_ms"] = _percentile_ms(samples, 50)
+        result[f"{name}_p99_ms"] = _percentile_ms(samples, 99)
+    return result
+
+
+@benchmark("goto_local_ned")
+def bench_goto_local_ned(n_commands: int = 20_000) -> dict:
+    """
+    Скорость отправки SET_POSITION_TARGET_LOCAL_NED через goto_local_ned.
+    """
+    vehicle, master = _loopback_link()
+    try:
+        start = time.perf_counter()
+        for i in range(n_commands):
+            goto_local_ned(master, x=i % 50, y=2, z=-10)
+        elapsed = time.perf_counter() - start
+    finally:
+        _close_loopback_link(vehicle, master)
+
+    return {
+        "commands": n_commands,
+        "send_us": elapsed / n_commands * 1e6,
+        "commands_per_s": n_commands / elapsed,
+    }
+
+
+@benchmark("async_fleet")
+def bench_async_fleet(n_vehicles: int = 24,
+                      position_rate_hz: float = 100.0,
+                      duration_s: float = 2.0) -> dict:
+    """
+    n_vehicles имитаций автопилота в одном event loop (async_link):
+    суммарный поток телеметрии и задержка set_mode + arm, выполняемых
+    для всех аппаратов одновременно. set_mode ждёт HEARTBEAT с новым
+    режимом, поэтому задержка — до периода HEARTBEAT (1 с).
+    """
+    vehicles = [FakeVehicle(port=0, sysid=i + 1,
+                            rates_hz={'GLOBAL_POSITION_INT': position_rate_hz}).start()
+                for i in range(n_vehicles)]
+
+    async def run() -> dict:
+        links = await asyncio.gather(*(async_link.connect(v.connection_string)
+                                       for v in vehicles))
+
+        async def prepare(link) -> float:
+            start = time.perf_counter()
+            await link.set_mode("GUIDED")
+            await link.arm()
+            return time.perf_counter() - start
+
+        latencies = await asyncio.gather(*(prepare(link) for link in links))
+
+        received = sum(link.messages for link in links)
+        start = time.perf_counter()
+        await asyncio.sleep(duration_s)
+        elapsed = time.perf_counter() - start
+        received = sum(link.messages for link in links) - received
+        for link in links:
+            link.close()
+
+        return {
+            "vehicles": n_vehicles,
+            "messages_per_s": received / elapsed,
+            "expected_per_s": n_vehicles * sum(vehicles[0].rates_hz.values()),
+            "prepare_p50_ms": _percentile_ms(latencies, 50),
+            "prepare_max_ms": max(latencies) * 1000.0,
+        }
+
+    try:
+        return asyncio.run(run())
+    finally:
+        for vehicle in vehicles:
+            vehicle.stop()
+
+
+@benchmark("fleet_scaling")
+def bench_fleet_scaling(fleet_sizes=(1, 8, 32),
+                        position_rate_hz: float = 50.0,
+                        duration_s: float = 2.0) -> dict:
+    """
+    Суммарный поток телеметрии Fleet (один общий поток приёма) для
+    разного числа имитаций автопилота. scaling_efficiency = поток на
+    самом большом флоте / (размер * поток на одном аппарате); 1.0 — линейно.
+    """
+    result = {}
+    for size in fleet_sizes:
+        vehicles = [FakeVehicle(port=0, sysid=i + 1,
+                                rates_hz={'GLOBAL_POSITION_INT': position_rate_hz}).start()
+                    for i in range(size)]
+        try:
+            with Fleet() as fleet:
+                fleet.connect_all([vehicle.connection_string for vehicle in vehicles])
+                received = fleet.messages
+                start = time.perf_counter()
+                time.sleep(duration_s)
+                rate = (fleet.messages - received) / (time.perf_counter() - start)
+        finally:
+            for vehicle in vehicles:
+                vehicle.stop()
+        result[f"fleet_{size}_messages_per_s"] = rate
+
+    per_vehicle = result[f"fleet_{fleet_sizes[0]}_messages_per_s"] / fleet_sizes[0]
+    largest = fleet_sizes[-1]
+    result["scaling_efficiency"] = result[f"fleet_{largest}_messages_per_s"] / (largest * per_vehicle)
+    return result
+
+
+@benchmark("fleet_upload")
+def bench_fleet_upload(n_vehicles: int = 10,
+                       n_items: int = 100,
+                       latency_s: float = 0.01,
+                       loss: float = 0.01) -> dict:
+    """
+    Загрузка одной миссии сразу в n_vehicles аппаратов (Fleet.upload_mission)
+    по каналу с задержкой latency_s и потерями loss — против загрузки в один.
+    parallel_efficiency = время для одного / время для всех; 1.0 — идеально.
+    """
+    vehicles = [FakeVehicle(port=0, sysid=i + 1, loss=loss, latency_s=latency_s, seed=i).start()
+                for i in range(n_vehicles)]
+    try:
+        with Fleet() as fleet:
+            fleet.connect_all([vehicle.connection_string for vehicle in vehicles])
+            # Одна миссия на всех: строится один раз
+            wp = build_mission_from_offsets(
+                fleet[1], BASE_LAT_DEG, BASE_LON_DEG,
+                np.linspace(0.0, 1000.0, n_items), np.zeros(n_items), 30.0)
+
+            start = time.perf_counter()
+            single = fleet.upload_mission(wp, sysids=[1])
+            single_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = fleet.upload_mission(wp)
+            fleet_s = time.perf_counter() - start
+    finally:
+        for vehicle in vehicles:
+            vehicle.stop()
+
+    failures = [sysid for sysid, result in {**single, **results}.items()
+                if isinstance(result, Exception)]
+    return {
+        "vehicles": n_vehicles,
+        "items": n_items,
+        "single_s": single_s,
+        "fleet_s": fleet_s,
+        "parallel_efficiency": single_s / fleet_s,
+        "failures": len(failures),
+        "all_uploaded": not failures and all(len(v.mission) == n_items for v in vehicles),
+    }
+
+
+# Потоки, которые ArduPilot шлёт по умолчанию сверх нужных проекту
+_ARDUPILOT_LIKE_RATES_HZ = {'ATTITUDE': 25.0, 'VFR_HUD': 4.0, 'GPS_RAW_INT': 5.0}
+
+
+@benchmark("stream_rates")
+def bench_stream_rates(duration_s: float = 2.0) -> dict:
+    """
+    Трафик канала до и после StreamRateManager (фаза "cruise"): ненужные
+    потоки отключены, нужные — на частоте фазы. subscribed_disabled —
+    сколько сообщений с подпиской оказались отключены (должно быть 0).
+    """
+    vehicle, master = _loopback_link(rates_hz=_ARDUPILOT_LIKE_RATES_HZ)
+
+    def measure():
+        messages = 0
+        size = 0
+        end = time.perf_counter() + duration_s
+        while time.perf_counter() < end:
+            msg = master.recv_match(blocking=True, timeout=0.1)
+            if msg is not None:
+                messages += 1
+                size += len(msg.get_msgbuf())
+        return messages / duration_s, size / duration_s
+
+    try:
+        rates = StreamRateManager(master, phase="cruise")
+        default_msgs, default_bytes = measure()
+        start = time.perf_counter()
+        rates.apply()
+        apply_s = time.perf_counter() - start
+        managed_msgs, managed_bytes = measure()
+
+        # Подписка на сообщение без частоты фазы не должна его отключать:
+        # ATTITUDE было отключено как ненужное, теперь возвращается к частоте по умолчанию
+        def on_attitude(master, msg, state):
+            pass
+        subscribe('ATTITUDE', on_attitude)
+        try:
+            rates.apply()
+            subscribed_disabled = sum(1 for msg_type in registry.types()
+                                      if rates.desired_rates().get(msg_type) == 0
+                                      or rates.requested.get(msg_type) == 0)
+        finally:
+            unsubscribe('ATTITUDE', on_attitude)
+        rates.detach()
+    finally:
+        _close_loopback_link(vehicle, master)
+
+    return {
+        "default_link_msgs_per_s": default_msgs,
+        "default_link_bytes_per_s": default_bytes,
+        "managed_link_msgs_per_s": managed_msgs,
+        "managed_link_bytes_per_s": managed_bytes,
+        "bandwidth_reduction": 1.0 - managed_bytes / default_bytes,
+        "apply_s": apply_s,
+        "subscribed_disabled": subscribed_disabled,
+    }
+
+
+# Метрики, которые описывают условия замера, а не его результат
+_INFO_METRICS = {"budget_s", "log_duration_s", "sent_per_s", "loss", "expected_per_s",
+                 "default_link_msgs_per_s", "default_link_bytes_per_s",
+                 "managed_link_msgs_per_s", "managed_link_bytes_per_s"}
+
+
+# Счётчики ошибок проверок корректности: должны оставаться на уровне
+# эталона (0), допуск tolerance к ним не применяется
+_ERROR_COUNTER_SUFFIXES = ("mismatches", "_torn", "lost_acks", "failures", "dropped", "_disabled")
+
+
+def _is_error_counter(key: str) -> bool:
+    return key.endswith(_ERROR_COUNTER_SUFFIXES)
+
+
+def _metric_direction(key: str) -> int:
+    """
+    +1 — чем больше, тем лучше (…_per_s, speedup, …_efficiency, bandwidth_reduction);
+    -1 — чем меньше, тем лучше (время: …_s, …_ms, …_us, …_ns; счётчики ошибок);
+    0 — справочное значение.
+    """
+    if key in _INFO_METRICS:
+        return 0
+    if _is_error_counter(key):
+        return -1
+    if key.endswith(("_per_s", "_efficiency")) or key in ("speedup", "bandwidth_reduction"):
+        return 1
+    if {"s", "ms", "us", "ns"} & set(key.split("_")):
+        return -1
+    return 0
+
+
+# Единицы времени в именах метрик, с
+_TIME_UNITS = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9}
+# Хвосты распределения задержек: один поздний такт планировщика — и метрика «хуже» вдвое
+_TAIL_TOKENS = {"p99", "p95", "max"}
+# Времена меньше этого (в эталоне) на другой машине или под нагрузкой
+# меняются в разы; с эталоном не сравниваются
+_MIN_GATED_S = 1e-3
+
+
+def _metric_gate(key: str, ref) -> str:
+    """
+    Как сравнивать метрику с эталоном:
+    "counter" — счётчик ошибок, не должен расти;
+    "ratio" — отношение (speedup, …_efficiency, bandwidth_reduction): от машины
+              почти не зависит, допуск tolerance;
+    "timing" — абсолютное время или пропускная способность на машине эталона:
+               допуск timing_tolerance;
+    None — не сравнивается: справочные значения, хвосты задержек (p99, max)
+           и времена меньше _MIN_GATED_S.
+    """
+    if _is_error_counter(key):
+        return "counter"
+    direction = _metric_direction(key)
+    if direction == 0:
+        return None
+    if direction > 0:
+        return "timing" if key.endswith("_per_s") else "ratio"
+    tokens = set(key.split("_"))
+    if tokens & _TAIL_TOKENS:
+        return None
+    unit = min(_TIME_UNITS[token] for token in tokens & set(_TIME_UNITS))
+    if ref * unit < _MIN_GATED_S:
+        return None
+    return "timing"
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float,
+                          timing_tolerance: float = 2.0) -> list:
+    """
+    Список регрессий:
+      - проверка (bool), которая в эталоне проходила, теперь не проходит;
+      - счётчик ошибок вырос (в том числе с нуля);
+      - отношение хуже эталона больше чем на tolerance (доля);
+      - абсолютное время или пропускная способность хуже эталона больше
+        чем в 1 + timing_tolerance раз (эталон снят на другой машине).
+    Хвосты задержек и времена меньше 1 мс только печатаются (см. _metric_gate).
+    """
+    regressions = []
+    baseline_results = baseline.get("results", {})
+    for name, metrics in results.items():
+        reference = baseline_results.get(name, {})
+        for key, value in metrics.items():
+            if key not in reference:
+                continue
+            ref = reference[key]
+            if isinstance(value, bool):
+                if ref is True and value is False:
+                    regressions.append(f"{name}.{key}: было True, стало False")
+                continue
+            gate = _metric_gate(key, ref)
+            if gate == "counter":
+                if value > ref:
+                    regressions.append(f"{name}.{key}: {value} > {ref} (эталон)")
+                continue
+            if gate is None or not ref:
+                continue
+            direction = _metric_direction(key)
+            if gate == "ratio":
+                worse = value < ref * (1 - tolerance)
+            elif direction > 0:
+                worse = value * (1 + timing_tolerance) < ref
+            else:
+                worse = value > ref * (1 + timing_tolerance)
+            if worse:
+                sign = "<" if direction > 0 else ">"
+                regressions.append(f"{name}.{key}: {value:.6g} {sign} {ref:.6g} (эталон)")
+    return regressions
+
+
+def _best_of(runs: list) -> dict:
+    """
+    Лучшее значение каждой метрики по нескольким прогонам (меньше шума):
+    максимум для «больше — лучше», минимум для времени, последнее для справочных.
+    Проверки корректности не усредняются удачей: bool — все прогоны прошли,
+    счётчик ошибок — худший прогон.
+    """
+    best = dict(runs[-1])
+    for key in best:
+        values = [run[key] for run in runs]
+        if isinstance(values[0], bool):
+            best[key] = all(values)
+        elif _is_error_counter(key):
+            best[key] = max(values)
+        elif _metric_direction(key) > 0:
+            best[key] = max(values)
+        elif _metric_direction(key) < 0:
+            best[key] = min(values)
+    return best
+
+
+def run_benchmarks(names: list, repeat: int = 1) -> dict:
+    """
+    Выполнить замеры (каждый repeat раз, берётся лучший результат)
+    и вернуть документ для JSON: {"meta": ..., "results": ...}.
+    """
+    results = {}
+    for name in names:
+        result = _best_of([BENCHMARKS[name]() for _ in range(repeat)])
+        results[name] = result
+        print(f"[{name}]")
+        for key, value in result.items():
+            if isinstance(value, float):
+                print(f"  {key}: {value:.6g}")
+            else:
+                print(f"  {key}: {value}")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности")
+    parser.add_argument("names", nargs="*", help=f"замеры: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--json", help="записать результаты в JSON-файл")
+    parser.add_argument("--baseline", help="сравнить с эталоном (JSON от --json/--save-baseline)")
+    parser.add_argument("--save-baseline", help="записать результаты как новый эталон")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="прогонов каждого замера, берётся лучший (по умолчанию 3)")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="допустимое ухудшение отношений (speedup, efficiency, "
+                             "reduction) относительно эталона (доля, по умолчанию 0.5)")
+    parser.add_argument("--timing-tolerance", type=float, default=2.0,
+                        help="допустимое ухудшение абсолютных времён и пропускной "
+                             "способности (доля, по умолчанию 2.0 — втрое)")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"неизвестный замер: {name}")
+
+    document = run_benchmarks(names, args.repeat)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(document, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(document["results"], baseline, args.tolerance,
+                                            args.timing_tolerance)
+        if regressions:
+            print("РЕГРЕССИИ относительно эталона:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("Регрессий относительно эталона нет.")
+
+
+if __name__ == "__main__":
+    main()
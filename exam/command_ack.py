@@ -0,0 +1,334 @@
+# command_ack.py
+#
+# Сопоставление COMMAND_ACK с отправленными командами.
+# Ожидающие команды лежат в таблице по ключу (target_system, command):
+# каждый ACK доставляется именно тому, кто ждёт эту команду от этого
+# аппарата, поэтому несколько команд могут быть «в полёте» одновременно,
+# а чужой ACK (другая команда, другой аппарат) никого не обманет.
+#
+#   ack = send_command(master, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, (1,))
+#
+#   tracker = get_tracker(master)
+#   a = tracker.submit(mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL, (33, 100000))
+#   b = tracker.submit(mavutil.mavlink.MAV_CMD_REQUEST_MESSAGE, (148,))
+#   a.result(); b.result()
+#   print(tracker.stats)
+
+from collections import deque
+from dataclasses import dataclass, field
+import threading
+import time
+import weakref
+
+import numpy as np
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+from drone_monitor import is_monitored
+
+
+class CommandError(Exception):
+    """
+    Автопилот отклонил команду или не ответил на неё.
+    """
+
+
+@dataclass
+class CommandStats:
+    """
+    Статистика по одному типу команды (MAV_CMD_*).
+    """
+    sent: int = 0         # Отправлено COMMAND_LONG (вместе с повторами)
+    retries: int = 0      # Повторы по таймауту
+    accepted: int = 0     # MAV_RESULT_ACCEPTED
+    rejected: int = 0     # Любой другой окончательный результат
+    timeouts: int = 0     # Ответа так и не было
+    # Время от последней отправки до ACK, с (последние 1000 команд)
+    latencies_s: deque = field(default_factory=lambda: deque(maxlen=1000), repr=False)
+
+    def percentile_ms(self, pct: float) -> float:
+        if not self.latencies_s:
+            return 0.0
+        return float(np.percentile(self.latencies_s, pct)) * 1000.0
+
+
+def send_command_long(master, command: int, params: tuple, confirmation: int = 0,
+                      target_system: int = None, target_component: int = None) -> None:
+    """
+    Отправить COMMAND_LONG с параметрами params (до 7, недостающие = 0).
+    confirmation: 0 для первой отправки, +1 на каждый повтор.
+    """
+    params = tuple(params) + (0,) * (7 - len(params))
+    master.mav.command_long_send(
+        master.target_system if target_system is None else target_system,
+        master.target_component if target_component is None else target_component,
+        command,
+        confirmation,
+        *params
+    )
+
+
+class CommandAttempts:
+    """
+    Правила ожидания ответа на одну команду, без чтения соединения —
+    общие для PendingCommand.result (потоки) и AsyncLink.command (asyncio).
+    Без ACK до дедлайна команда повторяется (confirmation + 1) до retries
+    раз, MAV_RESULT_IN_PROGRESS продлевает ожидание на timeout, окончательный
+    ACK -> результат или CommandError. Счётчики — в stats (CommandStats).
+    """
+
+    def __init__(self, command: int, timeout: float, retries: int, stats: CommandStats):
+        self.command = command
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = stats
+        self.confirmation = 0    # для следующей отправки
+        self.sent_at = 0.0
+        self.deadline = 0.0
+
+    def sent(self) -> None:
+        """
+        Команда отправлена (первый раз или повтор): отсчёт ожидания заново.
+        """
+        self.sent_at = time.perf_counter()
+        self.deadline = self.sent_at + self.timeout
+        self.stats.sent += 1
+
+    def in_progress(self) -> None:
+        """
+        Пришёл MAV_RESULT_IN_PROGRESS: автопилот выполняет команду, ждём дальше без повтора.
+        """
+        self.deadline = time.perf_counter() + self.timeout
+
+    def remaining(self) -> float:
+        return self.deadline - time.perf_counter()
+
+    def retry(self) -> int:
+        """
+        Дедлайн прошёл без ответа: confirmation для повтора или
+        CommandError, если повторы кончились.
+        """
+        if self.confirmation >= self.retries:
+            self.stats.timeouts += 1
+            raise CommandError(f"Нет COMMAND_ACK на команду {self.command} "
+                               f"после {self.retries} повторов")
+        self.confirmation += 1
+        self.stats.retries += 1
+        return self.confirmation
+
+    def acknowledged(self, ack) -> None:
+        """
+        Учесть окончательный ACK (не IN_PROGRESS) в статистике.
+        """
+        self.stats.latencies_s.append(time.perf_counter() - self.sent_at)
+        if ack.result == mavutil.mavlink.MAV_RESULT_ACCEPTED:
+            self.stats.accepted += 1
+        else:
+            self.stats.rejected += 1
+
+    def check(self, ack):
+        """
+        ACK с MAV_RESULT_ACCEPTED -> ack, иначе CommandError.
+        """
+        if ack.result != mavutil.mavlink.MAV_RESULT_ACCEPTED:
+            raise CommandError(f"Команда {self.command} отклонена: result={ack.result}")
+        return ack
+
+
+class PendingCommand:
+    """
+    Команда, ожидающая COMMAND_ACK (см. CommandTracker.submit).
+    """
+
+    def __init__(self, tracker: "CommandTracker", target_system: int, target_component: int,
+                 command: int, params: tuple, timeout: float, retries: int):
+        self.tracker = tracker
+        self.target_system = target_system
+        self.target_component = target_component
+        self.command = command
+        self.params = params
+        self.timeout = timeout
+        self.retries = retries
+
+        self.attempts = CommandAttempts(command, timeout, retries, tracker._stats(command))
+        self.ack = None          # окончательный COMMAND_ACK
+        self.progress = None     # последний MAV_RESULT_IN_PROGRESS
+        self.error = None        # CommandError, если команду заменили
+        self._event = threading.Event()    # ответ получен (или команда заменена)
+        self._wakeup = threading.Event()   # будит ожидающего: ответ или IN_PROGRESS
+
+    @property
+    def key(self) -> tuple:
+        return (self.target_system, self.command)
+
+    @property
+    def confirmation(self) -> int:
+        return self.attempts.confirmation
+
+    @property
+    def sent_at(self) -> float:
+        return self.attempts.sent_at
+
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def _send(self) -> None:
+        send_command_long(self.tracker.master, self.command, self.params, self.attempts.confirmation,
+                          self.target_system, self.target_component)
+        self.attempts.sent()
+
+    def _finish(self, ack=None, error: CommandError = None) -> None:
+        self.ack = ack
+        self.error = error
+        self._event.set()
+        self._wakeup.set()
+
+    def result(self):
+        """
+        Дождаться ответа: без ACK команда повторяется (confirmation + 1)
+        до retries раз, MAV_RESULT_IN_PROGRESS продлевает ожидание.
+        Возвращает COMMAND_ACK с MAV_RESULT_ACCEPTED, иначе CommandError.
+        """
+        tracker = self.tracker
+        attempts = self.attempts
+        progress = None
+        try:
+            while not self._event.is_set():
+                if self.progress is not progress:
+                    progress = self.progress
+                    attempts.in_progress()
+                remaining = attempts.remaining()
+                if remaining > 0:
+                    tracker._wait(self, remaining)
+                    continue
+                attempts.retry()
+                self._send()
+        finally:
+            tracker._release(self)
+
+        if self.error is not None:
+            raise self.error
+        return attempts.check(self.ack)
+
+
+class CommandTracker:
+    """
+    Таблица ожидающих команд одного соединения.
+
+    ACK ловит хук master.message_hooks, поэтому не важно, какой поток читает
+    соединение. Если его читает monitor_loop, ожидающие просто ждут события;
+    иначе ожидающий сам читает соединение (по одному потоку за раз).
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self.stats = {}              # MAV_CMD_* -> CommandStats
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._pending = {}           # (target_system, command) -> PendingCommand
+        master.message_hooks.append(self._on_message)
+
+    def _stats(self, command: int) -> CommandStats:
+        stats = self.stats.get(command)
+        if stats is None:
+            stats = self.stats.setdefault(command, CommandStats())
+        return stats
+
+    def submit(self, command: int, params: tuple = (),
+               timeout: float = 1.0, retries: int = 3,
+               target_system: int = None, target_component: int = None) -> PendingCommand:
+        """
+        Отправить команду и сразу вернуть PendingCommand; ответ — через .result().
+        Новая команда с тем же (target_system, command) заменяет ожидающую:
+        различить их ACK невозможно, и ответ получит последняя.
+        """
+        master = self.master
+        pending = PendingCommand(
+            self,
+            master.target_system if target_system is None else target_system,
+            master.target_component if target_component is None else target_component,
+            command, tuple(params), timeout, retries)
+        with self._lock:
+            previous = self._pending.get(pending.key)
+            self._pending[pending.key] = pending
+        if previous is not None:
+            previous._finish(error=CommandError(f"Команда {command} заменена повторной"))
+        pending._send()
+        return pending
+
+    def _on_message(self, mav, msg) -> None:
+        # хук pymavlink: вызывается для каждого принятого сообщения
+        if msg.get_type() != 'COMMAND_ACK':
+            return
+        pending = self._pending.get((msg.get_srcSystem(), msg.command))
+        if pending is None or pending.done():
+            return  # ACK на чужую или уже завершённую команду
+        if msg.result == mavutil.mavlink.MAV_RESULT_IN_PROGRESS:
+            pending.progress = msg
+            pending._wakeup.set()   # result() продлит ожидание
+            return
+        pending.attempts.acknowledged(msg)
+        pending._finish(ack=msg)
+
+    def _wait(self, pending: PendingCommand, timeout: float) -> None:
+        """
+        Подождать ответа не дольше timeout (хук может сработать раньше).
+        """
+        if is_monitored(self.master):
+            # соединение читает поток мониторинга: хук разбудит при ответе
+            # или IN_PROGRESS, а result() после пробуждения всё перепроверит
+            pending._wakeup.wait(timeout)
+            pending._wakeup.clear()
+            return
+        if not self._read_lock.acquire(blocking=False):
+            # читает другой ожидающий: ACK придёт через хук, но тот может
+            # закончить чтение раньше — тогда читать придётся нам
+            pending._wakeup.wait(min(timeout, 0.01))
+            pending._wakeup.clear()
+            return
+        try:
+            self.master.recv_match(type='COMMAND_ACK', blocking=True, timeout=min(timeout, 0.05))
+        finally:
+            self._read_lock.release()
+
+    def _release(self, pending: PendingCommand) -> None:
+        with self._lock:
+            if self._pending.get(pending.key) is pending:
+                del self._pending[pending.key]
+
+    def detach(self) -> None:
+        if self._on_message in self.master.message_hooks:
+            self.master.message_hooks.remove(self._on_message)
+
+
+# master -> CommandTracker
+_trackers = weakref.WeakKeyDictionary()
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(master) -> CommandTracker:
+    """
+    Таблица ожидающих команд для master (создаётся при первом вызове).
+    """
+    tracker = _trackers.get(master)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.get(master)
+            if tracker is None:
+                tracker = _trackers[master] = CommandTracker(master)
+    return tracker
+
+
+def send_command(master, command: int, params: tuple = (),
+                 timeout: float = 1.0, retries: int = 3):
+    """
+    Отправить COMMAND_LONG и дождаться COMMAND_ACK именно на неё.
+    Возвращает ACK; отказ или молчание -> CommandError.
+    """
+    return get_tracker(master).submit(command, params, timeout, retries).result()
+
+
+def command_stats(master) -> dict:
+    """
+    MAV_CMD_* -> CommandStats для команд, отправленных через master.
+    """
+    return get_tracker(master).stats
@@ -0,0 +1,115 @@
+# coverage_planner.py
+#
+# Облёт площади «змейкой» (boustrophedon) внутри многоугольника.
+# Многоугольник один раз переводится на локальную плоскость (север, восток)
+# с центром внутри зоны (geo_frame: Transformer pyproj для этого центра
+# создаётся один раз и кэшируется). На плоскости все галсы через ширину захвата
+# строятся и обрезаются по границе матричными операциями numpy, а готовые
+# точки переводятся обратно в lat/lon одним вызовом. Миссия собирается
+# пакетным построителем из mission_builder.py.
+#
+#   lat, lon = plan_coverage(polygon, swath_m=20, heading_deg=30)
+#   wp_loader = build_coverage_mission(master, polygon, swath_m=20, heading_deg=30, alt_m=40)
+
+import numpy as np
+from pymavlink import mavutil, mavwp  # для связи с дроном по MAVLink
+
+from geo_frame import get_frame
+from mission_builder import add_waypoints_latlon
+
+
+def _sweep_segments(u, v, swath_m: float):
+    """
+    Галсы вдоль оси u через swath_m по оси v, обрезанные многоугольником (u, v).
+    Пересечения всех галсов со всеми сторонами — одна матрица (галс × сторона).
+    Возвращает (начало_u, конец_u, v, номер_галса) отрезков в порядке облёта.
+    """
+    v_min, v_max = v.min(), v.max()
+    lines_v = np.arange(v_min + swath_m / 2, v_max, swath_m)
+    if len(lines_v) == 0:
+        lines_v = np.array([(v_min + v_max) / 2])
+
+    # Стороны (u1, v1) -> (u2, v2); полуоткрытое условие — вершина на галсе
+    # засчитывается одной стороне
+    u1, v1 = u, v
+    u2, v2 = np.roll(u, -1), np.roll(v, -1)
+    line = lines_v[:, None]
+    crosses = (v1 <= line) != (v2 <= line)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u_cross = np.where(crosses, u1 + (line - v1) * (u2 - u1) / (v2 - v1), np.nan)
+    u_cross.sort(axis=1)   # NaN — в конце строки
+
+    # Пересечения по порядку вдоль каждого галса: пары (вход, выход)
+    valid = ~np.isnan(u_cross)
+    line_index = np.nonzero(valid)[0]
+    u_flat = u_cross[valid]
+    start, end, seg_line = u_flat[0::2], u_flat[1::2], line_index[0::2]
+
+    # Змейка: нечётные галсы летим в обратную сторону
+    odd = seg_line % 2 == 1
+    start, end = np.where(odd, end, start), np.where(odd, start, end)
+    order = np.lexsort((np.where(odd, -start, start), seg_line))
+    return start[order], end[order], lines_v[seg_line[order]], seg_line[order]
+
+
+def plan_coverage(polygon, swath_m: float, heading_deg: float = 0.0,
+                  point_spacing_m: float = None, origin=None):
+    """
+    Точки облёта площади внутри polygon [(lat, lon), ...] галсами
+    через swath_m в направлении heading_deg (0 — север, 90 — восток).
+
+    point_spacing_m: None — только концы галсов; иначе точки вдоль галса
+                     не реже чем через point_spacing_m (например, для съёмки).
+    origin: (lat, lon) центра локальной плоскости; по умолчанию — среднее
+            вершин (округлённое, чтобы система бралась из кэша get_frame).
+    Если галс пересекает многоугольник несколько раз (невыпуклая зона),
+    его отрезки облетаются по порядку, промежуток — по прямой.
+    Возвращает (lat_deg, lon_deg) — массивы numpy в порядке облёта.
+    """
+    points = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    if origin is None:
+        origin = np.round(points.mean(axis=0), 6)
+    frame = get_frame(float(origin[0]), float(origin[1]))
+    north, east, _ = frame.to_ned(points[:, 0], points[:, 1])
+
+    # Поворот: u — вдоль галса (по курсу), v — поперёк
+    heading = np.radians(heading_deg)
+    sin_h, cos_h = np.sin(heading), np.cos(heading)
+    u = east * sin_h + north * cos_h
+    v = east * cos_h - north * sin_h
+
+    start, end, line_v, _ = _sweep_segments(u, v, swath_m)
+    if point_spacing_m is None:
+        u_points = np.column_stack([start, end]).ravel()
+        v_points = np.repeat(line_v, 2)
+    else:
+        counts = np.ceil(np.abs(end - start) / point_spacing_m).astype(np.int64) + 1
+        segment = np.repeat(np.arange(len(start)), counts)
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        fraction = index / np.maximum(counts - 1, 1)[segment]
+        u_points = start[segment] + (end - start)[segment] * fraction
+        v_points = line_v[segment]
+
+    # Обратный поворот (матрица поворота симметрична и ортогональна)
+    east = u_points * sin_h + v_points * cos_h
+    north = u_points * cos_h - v_points * sin_h
+    lat, lon, _ = frame.to_geodetic(north, east)
+    return np.asarray(lat), np.asarray(lon)
+
+
+def build_coverage_mission(master: mavutil.mavfile,
+                           polygon,
+                           swath_m: float,
+                           heading_deg: float,
+                           alt_m: float,
+                           point_spacing_m: float = None,
+                           wp_loader: mavwp.MAVWPLoader = None,
+                           current_seq: int = 0) -> mavwp.MAVWPLoader:
+    """
+    Миссия облёта площади: точки plan_coverage одним пакетом
+    (add_waypoints_latlon) в конец wp_loader (или в новый MAVWPLoader).
+    """
+    if wp_loader is None:
+        wp_loader = mavwp.MAVWPLoader()
+    lat, lon = plan_coverage(polygon, swath_m, heading_deg, point_spacing_m)
+    return add_waypoints_latlon(wp_loader, master, lat, lon, alt_m, current_seq=current_seq)
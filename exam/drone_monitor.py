@@ -1,17 +1,50 @@
 # drone_monitor.py
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import threading
 import time
+from typing import NamedTuple
+import weakref
 
 from pymavlink import mavutil  # для работы с протоколом MAVLink
 
+from geo_frame import LocalFrame, get_frame
+from vehicle_profile import is_from_vehicle, profile_from_autopilot_version, profile_from_heartbeat
+
+
+class DroneSnapshot(NamedTuple):
+    """
+    Неизменяемый снимок DroneState на момент одного сообщения.
+    NamedTuple — это кортеж с __slots__ = (): поля нельзя изменить,
+    поэтому lat_deg/lon_deg в одном снимке всегда согласованы.
+    """
+    seq: int                  # Номер снимка (растёт на 1 с каждой публикацией)
+    recv_time: float          # Время приёма сообщения (time.time())
+
+    mode: str
+    armed: bool
+
+    lat_deg: float
+    lon_deg: float
+    alt_rel_m: float
+
+    north_m: float            # Положение в NED от home (см. DroneState.frame)
+    east_m: float
+    down_m: float
+
+    battery_voltage_v: float
+    battery_remaining_pct: float
+
 
 @dataclass
 class DroneState:
     """
     Простая структура с текущим состоянием дрона.
     Обновляется только в потоке мониторинга.
-    Остальной код состояние ТОЛЬКО читает.
+    Остальной код состояние ТОЛЬКО читает — лучше через snapshot():
+    отдельные поля обновляются по одному и могут быть прочитаны
+    «наполовину» (новая широта со старой долготой).
+    Дождаться события без опроса в цикле — wait_until / wait_mode / wait_armed.
     """
     last_update: float = 0.0  # Время последнего обновления (time.time()).
 
@@ -22,36 +55,126 @@ class DroneState:
     lon_deg: float = 0.0      # Долгота в градусах (WGS84, lon/1e7)
     alt_rel_m: float = 0.0    # Относительная высота, м (relative_alt/1000 из GLOBAL_POSITION_INT)
 
+    # Те же координаты в NED от home, м (заполняются вместе с lat/lon)
+    north_m: float = 0.0
+    east_m: float = 0.0
+    down_m: float = 0.0       # -alt_rel_m
+
+    # Система NED с началом в home (HOME_POSITION, а до него — первая точка
+    # GLOBAL_POSITION_INT); её же используют goto_local_ned и построители миссий
+    frame: LocalFrame = field(default=None, repr=False, compare=False)
+
     battery_voltage_v: float = 0.0        # Напряжение батареи, В (voltage_battery/1000 из SYS_STATUS)
     battery_remaining_pct: float = 0.0    # Остаток батареи, % (battery_remaining из SYS_STATUS)
 
+    # Последний опубликованный снимок (см. publish/snapshot)
+    _snapshot: DroneSnapshot = field(default=None, init=False, repr=False, compare=False)
+
+    # Ожидание условий (wait_until): будит publish, только если кто-то ждёт
+    _changed: threading.Condition = field(default_factory=threading.Condition,
+                                          init=False, repr=False, compare=False)
+    _waiting: int = field(default=0, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.publish(self.last_update, seq=0)
+
+    def publish(self, recv_time: float, seq: int = None) -> DroneSnapshot:
+        """
+        Опубликовать снимок текущих полей. Вызывает только поток мониторинга
+        после обработки сообщения. Присваивание ссылки атомарно, поэтому
+        читатели получают либо старый, либо новый снимок целиком — без блокировок.
+        """
+        if seq is None:
+            seq = self._snapshot.seq + 1
+        snapshot = DroneSnapshot(
+            seq,
+            recv_time,
+            self.mode,
+            self.armed,
+            self.lat_deg,
+            self.lon_deg,
+            self.alt_rel_m,
+            self.north_m,
+            self.east_m,
+            self.down_m,
+            self.battery_voltage_v,
+            self.battery_remaining_pct,
+        )
+        self._snapshot = snapshot
+        if self._waiting:
+            # Снимок уже опубликован: ждущий либо увидит его при проверке,
+            # либо уже спит в wait() и получит notify
+            with self._changed:
+                self._changed.notify_all()
+        return snapshot
+
+    def snapshot(self) -> DroneSnapshot:
+        """
+        Последний согласованный снимок состояния (чтение без блокировок,
+        стоимость не зависит от числа читающих потоков).
+        """
+        return self._snapshot
+
+    def wait_until(self, predicate, timeout: float = None):
+        """
+        Ждать, пока predicate(снимок) не станет истинным, например
+        state.wait_until(lambda s: s.alt_rel_m > 29, timeout=30).
+        Поток спит на условной переменной и просыпается на каждой
+        публикации снимка (задержка реакции — один период сообщения).
+        Возвращает подходящий снимок или None по таймауту.
+        """
+        snapshot = self._snapshot
+        if predicate(snapshot):
+            return snapshot
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            self._waiting += 1
+            try:
+                while True:
+                    snapshot = self._snapshot
+                    if predicate(snapshot):
+                        return snapshot
+                    if deadline is None:
+                        self._changed.wait()
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._changed.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def wait_mode(self, mode: str, timeout: float = None):
+        """
+        Ждать режим mode ("GUIDED", "AUTO", ...). Снимок или None по таймауту.
+        """
+        return self.wait_until(lambda s: s.mode == mode, timeout)
+
+    def wait_armed(self, armed: bool = True, timeout: float = None):
+        """
+        Ждать ARM (armed=False — DISARM). Снимок или None по таймауту.
+        """
+        return self.wait_until(lambda s: s.armed == armed, timeout)
+
 
 def _handle_heartbeat(master, msg, state: DroneState) -> None:
     """
     Обновление режима и статуса ARM по HEARTBEAT
     """
+    if not is_from_vehicle(master, msg):
+        return  # HEARTBEAT от GCS, подвеса или другого аппарата
+
     # По MAV_MODE_FLAG_SAFETY_ARMED узнаём, включен ли ARM
     state.armed = bool(msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
 
-    # 2. Определяем режим по custom_mode.
-    #
-    # Pymavlink для ArduPilot умеет строить словарь "имя режима" -> "номер режима"
-    # через master.mode_mapping()
-    # В сообщении HEARTBEAT номер режима лежит в поле custom_mode
-    #
-    # У каждого msg есть ссылка на соединение в msg._master (это тот самый master,
-    # который вы передаёте в monitor_loop)
-
-    mode_mapping = master.mode_mapping()
-    if not mode_mapping:
-        return
-
-    # mode_mapping: {'STABILIZE': 0, 'ACRO': 1, 'ALT_HOLD': 2, 'AUTO': 3, ...}
-    # Нужно обратить этот словарь: номер -> имя.
-    inv_mode_mapping = {mode_id: name for name, mode_id in mode_mapping.items()}
+    # Определяем режим по custom_mode.
+    # Таблицы "имя <-> номер режима" лежат в профиле аппарата и строятся
+    # один раз, а не на каждый HEARTBEAT.
+    profile = profile_from_heartbeat(master, msg)
 
-    mode_id = msg.custom_mode  # текущее значение режима из HEARTBEAT. [web:100]
-    mode_name = inv_mode_mapping.get(mode_id)
+    mode_id = msg.custom_mode  # текущее значение режима из HEARTBEAT
+    mode_name = profile.mode_names.get(mode_id)
 
     if mode_name is not None:
         state.mode = mode_name
@@ -59,7 +182,15 @@ def _handle_heartbeat(master, msg, state: DroneState) -> None:
         # Если режим неизвестен маппингу (например, кастомный), хотя бы сохраняем его номер.
         state.mode = f"UNKNOWN({mode_id})"
 
-def _handle_global_position_int(msg, state: DroneState) -> None:
+
+def _handle_autopilot_version(master, msg, state: DroneState) -> None:
+    """
+    Версия прошивки и возможности автопилота -> профиль аппарата
+    """
+    profile_from_autopilot_version(master, msg)
+
+
+def _handle_global_position_int(master, msg, state: DroneState) -> None:
     """
     Обновление координат и относительной высоты по GLOBAL_POSITION_INT
     """
@@ -67,8 +198,41 @@ def _handle_global_position_int(msg, state: DroneState) -> None:
     state.lon_deg = msg.lon / 1e7
     state.alt_rel_m = msg.relative_alt / 1000.0  # мм -> м
 
+    if state.frame is None:
+        if msg.lat == 0 and msg.lon == 0:
+            return  # ещё нет GPS
+        # HOME_POSITION пока не пришёл — начало NED в первой точке
+        state.frame = get_frame(state.lat_deg, state.lon_deg)
+    # Относительная высота уже от home: down = -alt_rel_m
+    state.north_m, state.east_m, _ = state.frame.to_ned(state.lat_deg, state.lon_deg)
+    state.down_m = -state.alt_rel_m
 
-def _handle_sys_status(msg, state: DroneState) -> None:
+
+def _handle_home_position(master, msg, state: DroneState) -> None:
+    """
+    Точка home -> начало системы NED (state.frame)
+    """
+    if msg.get_srcSystem() != master.target_system:
+        return
+    state.frame = get_frame(msg.latitude / 1e7, msg.longitude / 1e7)
+
+
+def request_home_position(master) -> None:
+    """
+    Попросить автопилот прислать HOME_POSITION (начало NED для DroneState).
+    Ответ обработает monitor_loop.
+    """
+    master.mav.command_long_send(
+        master.target_system,
+        master.target_component,
+        mavutil.mavlink.MAV_CMD_REQUEST_MESSAGE,
+        0,
+        mavutil.mavlink.MAVLINK_MSG_ID_HOME_POSITION,
+        0, 0, 0, 0, 0, 0
+    )
+
+
+def _handle_sys_status(master, msg, state: DroneState) -> None:
     """
     Обновление состояния батареи по SYS_STATUS
     """
@@ -77,32 +241,170 @@ def _handle_sys_status(msg, state: DroneState) -> None:
     state.battery_remaining_pct = float(msg.battery_remaining)
 
 
+class HandlerRegistry:
+    """
+    Реестр обработчиков сообщений: id сообщения -> обработчики.
+    Обработчик вызывается как handler(master, msg, state).
+
+    Подписка/отписка возможны из любого потока: списки обработчиков
+    заменяются целиком (новый кортеж), поэтому monitor_loop читает
+    их без блокировки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}   # msg_id -> tuple обработчиков
+        self._types = []      # имена типов для фильтра recv_match
+        self.version = 0      # растёт при каждом изменении подписок
+
+    def subscribe(self, msg_type: str, handler) -> None:
+        """
+        Подписать handler на сообщения msg_type ('HEARTBEAT', 'SYS_STATUS', ...).
+        """
+        msg_id = _msg_id(msg_type)
+        with self._lock:
+            handlers = self._handlers.get(msg_id, ())
+            if handler in handlers:
+                return
+            self._handlers = {**self._handlers, msg_id: handlers + (handler,)}
+            self._rebuild_types()
+
+    def unsubscribe(self, msg_type: str, handler) -> None:
+        """
+        Отписать handler; неизвестная подписка молча игнорируется.
+        """
+        msg_id = _msg_id(msg_type)
+        with self._lock:
+            handlers = tuple(h for h in self._handlers.get(msg_id, ()) if h != handler)
+            new_handlers = dict(self._handlers)
+            if handlers:
+                new_handlers[msg_id] = handlers
+            else:
+                new_handlers.pop(msg_id, None)
+            self._handlers = new_handlers
+            self._rebuild_types()
+
+    def _rebuild_types(self) -> None:
+        self._types = [mavutil.mavlink.mavlink_map[msg_id].msgname for msg_id in self._handlers]
+        self.version += 1
+
+    def types(self) -> list:
+        """
+        Типы сообщений, на которые сейчас есть подписчики.
+        """
+        return list(self._types)
+
+    def dispatch(self, master, msg, state) -> bool:
+        """
+        Вызвать обработчики msg. Возвращает False, если подписчиков нет.
+        """
+        handlers = self._handlers.get(msg.get_msgId())
+        if not handlers:
+            return False
+        for handler in handlers:
+            handler(master, msg, state)
+        return True
+
+
+def _msg_id(msg_type: str) -> int:
+    """
+    'GLOBAL_POSITION_INT' -> MAVLINK_MSG_ID_GLOBAL_POSITION_INT
+    """
+    msg_id = getattr(mavutil.mavlink, f"MAVLINK_MSG_ID_{msg_type}", None)
+    if msg_id is None:
+        raise ValueError(f"Неизвестный тип сообщения MAVLink: {msg_type}")
+    return msg_id
+
+
+# Реестр по умолчанию с обработчиками DroneState.
+# Другие модули добавляют свои обработчики через subscribe().
+registry = HandlerRegistry()
+registry.subscribe('HEARTBEAT', _handle_heartbeat)
+registry.subscribe('GLOBAL_POSITION_INT', _handle_global_position_int)
+registry.subscribe('SYS_STATUS', _handle_sys_status)
+registry.subscribe('AUTOPILOT_VERSION', _handle_autopilot_version)
+registry.subscribe('HOME_POSITION', _handle_home_position)
+
+
+def subscribe(msg_type: str, handler) -> None:
+    registry.subscribe(msg_type, handler)
+
+
+def unsubscribe(msg_type: str, handler) -> None:
+    registry.unsubscribe(msg_type, handler)
+
+
+def process_message(master, msg, state: DroneState,
+                    registry: HandlerRegistry = registry,
+                    history=None) -> bool:
+    """
+    Обработать одно принятое сообщение: вызвать обработчики и, если они
+    были, опубликовать снимок (и записать его в history).
+    Общая часть monitor_loop и асинхронного приёма (async_link.py).
+    """
+    if not registry.dispatch(master, msg, state):
+        return False
+
+    # Время приёма, которое pymavlink ставит каждому сообщению;
+    # при повторе .tlog (replay.py) это исходное время из записи.
+    now = msg._timestamp
+    state.last_update = now
+    snapshot = state.publish(now)
+    if history is not None:
+        history.append(snapshot)
+    return True
+
+
+# Соединения, которые сейчас читает monitor_loop (см. is_monitored)
+_monitored = weakref.WeakSet()
+
+
+def is_monitored(master) -> bool:
+    """
+    True, если соединение master сейчас читает monitor_loop в другом потоке:
+    тогда остальным не нужно (и небезопасно) вызывать recv_match самим —
+    сообщения можно получать через master.message_hooks.
+    """
+    return master in _monitored
+
+
 def monitor_loop(master: mavutil.mavlink_connection,
                  state: DroneState,
-                 stop_flag_getter=lambda: False) -> None:
+                 stop_flag_getter=lambda: False,
+                 registry: HandlerRegistry = registry,
+                 history=None) -> None:
     """
     Цикл опроса MAVLink-сообщений и обновления DroneState
     master: подключение к SITL/дрону.
     stop_flag_getter: функция без аргументов, возвращает True для остановки цикла.
+    registry: реестр обработчиков; фильтр recv_match строится по его подпискам.
+    history: TelemetryHistory (telemetry_history.py) — если задана, в неё
+             записывается каждый опубликованный снимок.
     """
+    _monitored.add(master)
+    try:
+        _monitor(master, state, stop_flag_getter, registry, history)
+    finally:
+        _monitored.discard(master)
+
+
+def _monitor(master, state, stop_flag_getter, registry, history) -> None:
+    version = None
+    types = None
     while not stop_flag_getter():
+        if version != registry.version:
+            # Подписки изменились — пересобираем фильтр
+            version = registry.version
+            types = registry.types()
+
         # Ждём одно из интересующих сообщений
         msg = master.recv_match(
-            # type=['HEARTBEAT', 'GLOBAL_POSITION_INT', 'SYS_STATUS'],
+            type=types,
             blocking=True,
             timeout=1
         )
-        now = time.time()
         if msg is None:
             # За это время просто ничего не пришло – ждём дальше.
             continue
 
-        msg_type = msg.get_type()
-        if msg_type == 'HEARTBEAT':
-            _handle_heartbeat(master, msg, state)
-        elif msg_type == 'GLOBAL_POSITION_INT':
-            _handle_global_position_int(msg, state)
-        elif msg_type == 'SYS_STATUS':
-            _handle_sys_status(msg, state)
-
-        state.last_update = now
+        process_message(master, msg, state, registry, history)
@@ -0,0 +1,556 @@
+# fake_vehicle.py
+#
+# Лёгкая замена SITL для офлайн-замеров и проверок: «автопилот» на Python,
+# который слушает TCP 127.0.0.1:14550 и говорит на том подмножестве
+# MAVLink, которое используют скрипты проекта:
+#   HEARTBEAT, GLOBAL_POSITION_INT, SYS_STATUS, AUTOPILOT_VERSION
+#   (и по запросу ATTITUDE, VFR_HUD, GPS_RAW_INT — как потоки ArduPilot),
+#   загрузка миссии (COUNT / WRITE_PARTIAL_LIST -> REQUEST_INT -> ITEM_INT -> ACK),
+#   SET_MODE, COMMAND_LONG (ARM/DISARM, TAKEOFF, LAND, DO_SET_MODE,
+#   REQUEST_MESSAGE, SET_MESSAGE_INTERVAL) с COMMAND_ACK,
+#   SET_POSITION_TARGET_LOCAL_NED / _GLOBAL_INT, HOME_POSITION по запросу.
+#
+# Запуск из папки exam:
+#   python fake_vehicle.py                       -> tcp:127.0.0.1:14550
+#   python fake_vehicle.py --port 14551 --loss 0.05
+# После этого return_base.py, "perimeter security.py" и т.д. работают без изменений.
+
+import argparse
+import heapq
+import itertools
+import math
+import random
+import select
+import socket
+import threading
+import time
+
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+from geo_frame import get_frame
+
+mavlink = mavutil.mavlink
+
+# Частоты сообщений по умолчанию, Гц
+DEFAULT_RATES_HZ = {
+    'HEARTBEAT': 1.0,
+    'GLOBAL_POSITION_INT': 10.0,
+    'SYS_STATUS': 2.0,
+}
+
+# Таблица режимов ArduCopter: имя -> custom_mode
+COPTER_MODES = mavutil.mode_mapping_byname(mavlink.MAV_TYPE_QUADROTOR)
+
+
+class FakeVehicle:
+    """
+    Имитация коптера ArduPilot на TCP-сокете.
+
+    Кинематика простая: аппарат летит к цели по прямой с ограничением
+    горизонтальной и вертикальной скорости. Позиция хранится в метрах
+    NED относительно home и пересчитывается в lat/lon через geo_frame
+    (та же система NED, что у DroneState.frame).
+
+    rates_hz: частоты телеметрии (имя сообщения -> Гц; 0 = не слать).
+    loss: вероятность потерять пакет в каждую сторону.
+    latency_s: задержка ответов аппарата (как у телеметрийного радиоканала).
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 14550,
+                 sysid: int = 1,
+                 compid: int = 1,
+                 home_lat_deg: float = 55.7558,
+                 home_lon_deg: float = 37.6173,
+                 rates_hz: dict = None,
+                 loss: float = 0.0,
+                 latency_s: float = 0.0,
+                 seed: int = 0,
+                 physics_hz: float = 50.0,
+                 horizontal_speed_m_s: float = 10.0,
+                 vertical_speed_m_s: float = 3.0):
+        self.host = host
+        self.sysid = sysid
+        self.compid = compid
+        self.home_lat_deg = home_lat_deg
+        self.home_lon_deg = home_lon_deg
+        self.frame = get_frame(home_lat_deg, home_lon_deg)
+        self.rates_hz = dict(DEFAULT_RATES_HZ)
+        if rates_hz:
+            self.rates_hz.update(rates_hz)
+        self.loss = loss
+        self.latency_s = latency_s
+        self.physics_hz = physics_hz
+        self.horizontal_speed_m_s = horizontal_speed_m_s
+        self.vertical_speed_m_s = vertical_speed_m_s
+        self._rng = random.Random(seed)
+
+        # Состояние аппарата
+        self.armed = False
+        self.custom_mode = COPTER_MODES['STABILIZE']
+        self.position_ned = [0.0, 0.0, 0.0]   # x - север, y - восток, z - вниз, м
+        self.target_ned = None                # цель полёта в NED или None
+        self.battery_remaining_pct = 100.0
+        self.mission = []                     # загруженные MISSION_ITEM_INT
+        self.mission_seq = 0                  # текущий пункт в AUTO
+
+        # Загрузка миссии
+        self._upload_items = None             # список, который заполняется при загрузке
+        self._upload_next = 0
+        self._upload_last = -1
+        self._upload_requested_at = 0.0
+        self._upload_client = None
+        self._upload_peer = (0, 0)            # (sysid, compid) загружающей GCS
+
+        # Счётчики для замеров
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+        self._mav = mavlink.MAVLink(None, srcSystem=sysid, srcComponent=compid)
+        self._boot = time.monotonic()
+        self._clients = {}                    # socket -> парсер MAVLink
+        self._outbox = []                     # задержанные пакеты: (когда, n, buf, targets)
+        self._outbox_n = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._listen = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen.bind((host, port))
+        self._listen.listen(8)
+        self.port = self._listen.getsockname()[1]  # port=0 -> выбран системой
+
+    @property
+    def connection_string(self) -> str:
+        return f"tcp:{self.host}:{self.port}"
+
+    # ---------- запуск / остановка ----------
+
+    def start(self) -> "FakeVehicle":
+        self._thread = threading.Thread(target=self.run, name=f"fake-vehicle-{self.sysid}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        for client in list(self._clients):
+            client.close()
+        self._clients.clear()
+        self._listen.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def run(self) -> None:
+        """
+        Главный цикл: сокеты, физика и периодическая телеметрия в одном потоке.
+        """
+        physics_dt = 1.0 / self.physics_hz
+        now = time.monotonic()
+        next_physics = now
+        next_send = {name: now for name in self.rates_hz}
+
+        while not self._stop.is_set():
+            now = time.monotonic()
+            deadline = min([next_physics] + list(next_send.values()))
+            if self._outbox:
+                deadline = min(deadline, self._outbox[0][0])
+            self._poll(max(0.0, deadline - now))
+
+            now = time.monotonic()
+            if now >= next_physics:
+                self._step(physics_dt)
+                next_physics += physics_dt
+                if next_physics < now:
+                    next_physics = now + physics_dt   # не догоняем после паузы
+
+            for name in list(self.rates_hz):
+                rate = self.rates_hz[name]
+                if name not in next_send:
+                    next_send[name] = now
+                if rate <= 0:
+                    next_send[name] = now + 0.1
+                    continue
+                if now >= next_send[name]:
+                    self._send_periodic(name)
+                    next_send[name] = max(next_send[name] + 1.0 / rate, now)
+
+            self._resend_mission_request(now)
+            self._flush_outbox(now)
+
+    # ---------- сеть ----------
+
+    def _poll(self, timeout: float) -> None:
+        sockets = [self._listen] + list(self._clients)
+        try:
+            readable, _, _ = select.select(sockets, [], [], min(timeout, 0.05))
+        except (OSError, ValueError):
+            return
+        for sock in readable:
+            if sock is self._listen:
+                client, _ = self._listen.accept()
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._clients[client] = mavlink.MAVLink(None)
+                self._clients[client].robust_parsing = True
+                continue
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                self._drop_client(sock)
+                continue
+            for msg in self._clients[sock].parse_buffer(data) or []:
+                if self._lost():
+                    continue
+                self.received += 1
+                self._handle(msg, sock)
+
+    def _drop_client(self, sock) -> None:
+        self._clients.pop(sock, None)
+        if self._upload_client is sock:
+            self._upload_items = None
+        sock.close()
+
+    def _lost(self) -> bool:
+        if self.loss and self._rng.random() < self.loss:
+            self.dropped += 1
+            return True
+        return False
+
+    def _send(self, msg, client=None) -> None:
+        """
+        Отправить сообщение одному клиенту или всем.
+        """
+        if self._lost():
+            return
+        buf = msg.pack(self._mav)
+        targets = [client] if client is not None else list(self._clients)
+        self.sent += 1
+        if self.latency_s > 0:
+            heapq.heappush(self._outbox, (time.monotonic() + self.latency_s,
+                                          next(self._outbox_n), buf, targets))
+            return
+        self._write(buf, targets)
+
+    def _write(self, buf: bytes, targets: list) -> None:
+        for sock in targets:
+            if sock not in self._clients:
+                continue   # клиент отключился, пока пакет «летел»
+            try:
+                sock.sendall(buf)
+            except OSError:
+                self._drop_client(sock)
+
+    def _flush_outbox(self, now: float) -> None:
+        while self._outbox and self._outbox[0][0] <= now:
+            _, _, buf, targets = heapq.heappop(self._outbox)
+            self._write(buf, targets)
+
+    # ---------- телеметрия ----------
+
+    def _time_boot_ms(self) -> int:
+        return int((time.monotonic() - self._boot) * 1000) & 0xFFFFFFFF
+
+    def latlon(self):
+        """
+        Текущие lat/lon (градусы) из смещения NED от home.
+        """
+        north, east, _ = self.position_ned
+        lat, lon, _ = self.frame.to_geodetic(north, east)
+        return lat, lon
+
+    def _send_periodic(self, name: str) -> None:
+        mav = self._mav
+        if name == 'HEARTBEAT':
+            base_mode = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+            if self.armed:
+                base_mode |= mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+            msg = mav.heartbeat_encode(
+                mavlink.MAV_TYPE_QUADROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+                base_mode, self.custom_mode,
+                mavlink.MAV_STATE_ACTIVE if self.armed else mavlink.MAV_STATE_STANDBY)
+        elif name == 'GLOBAL_POSITION_INT':
+            lat, lon = self.latlon()
+            relative_alt_mm = int(-self.position_ned[2] * 1000)
+            msg = mav.global_position_int_encode(
+                self._time_boot_ms(), int(lat * 1e7), int(lon * 1e7),
+                relative_alt_mm + 150_000, relative_alt_mm, 0, 0, 0, 0)
+        elif name == 'SYS_STATUS':
+            remaining = int(self.battery_remaining_pct)
+            voltage_mv = int(10_500 + 2_100 * self.battery_remaining_pct / 100.0)
+            msg = mav.sys_status_encode(0, 0, 0, 300, voltage_mv, -1, remaining, 0, 0, 0, 0, 0, 0)
+        elif name == 'AUTOPILOT_VERSION':
+            msg = self._autopilot_version()
+        elif name == 'ATTITUDE':
+            msg = mav.attitude_encode(self._time_boot_ms(), 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        elif name == 'VFR_HUD':
+            msg = mav.vfr_hud_encode(0.0, 0.0, 0, 0, -self.position_ned[2], 0.0)
+        elif name == 'GPS_RAW_INT':
+            lat, lon = self.latlon()
+            msg = mav.gps_raw_int_encode(self._time_boot_ms() * 1000, 3, int(lat * 1e7), int(lon * 1e7),
+                                         int((150.0 - self.position_ned[2]) * 1000),
+                                         100, 100, 0, 0, 12)
+        else:
+            return  # остальные сообщения имитация не производит
+        self._send(msg)
+
+    def _autopilot_version(self):
+        capabilities = (mavlink.MAV_PROTOCOL_CAPABILITY_MISSION_INT
+                        | mavlink.MAV_PROTOCOL_CAPABILITY_COMMAND_INT
+                        | mavlink.MAV_PROTOCOL_CAPABILITY_SET_POSITION_TARGET_LOCAL_NED
+                        | mavlink.MAV_PROTOCOL_CAPABILITY_MAVLINK2)
+        flight_sw_version = (4 << 24) | (5 << 16) | (0 << 8) | 255  # 4.5.0 official
+        return self._mav.autopilot_version_encode(
+            capabilities, flight_sw_version, 0, 0, 0,
+            [0] * 8, [0] * 8, [0] * 8, 0, 0, self.sysid)
+
+    # ---------- кинематика ----------
+
+    def _step(self, dt: float) -> None:
+        if not self.armed:
+            return
+
+        mode = self.custom_mode
+        if mode == COPTER_MODES['AUTO']:
+            self._step_auto()
+        elif mode == COPTER_MODES['LAND']:
+            self.target_ned = [self.position_ned[0], self.position_ned[1], 0.0]
+        elif mode == COPTER_MODES['RTL']:
+            if math.hypot(self.position_ned[0], self.position_ned[1]) < 1.0:
+                self.custom_mode = COPTER_MODES['LAND']
+            self.target_ned = [0.0, 0.0, self.position_ned[2]]
+
+        if self.target_ned is not None:
+            self._move_towards(self.target_ned, dt)
+
+        self.battery_remaining_pct = max(0.0, self.battery_remaining_pct - 0.01 * dt)
+
+        # Приземлились в LAND — дизарм, как делает ArduCopter
+        if mode == COPTER_MODES['LAND'] and self.position_ned[2] >= 0.0:
+            self.armed = False
+            self.target_ned = None
+
+    def _move_towards(self, target, dt: float) -> None:
+        x, y, z = self.position_ned
+        dx, dy, dz = target[0] - x, target[1] - y, target[2] - z
+
+        horizontal = math.hypot(dx, dy)
+        max_h = self.horizontal_speed_m_s * dt
+        if horizontal > max_h:
+            dx, dy = dx * max_h / horizontal, dy * max_h / horizontal
+        max_v = self.vertical_speed_m_s * dt
+        dz = max(-max_v, min(max_v, dz))
+
+        self.position_ned = [x + dx, y + dy, min(0.0, z + dz)]
+
+    def _step_auto(self) -> None:
+        while self.mission_seq < len(self.mission):
+            item = self.mission[self.mission_seq]
+            if item.command != mavlink.MAV_CMD_NAV_WAYPOINT:
+                self.mission_seq += 1
+                continue
+            target = self._item_to_ned(item)
+            x, y, z = self.position_ned
+            if math.dist((x, y, z), target) > 1.0:
+                self.target_ned = target
+                return
+            self._send(self._mav.mission_item_reached_encode(self.mission_seq))
+            self.mission_seq += 1
+            self._send(self._mav.mission_current_encode(self.mission_seq))
+        # Миссия закончилась — висим на месте
+        self.target_ned = list(self.position_ned)
+
+    def _item_to_ned(self, item):
+        north, east, _ = self.frame.to_ned(item.x / 1e7, item.y / 1e7)
+        return [north, east, -float(item.z)]
+
+    # ---------- обработка входящих ----------
+
+    def _handle(self, msg, client) -> None:
+        msg_type = msg.get_type()
+        target = getattr(msg, 'target_system', self.sysid)
+        if target not in (0, self.sysid):
+            return  # адресовано другому аппарату
+
+        if msg_type == 'COMMAND_LONG':
+            self._handle_command(msg, client)
+        elif msg_type == 'SET_MODE':
+            # ArduPilot подтверждает SET_MODE через COMMAND_ACK с command = id сообщения
+            ok = self._set_mode(msg.custom_mode)
+            self._send(self._mav.command_ack_encode(
+                mavlink.MAVLINK_MSG_ID_SET_MODE,
+                mavlink.MAV_RESULT_ACCEPTED if ok else mavlink.MAV_RESULT_DENIED), client)
+        elif msg_type == 'SET_POSITION_TARGET_LOCAL_NED':
+            if self.armed and self.custom_mode == COPTER_MODES['GUIDED']:
+                self.target_ned = [msg.x, msg.y, msg.z]
+        elif msg_type == 'SET_POSITION_TARGET_GLOBAL_INT':
+            if self.armed and self.custom_mode == COPTER_MODES['GUIDED']:
+                north, east, _ = self.frame.to_ned(msg.lat_int / 1e7, msg.lon_int / 1e7)
+                self.target_ned = [north, east, -float(msg.alt)]
+        elif msg_type == 'MISSION_CLEAR_ALL':
+            self.mission = []
+            self.mission_seq = 0
+            self._send(self._mav.mission_ack_encode(
+                msg.get_srcSystem(), msg.get_srcComponent(), mavlink.MAV_MISSION_ACCEPTED), client)
+        elif msg_type == 'MISSION_COUNT':
+            self._upload_items = [None] * msg.count
+            self._start_upload(0, msg.count - 1, client, msg)
+        elif msg_type == 'MISSION_WRITE_PARTIAL_LIST':
+            if msg.start_index > msg.end_index or msg.end_index >= len(self.mission):
+                self._send(self._mav.mission_ack_encode(
+                    msg.get_srcSystem(), msg.get_srcComponent(), mavlink.MAV_MISSION_ERROR), client)
+                return
+            self._upload_items = list(self.mission)
+            self._start_upload(msg.start_index, msg.end_index, client, msg)
+        elif msg_type in ('MISSION_ITEM_INT', 'MISSION_ITEM'):
+            self._handle_mission_item(msg, client)
+
+    def _set_mode(self, custom_mode: int) -> bool:
+        if custom_mode not in COPTER_MODES.values():
+            return False
+        self.custom_mode = custom_mode
+        if custom_mode == COPTER_MODES['AUTO']:
+            self.mission_seq = 0
+        elif custom_mode == COPTER_MODES['GUIDED']:
+            self.target_ned = list(self.position_ned)
+        return True
+
+    def _handle_command(self, msg, client) -> None:
+        command = msg.command
+        result = mavlink.MAV_RESULT_ACCEPTED
+
+        if command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            if msg.param1 == 1:
+                self.armed = True
+            elif self.position_ned[2] < -0.5 and msg.param2 != 21196:
+                result = mavlink.MAV_RESULT_DENIED   # дизарм в воздухе без force
+            else:
+                self.armed = False
+                self.target_ned = None
+        elif command == mavlink.MAV_CMD_NAV_TAKEOFF:
+            if not self.armed or self.custom_mode != COPTER_MODES['GUIDED']:
+                result = mavlink.MAV_RESULT_FAILED
+            else:
+                self.target_ned = [self.position_ned[0], self.position_ned[1], -float(msg.param7)]
+        elif command == mavlink.MAV_CMD_NAV_LAND:
+            self.custom_mode = COPTER_MODES['LAND']
+        elif command == mavlink.MAV_CMD_DO_SET_MODE:
+            if not self._set_mode(int(msg.param2)):
+                result = mavlink.MAV_RESULT_DENIED
+        elif command == mavlink.MAV_CMD_REQUEST_MESSAGE:
+            if int(msg.param1) == mavlink.MAVLINK_MSG_ID_AUTOPILOT_VERSION:
+                self._send(self._autopilot_version(), client)
+            elif int(msg.param1) == mavlink.MAVLINK_MSG_ID_HOME_POSITION:
+                self._send(self._mav.home_position_encode(
+                    int(self.home_lat_deg * 1e7), int(self.home_lon_deg * 1e7), 150_000,
+                    0, 0, 0, [1, 0, 0, 0], 0, 0, 0), client)
+            else:
+                result = mavlink.MAV_RESULT_UNSUPPORTED
+        elif command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL:
+            msg_id = int(msg.param1)
+            interval_us = msg.param2
+            name = mavlink.mavlink_map[msg_id].msgname if msg_id in mavlink.mavlink_map else None
+            if name is None:
+                result = mavlink.MAV_RESULT_DENIED
+            elif interval_us == -1:
+                self.rates_hz[name] = 0.0
+            elif interval_us == 0:
+                self.rates_hz[name] = DEFAULT_RATES_HZ.get(name, 0.0)
+            else:
+                self.rates_hz[name] = 1e6 / interval_us
+        else:
+            result = mavlink.MAV_RESULT_UNSUPPORTED
+
+        self._send(self._mav.command_ack_encode(command, result), client)
+
+    # ---------- загрузка миссии ----------
+
+    def _start_upload(self, first: int, last: int, client, msg) -> None:
+        self._upload_next = first
+        self._upload_last = last
+        self._upload_client = client
+        self._upload_peer = (msg.get_srcSystem(), msg.get_srcComponent())
+        if first > last:
+            self._finish_upload()
+        else:
+            self._request_item()
+
+    def _request_item(self) -> None:
+        self._upload_requested_at = time.monotonic()
+        self._send(self._mav.mission_request_int_encode(
+            *self._upload_peer, self._upload_next), self._upload_client)
+
+    def _resend_mission_request(self, now: float) -> None:
+        # Пункт не пришёл — запрашиваем повторно, как автопилот по таймауту
+        if self._upload_items is not None and now - self._upload_requested_at > 0.25:
+            self._request_item()
+
+    def _handle_mission_item(self, msg, client) -> None:
+        if client is not self._upload_client:
+            return
+        if self._upload_items is None:
+            if msg.seq == self._upload_last:
+                # Повтор последнего пункта после завершения: наш ACK потерялся
+                self._send(self._mav.mission_ack_encode(
+                    *self._upload_peer, mavlink.MAV_MISSION_ACCEPTED), client)
+            return
+        if msg.seq < self._upload_next:
+            # Повтор уже принятого пункта: наш запрос потерялся — повторяем его (как PX4)
+            self._request_item()
+            return
+        if msg.seq != self._upload_next:
+            self._send(self._mav.mission_ack_encode(
+                *self._upload_peer, mavlink.MAV_MISSION_INVALID_SEQUENCE), client)
+            return
+        self._upload_items[msg.seq] = msg
+        self._upload_next += 1
+        if self._upload_next > self._upload_last:
+            self._finish_upload()
+        else:
+            self._request_item()
+
+    def _finish_upload(self) -> None:
+        self.mission = self._upload_items
+        self._upload_items = None
+        self._send(self._mav.mission_ack_encode(
+            *self._upload_peer, mavlink.MAV_MISSION_ACCEPTED), self._upload_client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Имитация автопилота ArduCopter для офлайн-проверок")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=14550)
+    parser.add_argument("--sysid", type=int, default=1)
+    parser.add_argument("--loss", type=float, default=0.0, help="вероятность потери пакета")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответов аппарата, с")
+    parser.add_argument("--position-rate", type=float, default=DEFAULT_RATES_HZ['GLOBAL_POSITION_INT'],
+                        help="частота GLOBAL_POSITION_INT, Гц")
+    args = parser.parse_args()
+
+    vehicle = FakeVehicle(args.host, args.port, sysid=args.sysid, loss=args.loss,
+                          latency_s=args.latency,
+                          rates_hz={'GLOBAL_POSITION_INT': args.position_rate})
+    print(f"Имитация автопилота слушает {vehicle.connection_string} (Ctrl+C — выход)")
+    vehicle.start()
+    try:
+        while True:
+            time.sleep(1)
+            lat, lon = vehicle.latlon()
+            print(f"armed={vehicle.armed} mode={vehicle.custom_mode} "
+                  f"lat={lat:.7f} lon={lon:.7f} alt={-vehicle.position_ned[2]:.1f}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        vehicle.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# fleet.py
+#
+# Несколько аппаратов в одном процессе.
+# Fleet держит N соединений (или одно общее, разобранное по sysid) и
+# DroneState на каждый аппарат. Весь приём идёт в нескольких общих
+# потоках-«работниках» с event loop (async_link.AsyncLink), а не в
+# отдельном потоке мониторинга на каждый аппарат.
+#
+#   with Fleet() as fleet:
+#       fleet.connect("tcp:127.0.0.1:14550")
+#       fleet.connect("tcp:127.0.0.1:14560")
+#       fleet.connect("udp:0.0.0.0:14550", demux=True)   # все аппараты с одного порта
+#       fleet.gather(lambda link: link.set_mode("GUIDED"))
+#       fleet.upload_mission(wp_loader)                    # всем сразу
+#       print(fleet.snapshots())
+
+import asyncio
+from concurrent.futures import wait as wait_futures
+import threading
+
+from async_link import AsyncLink
+from drone_monitor import registry as default_registry, request_home_position
+from mission_transfer import TransferStats, upload_mission_async
+from telemetry_history import TelemetryHistory
+from vehicle_profile import is_vehicle_heartbeat, request_autopilot_version
+
+
+class _Worker:
+    """
+    Поток с собственным event loop; обслуживает часть соединений флота.
+    """
+
+    def __init__(self, index: int):
+        self.loop = asyncio.new_event_loop()
+        self.links = 0   # соединений на этом работнике (для распределения)
+        self._thread = threading.Thread(target=self._run, name=f"fleet-worker-{index}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """
+        Запустить корутину в этом потоке; возвращает concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2.0)
+        self.loop.close()
+
+
+class _VehicleLink(AsyncLink):
+    """
+    Один аппарат на общем соединении: сообщения приходят от _DemuxLink,
+    пакеты уходят через его сокет — для UDP на адрес, с которого этот
+    аппарат писал последним.
+    """
+
+    def __init__(self, parent: "_DemuxLink", sysid: int, compid: int, history=None):
+        super().__init__(registry=parent.registry, history=history,
+                         source_system=parent.mav.srcSystem,
+                         source_component=parent.mav.srcComponent)
+        self.parent = parent
+        self.target_system = sysid
+        self.target_component = compid
+        self._peer = parent._peer
+
+    def write(self, buf) -> None:
+        self.parent._write_to(buf, self._peer)
+
+    def close(self) -> None:
+        pass   # соединение закрывает _DemuxLink
+
+
+# Отметка в _DemuxLink.vehicles: sysid занят аппаратом другого соединения
+_FOREIGN = object()
+
+
+class _DemuxLink(AsyncLink):
+    """
+    Общее соединение, на котором работают несколько аппаратов.
+    Каждое сообщение передаётся _VehicleLink своего sysid; аппарат
+    появляется по первому HEARTBEAT (сообщения до него пропускаются).
+    """
+
+    def __init__(self, fleet: "Fleet", registry=default_registry):
+        super().__init__(registry=registry)
+        self.fleet = fleet
+        self.vehicles = {}   # sysid -> _VehicleLink
+
+    def _post(self, msg) -> None:
+        self.messages += 1
+        vehicle = self.vehicles.get(msg.get_srcSystem())
+        if vehicle is None:
+            if msg.get_type() != 'HEARTBEAT' or not is_vehicle_heartbeat(msg):
+                return   # GCS, другой компонент или аппарат ещё не представился
+            vehicle = self._discover(msg)
+        if vehicle is not _FOREIGN:
+            vehicle._peer = self._peer
+            vehicle._post(msg)
+        self._wake(msg)
+
+    def _discover(self, msg):
+        sysid = msg.get_srcSystem()
+        vehicle = _VehicleLink(self, sysid, msg.get_srcComponent(), self.fleet._new_history())
+        try:
+            self.fleet._add(vehicle, self)
+        except ValueError:
+            # sysid уже занят аппаратом с другого соединения — этот пропускаем
+            self.vehicles[sysid] = _FOREIGN
+            return _FOREIGN
+        self.vehicles[sysid] = vehicle
+        request_autopilot_version(vehicle)
+        request_home_position(vehicle)
+        return vehicle
+
+    def _on_lost(self, exc) -> None:
+        super()._on_lost(exc)
+        for vehicle in self.vehicles.values():
+            if vehicle is not _FOREIGN:
+                vehicle._on_lost(exc)
+
+
+class Fleet:
+    """
+    Флот аппаратов: sysid -> AsyncLink со своим DroneState (link.state).
+
+    workers: число общих потоков приёма; соединения распределяются
+             по ним равномерно (для десятков аппаратов хватает одного).
+    history_capacity: если > 0, у каждого аппарата своя TelemetryHistory
+             (link.history) на столько записей.
+
+    Методы Fleet вызываются из обычного (синхронного) кода; корутины
+    AsyncLink выполняются в потоке работника, которому принадлежит аппарат.
+    """
+
+    def __init__(self, workers: int = 1,
+                 registry=default_registry,
+                 history_capacity: int = 0):
+        self.registry = registry
+        self.history_capacity = history_capacity
+        self.vehicles = {}      # sysid -> AsyncLink
+        self._lock = threading.Lock()
+        self._workers = [_Worker(i) for i in range(workers)]
+        self._links = []        # (соединение, работник) — для закрытия
+        self._worker_of = {}    # sysid -> _Worker
+        self.upload_progress = {}   # sysid -> TransferStats текущей/последней загрузки
+
+    # ---------- соединения ----------
+
+    def _new_history(self):
+        return TelemetryHistory(self.history_capacity) if self.history_capacity > 0 else None
+
+    def _add(self, link: AsyncLink, owner: AsyncLink) -> None:
+        sysid = link.target_system
+        with self._lock:
+            if sysid in self.vehicles:
+                raise ValueError(f"Аппарат с sysid {sysid} уже есть во флоте "
+                                 f"(задайте разные SYSID_THISMAV)")
+            self.vehicles[sysid] = link
+            self._worker_of[sysid] = self._owner_worker(owner)
+
+    def _owner_worker(self, owner: AsyncLink) -> _Worker:
+        for link, worker in self._links:
+            if link is owner:
+                return worker
+        raise KeyError("Соединение не принадлежит флоту")
+
+    def connect(self, connection_string: str, demux: bool = False, timeout: float = 5.0) -> list:
+        """
+        Подключить соединение и вернуть sysid найденных аппаратов.
+
+        demux=False: на соединении один аппарат (как return_base.connect).
+        demux=True: несколько аппаратов на одном соединении; они добавляются
+        по мере прихода HEARTBEAT, connect ждёт только первого.
+        Если аппарат не ответил за timeout, соединение закрывается и
+        возвращается пустой список.
+        """
+        return self._submit_connect(connection_string, demux, timeout).result()
+
+    def connect_all(self, connection_strings: list, demux: bool = False, timeout: float = 5.0) -> list:
+        """
+        Подключить несколько соединений одновременно (ожидание HEARTBEAT
+        идёт параллельно); возвращает sysid всех найденных аппаратов.
+        """
+        futures = [self._submit_connect(cs, demux, timeout) for cs in connection_strings]
+        return [sysid for future in futures for sysid in future.result()]
+
+    def _submit_connect(self, connection_string: str, demux: bool, timeout: float):
+        worker = min(self._workers, key=lambda w: w.links)
+        worker.links += 1
+        return worker.submit(self._connect(worker, connection_string, demux, timeout))
+
+    async def _connect(self, worker: _Worker, connection_string: str, demux: bool, timeout: float) -> list:
+        if demux:
+            link = _DemuxLink(self, self.registry)
+        else:
+            link = AsyncLink(registry=self.registry, history=self._new_history())
+        await link.open(connection_string)
+        with self._lock:
+            self._links.append((link, worker))
+
+        if await link.wait_heartbeat(timeout) is None:
+            link.close()
+            return []
+        if demux:
+            return sorted(sysid for sysid, vehicle in link.vehicles.items() if vehicle is not _FOREIGN)
+
+        try:
+            self._add(link, link)
+        except ValueError:
+            link.close()
+            raise
+        request_autopilot_version(link)
+        request_home_position(link)
+        return [link.target_system]
+
+    def __getitem__(self, sysid: int) -> AsyncLink:
+        return self.vehicles[sysid]
+
+    def __len__(self) -> int:
+        return len(self.vehicles)
+
+    # ---------- команды ----------
+
+    def submit(self, sysid: int, fn, *args):
+        """
+        Выполнить корутину fn(link, *args) для аппарата sysid в его потоке;
+        возвращает concurrent.futures.Future.
+        """
+        return self._worker_of[sysid].submit(fn(self.vehicles[sysid], *args))
+
+    def gather(self, fn, *args, sysids=None, timeout: float = None) -> dict:
+        """
+        Выполнить fn(link, *args) для всех аппаратов (или для sysids) одновременно.
+        Возвращает {sysid: результат или исключение}; таймаут -> TimeoutError.
+        """
+        if sysids is None:
+            sysids = list(self.vehicles)
+        futures = {sysid: self.submit(sysid, fn, *args) for sysid in sysids}
+        wait_futures(futures.values(), timeout)
+
+        results = {}
+        for sysid, future in futures.items():
+            if not future.done():
+                future.cancel()
+                results[sysid] = TimeoutError(f"Аппарат {sysid} не ответил за {timeout} с")
+            elif future.exception() is not None:
+                results[sysid] = future.exception()
+            else:
+                results[sysid] = future.result()
+        return results
+
+    def upload_mission(self, mission, sysids=None,
+                       timeout: float = 1.0, max_retries: int = 5,
+                       wait_timeout: float = None) -> dict:
+        """
+        Загрузить миссию во все аппараты (или в sysids) одновременно.
+
+        mission: MAVWPLoader — одна миссия на всех: строится один раз,
+                 target_system каждого аппарата подставляется при отправке;
+                 или функция mission(link) -> MAVWPLoader — своя для каждого.
+        Пока идёт загрузка, upload_progress[sysid].progress показывает долю
+        отданных пунктов. Возвращает {sysid: TransferStats или исключение}
+        (MissionTransferError, CommandError, TimeoutError, ...).
+        """
+        if sysids is None:
+            sysids = list(self.vehicles)
+        for sysid in sysids:
+            self.upload_progress[sysid] = TransferStats()
+
+        async def upload(link):
+            wp_loader = mission(link) if callable(mission) else mission
+            return await upload_mission_async(link, wp_loader, timeout, max_retries,
+                                              self.upload_progress[link.target_system])
+
+        return self.gather(upload, sysids=sysids, timeout=wait_timeout)
+
+    # ---------- телеметрия ----------
+
+    def snapshots(self) -> dict:
+        """
+        {sysid: DroneSnapshot} — последние согласованные состояния всех аппаратов.
+        """
+        # Копия под замком: соединения добавляют аппараты из своих потоков
+        with self._lock:
+            vehicles = list(self.vehicles.items())
+        return {sysid: link.state.snapshot() for sysid, link in vehicles}
+
+    @property
+    def messages(self) -> int:
+        """
+        Сколько сообщений принято всеми соединениями флота.
+        """
+        with self._lock:
+            links = list(self._links)
+        return sum(link.messages for link, _ in links)
+
+    # ---------- остановка ----------
+
+    async def _close_links(self, worker: _Worker) -> None:
+        for link, owner in self._links:
+            if owner is worker:
+                link.close()
+        await asyncio.sleep(0)   # дать транспортам закрыть сокеты
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.submit(self._close_links(worker)).result()
+            worker.stop()
+        self._links.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -3,110 +3,153 @@
 import time
 from pymavlink import mavutil
 
+from drone_monitor import DroneState
+from vehicle_profile import get_profile
+from command_ack import CommandError, send_command
 
-def set_mode(master: mavutil.mavlink_connection, mode_name: str, timeout: float = 5.0) -> None:
+# Функции отправки (send_*) только пишут пакеты через master.mav, поэтому
+# работают и с обычным соединением pymavlink, и с AsyncLink (async_link.py).
+# arm/disarm/takeoff/land ждут COMMAND_ACK своей команды (command_ack.py).
+
+
+# Параметры param1..param7 типовых команд
+def arm_params(force: bool = False) -> tuple:
+    # param1: 1 = arm; param2: 21196 => принудительно (для справки)
+    return (1, 0 if not force else 21196, 0, 0, 0, 0, 0)
+
+
+def disarm_params(force: bool = False) -> tuple:
+    return (0, 0 if not force else 21196, 0, 0, 0, 0, 0)
+
+
+def takeoff_params(alt_m: float) -> tuple:
+    # params 1–4 не используются Copter; param5/6: lat/lon, 0 = текущая; param7: высота
+    return (0, 0, 0, 0, 0, 0, alt_m)
+
+
+def land_params() -> tuple:
+    # 0 = посадка в текущей точке
+    return (0, 0, 0, 0, 0, 0, 0)
+
+
+def mode_id(master, mode_name: str) -> int:
     """
-    Универсальная функция смены режима полёта через SET_MODE
-    - mode_name: строковое имя режима, например "GUIDED" или "AUTO".
-    - mode_mapping() берётся из самого автопилота (через pymavlink), так что
-      код не привязан к жёстко зашитым номерам custom_mode
+    Номер custom_mode по имени режима из профиля аппарата.
     """
-    mode_mapping = master.mode_mapping()
-    if mode_mapping is None or mode_name not in mode_mapping:
+    mode_map = get_profile(master).mode_map
+    if mode_name not in mode_map:
         raise ValueError(f"Режим {mode_name} недоступен в mode_mapping()")
+    return mode_map[mode_name]
 
-    mode_id = mode_mapping[mode_name]
+
+def send_set_mode(master, mode_name: str) -> int:
+    """
+    Отправить SET_MODE и вернуть номер режима (для проверки по HEARTBEAT).
+    """
+    custom_mode = mode_id(master, mode_name)
 
     # Отправляем SET_MODE с флагом MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
     # и номером режима в custom_mode (flightmode number)
     master.mav.set_mode_send(
         master.target_system,
         mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED,
-        mode_id
+        custom_mode
     )
+    return custom_mode
+
+
+def set_mode(master: mavutil.mavlink_connection, mode_name: str, timeout: float = 5.0,
+             state: DroneState = None) -> None:
+    """
+    Универсальная функция смены режима полёта через SET_MODE
+    - mode_name: строковое имя режима, например "GUIDED" или "AUTO".
+    - таблица режимов берётся из профиля аппарата (строится по HEARTBEAT
+      один раз на соединение), так что код не привязан к жёстко зашитым
+      номерам custom_mode
+    - смена подтверждается по HEARTBEAT: если передан state (его обновляет
+      monitor_loop) — через state.wait_mode, иначе HEARTBEAT читается здесь.
+      Не подтвердилась за timeout -> CommandError; timeout=0 — только отправить
+    """
+    custom_mode = send_set_mode(master, mode_name)
+    if timeout <= 0:
+        return
+
+    if state is not None:
+        if state.wait_mode(mode_name, timeout) is None:
+            raise CommandError(f"Режим {mode_name} не подтверждён за {timeout} с")
+        return
 
-    # Небольшая пауза, чтобы автопилот успел сменить режим и прислать новый HEARTBEAT
     end_time = time.time() + timeout
     while time.time() < end_time:
         msg = master.recv_match(type='HEARTBEAT', blocking=True, timeout=0.5)
-        if msg is None:
+        if msg is None or msg.get_srcSystem() != master.target_system:
             continue
-        # можно реализовать проверку, что режим действительно сменился
-        break
+        if msg.custom_mode == custom_mode:
+            return
+    raise CommandError(f"Режим {mode_name} не подтверждён за {timeout} с")
 
 
-def set_mode_guided(master: mavutil.mavlink_connection) -> None:
+def set_mode_guided(master: mavutil.mavlink_connection, state: DroneState = None) -> None:
     """
     Переводит Copter в режим GUIDED (управление с компьютера/скрипта)
     """
-    set_mode(master, "GUIDED")
+    set_mode(master, "GUIDED", state=state)
 
 
-def set_mode_auto(master: mavutil.mavlink_connection) -> None:
+def set_mode_auto(master: mavutil.mavlink_connection, state: DroneState = None) -> None:
     """
     Переводит Copter в режим AUTO для выполнения загруженной миссии
     """
-    set_mode(master, "AUTO")
+    set_mode(master, "AUTO", state=state)
 
 
-def arm(master: mavutil.mavlink_connection, force: bool = False) -> None:
+def arm(master: mavutil.mavlink_connection, force: bool = False, timeout: float = 1.0):
     """
-    ARM двигателей командой MAV_CMD_COMPONENT_ARM_DISARM
+    ARM двигателей командой MAV_CMD_COMPONENT_ARM_DISARM.
+    Возвращает COMMAND_ACK; отказ автопилота или молчание -> CommandError
     """
-    master.mav.command_long_send(
-        master.target_system,
-        master.target_component,
-        mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM,
-        0,
-        1,  # param1: 1 = arm, 0 = disarm
-        0 if not force else 21196,  # param2: 21196 => принудит. дизарм в полёте (для справки)
-        0, 0, 0, 0, 0
-    )
+    return send_command(master, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM,
+                        arm_params(force), timeout)
 
 
-def disarm(master: mavutil.mavlink_connection, force: bool = False) -> None:
+def disarm(master: mavutil.mavlink_connection, force: bool = False, timeout: float = 1.0):
     """
     DISARM двигателей той же командой
     """
-    master.mav.command_long_send(
-        master.target_system,
-        master.target_component,
-        mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM,
-        0,
-        0,  # disarm
-        0 if not force else 21196,
-        0, 0, 0, 0, 0
-    )
+    return send_command(master, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM,
+                        disarm_params(force), timeout)
 
 
-def takeoff(master: mavutil.mavlink_connection, alt_m: float) -> None:
+def takeoff(master: mavutil.mavlink_connection, alt_m: float, timeout: float = 1.0,
+            rates=None, state=None, climb_timeout: float = 120.0):
     """
     Взлёт до alt_m с помощью MAV_CMD_NAV_TAKEOFF
     Предполагается, что Copter уже в режиме GUIDED и ARM
+    rates: StreamRateManager — после принятия команды фаза "precision";
+    с state (DroneState) — обратно "cruise", когда высота набрана
+    (в фоне, не дольше climb_timeout).
     """
-    master.mav.command_long_send(
-        master.target_system,
-        master.target_component,
-        mavutil.mavlink.MAV_CMD_NAV_TAKEOFF,
-        0,
-        0, 0, 0, 0,  # params 1–4 не используются Copter для обычного взлёта
-        0,           # param5: lat, 0 = текущая
-        0,           # param6: lon
-        alt_m        # param7: высота (MAV_FRAME_GLOBAL_RELATIVE_ALT)
-    )
-    # Ждать фактическую высоту будет основная программа по данным DroneState
-
-
-def land(master: mavutil.mavlink_connection) -> None:
+    # Сначала сама команда: смена частот — несколько команд с ожиданием
+    # ответа, и на плохом канале она не должна задерживать взлёт.
+    # ACK означает «команда принята»; ждать фактическую высоту будет
+    # основная программа по данным DroneState
+    ack = send_command(master, mavutil.mavlink.MAV_CMD_NAV_TAKEOFF,
+                       takeoff_params(alt_m), timeout)
+    if rates is not None:
+        rates.set_phase("precision")
+        if state is not None:
+            rates.set_phase_when(state, lambda s: s.alt_rel_m >= alt_m * 0.95, "cruise",
+                                 climb_timeout)
+    return ack
+
+
+def land(master: mavutil.mavlink_connection, timeout: float = 1.0, rates=None):
     """
     Посадка: команда MAV_CMD_NAV_LAND (посадка в текущей точке)
+    rates: StreamRateManager — после принятия команды фаза "precision"
     """
-    master.mav.command_long_send(
-        master.target_system,
-        master.target_component,
-        mavutil.mavlink.MAV_CMD_NAV_LAND,  #
-        0,
-        0, 0, 0, 0,  # параметры для Copter, 0 = посадка в текущей точке
-        0, 0, 0
-    )
-    # Фактическое «приземлился и дизармился» также может проверяться через DroneState
+    # Фактическое «приземлился и дизармился» проверяется через DroneState
+    ack = send_command(master, mavutil.mavlink.MAV_CMD_NAV_LAND, land_params(), timeout)
+    if rates is not None:
+        rates.set_phase("precision")
+    return ack
@@ -0,0 +1,74 @@
+# geo_frame.py
+#
+# Локальная система координат NED (север, восток, вниз) с привязкой к точке
+# (обычно home). Одна на всех: DroneState получает по ней north/east/down на
+# каждый GLOBAL_POSITION_INT, построители миссий переводят смещения в метрах
+# в lat/lon, goto_local_ned — цели в метрах от home в глобальные координаты.
+# Transformer pyproj создаётся один раз на точку привязки и кэшируется,
+# поэтому в горячих путях нет ни настройки Geod, ни своих азимутов/синусов.
+#
+#   frame = get_frame(home_lat, home_lon, home_alt)
+#   north, east, down = frame.to_ned(lat, lon, alt)      # числа или массивы
+#   lat, lon, alt = frame.to_geodetic(north, east, down)
+
+from functools import lru_cache
+
+import numpy as np
+from pyproj import CRS, Transformer
+from pyproj.enums import TransformDirection
+
+_INVERSE = TransformDirection.INVERSE
+
+
+@lru_cache(maxsize=32)
+def local_transformer(lat0_deg: float, lon0_deg: float) -> Transformer:
+    """
+    Transformer WGS84 (lon, lat) -> локальная плоскость (восток, север), м,
+    касательная к эллипсоиду в (lat0, lon0): азимутальная равнопромежуточная
+    проекция — расстояние и азимут от центра те же, что у geod.fwd/inv.
+    Создание Transformer стоит миллисекунды, поэтому он кэшируется по центру.
+    """
+    crs = CRS.from_proj4(f"+proj=aeqd +lat_0={lat0_deg} +lon_0={lon0_deg} +ellps=WGS84 +units=m")
+    return Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+
+
+class LocalFrame:
+    """
+    NED относительно точки привязки (lat0, lon0, alt0_m).
+    Все методы принимают числа или массивы numpy (векторно, одним вызовом PROJ).
+    Высоты — в той же системе, что alt0_m (для относительной высоты
+    над home: alt0_m = 0, down = -alt_rel_m).
+    """
+
+    def __init__(self, lat0_deg: float, lon0_deg: float, alt0_m: float = 0.0):
+        self.lat0_deg = lat0_deg
+        self.lon0_deg = lon0_deg
+        self.alt0_m = alt0_m
+        self._transform = local_transformer(lat0_deg, lon0_deg).transform
+
+    def __repr__(self) -> str:
+        return f"LocalFrame({self.lat0_deg:.7f}, {self.lon0_deg:.7f}, {self.alt0_m:.2f})"
+
+    def to_ned(self, lat_deg, lon_deg, alt_m=None):
+        """
+        (lat, lon, alt) -> (north_m, east_m, down_m); без alt_m down = 0.
+        """
+        east, north = self._transform(lon_deg, lat_deg)
+        down = 0.0 if alt_m is None else self.alt0_m - np.asarray(alt_m, dtype=np.float64)
+        return north, east, down
+
+    def to_geodetic(self, north_m, east_m, down_m=None):
+        """
+        (north_m, east_m, down_m) -> (lat, lon, alt); без down_m alt = alt0_m.
+        """
+        lon, lat = self._transform(east_m, north_m, direction=_INVERSE)
+        alt = self.alt0_m if down_m is None else self.alt0_m - np.asarray(down_m, dtype=np.float64)
+        return lat, lon, alt
+
+
+@lru_cache(maxsize=64)
+def get_frame(lat0_deg: float, lon0_deg: float, alt0_m: float = 0.0) -> LocalFrame:
+    """
+    LocalFrame для точки привязки (из кэша, если уже создавался).
+    """
+    return LocalFrame(lat0_deg, lon0_deg, alt0_m)
@@ -0,0 +1,347 @@
+# geofence.py
+#
+# Геозона: периметр (аппарат должен быть внутри) и запретные зоны
+# (должен быть снаружи). Проверка идёт на каждый GLOBAL_POSITION_INT,
+# то есть 10–50 раз в секунду на аппарат, поэтому «точка в многоугольнике»
+# по всем сторонам всех зон не делается. Вместо этого при создании зоны
+# плоскость NED покрывается сеткой, и каждая клетка заранее получает
+# статус:
+#   - внутри разрешённой области целиком — проверка мгновенная;
+#   - в нарушении целиком — тоже;
+#   - на границе — хранится только кусок границы, проходящий через клетку,
+#     и то, внутри ли зоны центр клетки. Точка внутри, если отрезок
+#     «центр -> точка» пересекает этот кусок чётное число раз.
+# Стоимость проверки не зависит от числа и сложности многоугольников.
+# Пока аппарат остаётся в той же «цельной» клетке, не нужен даже поиск
+# клетки (FenceTracker).
+#
+#   fence = Geofence(state.frame, perimeter=[(lat, lon), ...], no_fly=[[(lat, lon), ...]])
+#   fence.check_latlon(lat, lon)            # True — нарушение
+#   monitor = GeofenceMonitor(fence, on_breach=lambda master, state: ...)
+#   north, east = offset_polygon(north, east, margin_m=30)   # периметр с запасом
+
+import weakref
+
+import numpy as np
+
+from drone_monitor import registry as default_registry
+from geo_frame import LocalFrame
+
+# Статусы клеток сетки
+_SAFE = 0
+_BREACH = 1
+_MIXED = 2
+
+
+def _orient(ax, ay, bx, by, cx, cy) -> float:
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+
+def _crossings(x0, y0, x1, y1, pieces) -> int:
+    """
+    Сколько отрезков pieces [(ax, ay, bx, by), ...] пересекает отрезок (x0, y0)-(x1, y1).
+    Кусков в клетке единицы, поэтому обычный цикл быстрее numpy.
+    """
+    count = 0
+    for ax, ay, bx, by in pieces:
+        d1 = _orient(ax, ay, bx, by, x0, y0)
+        d2 = _orient(ax, ay, bx, by, x1, y1)
+        if (d1 > 0) == (d2 > 0):
+            continue
+        d3 = _orient(x0, y0, x1, y1, ax, ay)
+        d4 = _orient(x0, y0, x1, y1, bx, by)
+        if (d3 > 0) != (d4 > 0):
+            count += 1
+    return count
+
+
+def offset_polygon(north, east, margin_m: float):
+    """
+    Многоугольник, раздвинутый наружу на margin_m (в метрах NED): каждая
+    сторона сдвигается по внешней нормали, новые вершины — пересечения
+    соседних сдвинутых сторон. Для вогнутого многоугольника слишком
+    большой запас выворачивает границу — тогда ValueError.
+    """
+    north = np.asarray(north, dtype=np.float64)
+    east = np.asarray(east, dtype=np.float64)
+    if len(north) > 1 and north[0] == north[-1] and east[0] == east[-1]:
+        north, east = north[:-1], east[:-1]
+    n = len(north)
+    if n < 3:
+        raise ValueError("Многоугольник меньше чем из трёх вершин")
+
+    # Обход против часовой стрелки в осях (восток, север) — внешняя нормаль справа
+    x, y = east, north
+    area2 = float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y))
+    if area2 == 0:
+        raise ValueError("Вырожденный многоугольник")
+    sign = 1.0 if area2 > 0 else -1.0
+
+    dx, dy = np.roll(x, -1) - x, np.roll(y, -1) - y
+    length = np.hypot(dx, dy)
+    if np.any(length == 0):
+        raise ValueError("Повторяющиеся вершины многоугольника")
+    nx, ny = sign * dy / length, -sign * dx / length   # внешние нормали сторон
+    # Сторона i: точка (x_i + nx_i * m, y_i + ny_i * m), направление (dx_i, dy_i)
+    px, py = x + nx * margin_m, y + ny * margin_m
+
+    out_x = np.empty(n)
+    out_y = np.empty(n)
+    for i in range(n):
+        a = i - 1   # вершина i — пересечение сторон i-1 и i
+        cross = dx[a] * dy[i] - dy[a] * dx[i]
+        if abs(cross) < 1e-9 * length[a] * length[i]:
+            # соседние стороны на одной прямой: вершина просто сдвигается по нормали
+            out_x[i], out_y[i] = x[i] + nx[i] * margin_m, y[i] + ny[i] * margin_m
+            continue
+        t = ((px[i] - px[a]) * dy[i] - (py[i] - py[a]) * dx[i]) / cross
+        out_x[i], out_y[i] = px[a] + t * dx[a], py[a] + t * dy[a]
+
+    # Обход не должен смениться, а несоседние стороны — пересекаться
+    if float(np.sum(out_x * np.roll(out_y, -1) - np.roll(out_x, -1) * out_y)) * sign <= 0:
+        raise ValueError(f"Запас {margin_m} м выворачивает границу многоугольника")
+    for i in range(n):
+        pieces = [(out_x[j], out_y[j], out_x[(j + 1) % n], out_y[(j + 1) % n])
+                  for j in range(i + 2, n) if (j + 1) % n != i]
+        if _crossings(out_x[i], out_y[i], out_x[(i + 1) % n], out_y[(i + 1) % n], pieces):
+            raise ValueError(f"Запас {margin_m} м выворачивает границу многоугольника")
+    return out_y, out_x
+
+
+class Geofence:
+    """
+    Геозона на сетке клеток cell_m в системе NED frame (обычно DroneState.frame).
+
+    perimeter: [(lat, lon), ...] — аппарат должен быть внутри (None — без периметра).
+    no_fly: список многоугольников [(lat, lon), ...] — аппарат должен быть снаружи.
+    """
+
+    def __init__(self, frame: LocalFrame, perimeter=None, no_fly=(), cell_m: float = 25.0):
+        self.frame = frame
+        self.cell_m = cell_m
+        self.has_perimeter = perimeter is not None
+
+        # Многоугольники в метрах: (north, east, это периметр?)
+        polygons = []
+        if perimeter is not None:
+            polygons.append(self._to_ned(perimeter) + (True,))
+        for zone in no_fly:
+            polygons.append(self._to_ned(zone) + (False,))
+        if not polygons:
+            raise ValueError("Геозона без периметра и запретных зон")
+
+        # Сетка покрывает периметр (снаружи него — нарушение), а без
+        # периметра — все запретные зоны (снаружи них — можно); +1 клетка запаса
+        framed = [p for p in polygons if p[2]] or polygons
+        north_all = np.concatenate([p[0] for p in framed])
+        east_all = np.concatenate([p[1] for p in framed])
+        self.north0 = north_all.min() - cell_m
+        self.east0 = east_all.min() - cell_m
+        self.rows = int(np.ceil((north_all.max() + cell_m - self.north0) / cell_m))
+        self.cols = int(np.ceil((east_all.max() + cell_m - self.east0) / cell_m))
+
+        self._build(polygons)
+
+    def _to_ned(self, polygon):
+        points = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        if len(points) > 1 and np.array_equal(points[0], points[-1]):
+            points = points[:-1]
+        north, east, _ = self.frame.to_ned(points[:, 0], points[:, 1])
+        return np.asarray(north), np.asarray(east)
+
+    # ---------- построение сетки ----------
+
+    def _centres_inside(self, north, east) -> np.ndarray:
+        """
+        (rows, cols): центр клетки внутри многоугольника — построчно лучом
+        на восток, пересечения одной строки — одна операция numpy.
+        """
+        n1, e1 = north, east
+        n2, e2 = np.roll(north, -1), np.roll(east, -1)
+        centre_north = self.north0 + (np.arange(self.rows) + 0.5) * self.cell_m
+        centre_east = self.east0 + (np.arange(self.cols) + 0.5) * self.cell_m
+        inside = np.zeros((self.rows, self.cols), dtype=bool)
+        for row, y in enumerate(centre_north):
+            crossing = (n1 <= y) != (n2 <= y)
+            if not crossing.any():
+                continue
+            x = e1[crossing] + (y - n1[crossing]) * (e2 - e1)[crossing] / (n2 - n1)[crossing]
+            x.sort()
+            # число пересечений восточнее центра
+            east_of = len(x) - np.searchsorted(x, centre_east, side="right")
+            inside[row] = east_of % 2 == 1
+        return inside
+
+    def _pieces_by_cell(self, north, east) -> dict:
+        """
+        (row, col) -> [(east_a, north_a, east_b, north_b), ...]: стороны,
+        разрезанные на куски не длиннее клетки, по клеткам их рамок.
+        """
+        n1, e1 = north, east
+        n2, e2 = np.roll(north, -1), np.roll(east, -1)
+        counts = np.maximum(np.ceil(np.hypot(n2 - n1, e2 - e1) / self.cell_m).astype(np.int64), 1)
+        side = np.repeat(np.arange(len(north)), counts)
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t0 = index / counts[side]
+        t1 = (index + 1) / counts[side]
+        a_north = n1[side] + (n2 - n1)[side] * t0
+        a_east = e1[side] + (e2 - e1)[side] * t0
+        b_north = n1[side] + (n2 - n1)[side] * t1
+        b_east = e1[side] + (e2 - e1)[side] * t1
+
+        row0 = np.floor((np.minimum(a_north, b_north) - self.north0) / self.cell_m).astype(np.int64)
+        row1 = np.floor((np.maximum(a_north, b_north) - self.north0) / self.cell_m).astype(np.int64)
+        col0 = np.floor((np.minimum(a_east, b_east) - self.east0) / self.cell_m).astype(np.int64)
+        col1 = np.floor((np.maximum(a_east, b_east) - self.east0) / self.cell_m).astype(np.int64)
+
+        cells = {}
+        for i in range(len(side)):
+            piece = (a_east[i], a_north[i], b_east[i], b_north[i])
+            for row in range(max(row0[i], 0), min(row1[i], self.rows - 1) + 1):
+                for col in range(max(col0[i], 0), min(col1[i], self.cols - 1) + 1):
+                    cells.setdefault((row, col), []).append(piece)
+        return cells
+
+    def _build(self, polygons) -> None:
+        self.status = np.full((self.rows, self.cols), _SAFE, dtype=np.int8)
+        # (row, col) -> [(это периметр?, центр внутри?, куски), ...] для клеток на границе
+        self._mixed = {}
+
+        breach = np.zeros((self.rows, self.cols), dtype=bool)
+        undetermined = {}
+        for north, east, is_perimeter in polygons:
+            inside = self._centres_inside(north, east)
+            cells = self._pieces_by_cell(north, east)
+            crossed = np.zeros_like(inside)
+            for (row, col), pieces in cells.items():
+                crossed[row, col] = True
+                undetermined.setdefault((row, col), []).append(
+                    (is_perimeter, bool(inside[row, col]), tuple(pieces)))
+            # Клетка без границы целиком внутри или целиком снаружи
+            breach |= ~crossed & (~inside if is_perimeter else inside)
+
+        self.status[breach] = _BREACH
+        for cell, candidates in undetermined.items():
+            if not breach[cell]:
+                self.status[cell] = _MIXED
+                self._mixed[cell] = candidates
+        # Для проверки по одной точке списки быстрее индексации numpy
+        self._status_rows = self.status.tolist()
+
+    # ---------- проверка ----------
+
+    def cell_of(self, north_m: float, east_m: float):
+        """
+        (row, col) клетки точки или None за пределами сетки.
+        """
+        row = int((north_m - self.north0) // self.cell_m)
+        col = int((east_m - self.east0) // self.cell_m)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def check_cell(self, cell, north_m: float, east_m: float) -> bool:
+        """
+        Нарушение в точке, если известно, что она в клетке cell.
+        """
+        if cell is None:
+            return self.has_perimeter   # за пределами сетки — вне периметра
+        row, col = cell
+        status = self._status_rows[row][col]
+        if status != _MIXED:
+            return status == _BREACH
+
+        centre_east = self.east0 + (col + 0.5) * self.cell_m
+        centre_north = self.north0 + (row + 0.5) * self.cell_m
+        for is_perimeter, centre_inside, pieces in self._mixed[cell]:
+            inside = centre_inside != (_crossings(centre_east, centre_north, east_m, north_m, pieces) % 2 == 1)
+            if inside != is_perimeter:
+                return True
+        return False
+
+    def check_ned(self, north_m: float, east_m: float) -> bool:
+        """
+        True — точка (NED от начала frame, м) вне периметра или в запретной зоне.
+        """
+        return self.check_cell(self.cell_of(north_m, east_m), north_m, east_m)
+
+    def check_latlon(self, lat_deg: float, lon_deg: float) -> bool:
+        north, east, _ = self.frame.to_ned(lat_deg, lon_deg)
+        return self.check_ned(north, east)
+
+
+class FenceTracker:
+    """
+    Проверка одного аппарата с запоминанием клетки: пока аппарат
+    в той же клетке без границы, ответ уже известен.
+    """
+
+    def __init__(self, fence: Geofence):
+        self.fence = fence
+        self.breached = False
+        self.checks = 0
+        self.same_cell = 0      # Ответов без поиска по сетке
+        self._cell = None
+        self._uniform = False   # Последняя клетка целиком safe/breach
+
+    def update(self, north_m: float, east_m: float) -> bool:
+        self.checks += 1
+        fence = self.fence
+        row = int((north_m - fence.north0) // fence.cell_m)
+        col = int((east_m - fence.east0) // fence.cell_m)
+        cell = (row, col)
+        if self._uniform and cell == self._cell:
+            self.same_cell += 1
+            return self.breached
+
+        if not (0 <= row < fence.rows and 0 <= col < fence.cols):
+            cell = None
+        self._cell = (row, col)
+        self._uniform = cell is None or fence._status_rows[row][col] != _MIXED
+        self.breached = fence.check_cell(cell, north_m, east_m)
+        return self.breached
+
+
+class GeofenceMonitor:
+    """
+    Проверка геозоны на каждый GLOBAL_POSITION_INT: обработчик в реестре
+    drone_monitor (вызывается после обновления DroneState, в потоке
+    мониторинга). on_breach(master, state) — при выходе из разрешённой
+    области, on_clear(master, state) — при возвращении; колбэки
+    не должны блокировать поток мониторинга надолго.
+    """
+
+    def __init__(self, fence: Geofence, on_breach, on_clear=None, registry=default_registry):
+        self.fence = fence
+        self.on_breach = on_breach
+        self.on_clear = on_clear
+        self.registry = registry
+        self.breaches = 0
+        self._trackers = weakref.WeakKeyDictionary()   # master -> FenceTracker
+        registry.subscribe('GLOBAL_POSITION_INT', self._handle)
+
+    def tracker(self, master) -> FenceTracker:
+        tracker = self._trackers.get(master)
+        if tracker is None:
+            tracker = self._trackers[master] = FenceTracker(self.fence)
+        return tracker
+
+    def _handle(self, master, msg, state) -> None:
+        if msg.lat == 0 and msg.lon == 0:
+            return  # ещё нет GPS
+        if state.frame is self.fence.frame:
+            north, east = state.north_m, state.east_m   # уже посчитаны в drone_monitor
+        else:
+            north, east, _ = self.fence.frame.to_ned(state.lat_deg, state.lon_deg)
+
+        tracker = self.tracker(master)
+        was_breached = tracker.breached
+        breached = tracker.update(north, east)
+        if breached and not was_breached:
+            self.breaches += 1
+            self.on_breach(master, state)
+        elif was_breached and not breached and self.on_clear is not None:
+            self.on_clear(master, state)
+
+    def detach(self) -> None:
+        self.registry.unsubscribe('GLOBAL_POSITION_INT', self._handle)
@@ -0,0 +1,266 @@
+# log_panel.py
+#
+# Журнал событий для интерфейса на Tkinter.
+# Обычный Listbox с insert(END) на каждую строку растёт без ограничений,
+# а на длинном патруле с частыми STATUSTEXT перерисовка и yview(END)
+# на каждой строке подвешивают окно. Здесь строки лежат в кольцевом
+# буфере фиксированного размера (старые вытесняются), запись в него не
+# трогает Tk и возможна из любого потока, а виджет раз в кадр показывает
+# только видимое окно строк — не больше rows штук, сколько бы их ни пришло.
+#
+#   panel = LogPanel(frame, capacity=5000, rows=15)
+#   panel.pack(fill="both", expand=True)
+#   panel.log("Двигатели запущены!")
+#   panel.log("Ячейка 3.1V разряжена!", ERROR)
+#   panel.attach(master)              # STATUSTEXT автопилота — в журнал
+
+from bisect import bisect_right
+from collections import deque
+from itertools import count, islice
+import time
+import tkinter as tk
+
+# Уровни важности — как MAV_SEVERITY в MAVLink (меньше — важнее)
+EMERGENCY = 0
+ALERT = 1
+CRITICAL = 2
+ERROR = 3
+WARNING = 4
+NOTICE = 5
+INFO = 6
+DEBUG = 7
+
+SEVERITY_NAMES = {
+    EMERGENCY: "EMERG", ALERT: "ALERT", CRITICAL: "CRIT", ERROR: "ERROR",
+    WARNING: "WARN", NOTICE: "NOTICE", INFO: "INFO", DEBUG: "DEBUG",
+}
+
+# Цвет строки по важности (None — цвет виджета по умолчанию)
+SEVERITY_COLORS = {
+    EMERGENCY: "red", ALERT: "red", CRITICAL: "red", ERROR: "red",
+    WARNING: "orange", NOTICE: "green", INFO: None, DEBUG: "gray",
+}
+
+
+class LogBuffer:
+    """
+    Кольцевой буфер строк журнала: (номер, время, важность, текст).
+    append — O(1) из любого потока; view — окно строк для показа.
+    """
+
+    def __init__(self, capacity: int = 2000):
+        self._entries = deque(maxlen=capacity)
+        self._counter = count(1)
+        self.total = 0   # Номер последней принятой строки (вместе с вытесненными)
+
+        # Кэш отфильтрованных строк: пересчитывается, только если буфер
+        # или фильтр изменились с прошлого view
+        self._filtered = []
+        self._filtered_seqs = []
+        self._filtered_key = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def capacity(self) -> int:
+        return self._entries.maxlen
+
+    def append(self, text: str, severity: int = INFO, timestamp: float = None) -> None:
+        # deque.append и next(count) атомарны — блокировка не нужна
+        seq = next(self._counter)
+        self._entries.append((seq, time.time() if timestamp is None else timestamp, severity, text))
+        self.total = seq
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total = next(self._counter)
+
+    def filtered(self, min_severity: int = DEBUG) -> list:
+        """
+        Строки с важностью не ниже min_severity (от старых к новым).
+        """
+        key = (self.total, min_severity)
+        if key != self._filtered_key:
+            entries = list(self._entries)
+            if min_severity < DEBUG:
+                entries = [entry for entry in entries if entry[2] <= min_severity]
+            self._filtered = entries
+            self._filtered_seqs = [entry[0] for entry in entries]
+            self._filtered_key = key
+        return self._filtered
+
+    def view(self, rows: int, anchor: int = None, min_severity: int = DEBUG):
+        """
+        Окно из rows строк, последняя из которых — строка с номером anchor
+        (None — самая новая). Возвращает (строки, индекс первой,
+        всего отфильтрованных строк).
+        """
+        if anchor is None and min_severity >= DEBUG:
+            # Частый случай — хвост без фильтра: только последние rows строк,
+            # без копии всего буфера (list(islice(...)) выполняется целиком под GIL)
+            total = len(self._entries)
+            entries = list(islice(reversed(self._entries), rows))
+            entries.reverse()
+            return entries, max(total - len(entries), 0), total
+
+        entries = self.filtered(min_severity)
+        end = len(entries)
+        if anchor is not None:
+            # номера растут, поэтому место строки находится двоичным поиском
+            end = max(bisect_right(self._filtered_seqs, anchor), min(rows, end))
+        start = max(end - rows, 0)
+        return entries[start:end], start, len(entries)
+
+
+def format_entry(entry) -> str:
+    seq, timestamp, severity, text = entry
+    return f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {text}"
+
+
+class LogPanel(tk.Frame):
+    """
+    Журнал событий: Listbox с видимым окном строк, полоса прокрутки
+    и выбор минимальной важности. Виджет обновляется раз в кадр (after)
+    и только если есть новые строки, фильтр или прокрутка изменились.
+
+    capacity: сколько строк хранить (старые вытесняются).
+    rows: высота Listbox в строках — столько строк в нём и бывает.
+    Пока окно прокручено до конца, новые строки сразу видны;
+    если пользователь листает назад, окно остаётся на тех же строках
+    (пока они не вытеснены из буфера).
+    """
+
+    def __init__(self, parent, capacity: int = 2000, rows: int = 12, fps: float = 20.0,
+                 min_severity: int = DEBUG, bg: str = "#3c3c3c", fg: str = "white", **listbox_opts):
+        super().__init__(parent, bg=bg)
+        self.buffer = LogBuffer(capacity)
+        self.rows = rows
+        self.fps = fps
+        self.min_severity = min_severity
+
+        self._anchor = None      # Номер последней видимой строки (None — следить за новыми)
+        self._shown_key = None   # (total, фильтр, anchor) показанного окна
+        self._shown_end = 0      # Индекс после последней показанной строки
+        self._after_id = None
+        self._hooked = []        # (master, hook) — для detach
+
+        self._severity_var = tk.StringVar(value=SEVERITY_NAMES[min_severity])
+        names = [SEVERITY_NAMES[level] for level in sorted(SEVERITY_NAMES)]
+        self.filter_menu = tk.OptionMenu(self, self._severity_var, *names, command=self._on_filter)
+        self.filter_menu.config(bg=bg, fg=fg, highlightthickness=0)
+        self.filter_menu.pack(side="top", anchor="e")
+
+        self.listbox = tk.Listbox(self, height=rows, bg=bg, fg=fg, **listbox_opts)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.listbox.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        for event in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.listbox.bind(event, self._on_wheel)
+        self.bind("<Destroy>", self._on_destroy)
+
+        self._schedule()
+
+    # ---------- запись (из любого потока) ----------
+
+    def log(self, text: str, severity: int = INFO) -> None:
+        self.buffer.append(text, severity)
+
+    def clear(self) -> None:
+        self.buffer.clear()
+
+    def attach(self, master) -> None:
+        """
+        Писать в журнал STATUSTEXT, принятые соединением master
+        (хук pymavlink, вызывается в потоке, который читает соединение).
+        """
+        def hook(mav, msg):
+            if msg.get_type() == 'STATUSTEXT':
+                self.buffer.append(msg.text, msg.severity)
+
+        master.message_hooks.append(hook)
+        self._hooked.append((master, hook))
+
+    def detach(self) -> None:
+        for master, hook in self._hooked:
+            if hook in master.message_hooks:
+                master.message_hooks.remove(hook)
+        self._hooked.clear()
+
+    # ---------- показ (поток Tk) ----------
+
+    def set_min_severity(self, severity: int) -> None:
+        self.min_severity = severity
+        self._severity_var.set(SEVERITY_NAMES[severity])
+        self._anchor = None
+
+    def _on_filter(self, name: str) -> None:
+        for level, level_name in SEVERITY_NAMES.items():
+            if level_name == name:
+                self.set_min_severity(level)
+
+    def _schedule(self) -> None:
+        self._after_id = self.after(int(1000 / self.fps), self._tick)
+
+    def _tick(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._schedule()
+
+    def _on_destroy(self, event) -> None:
+        if event.widget is self and self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+            self.detach()
+
+    def refresh(self) -> None:
+        """
+        Перерисовать видимое окно, если с прошлого кадра что-то изменилось.
+        Все строки, пришедшие за кадр, попадают в Listbox одной вставкой.
+        """
+        key = (self.buffer.total, self.min_severity, self._anchor)
+        if key == self._shown_key:
+            return
+        self._shown_key = key
+
+        entries, start, count = self.buffer.view(self.rows, self._anchor, self.min_severity)
+        self._shown_end = start + len(entries)
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *[format_entry(entry) for entry in entries])
+        for row, (_, _, severity, _) in enumerate(entries):
+            color = SEVERITY_COLORS.get(severity)
+            if color is not None:
+                self.listbox.itemconfig(row, fg=color)
+
+        if count:
+            self.scrollbar.set(start / count, (start + len(entries)) / count)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # ---------- прокрутка ----------
+
+    def _scroll_to(self, end: int) -> None:
+        """
+        Показать окно, которое заканчивается перед строкой с индексом end.
+        """
+        entries = self.buffer.filtered(self.min_severity)
+        end = min(max(end, min(self.rows, len(entries))), len(entries))
+        self._anchor = None if end == len(entries) else entries[end - 1][0]
+        self.refresh()
+
+    def _on_wheel(self, event) -> str:
+        if event.num == 4 or event.delta > 0:
+            self._scroll_to(self._shown_end - 3)
+        else:
+            self._scroll_to(self._shown_end + 3)
+        return "break"   # Listbox не должен прокручивать сам себя
+
+    def _on_scrollbar(self, action, value, units=None) -> None:
+        if action == "moveto":
+            # value — доля от начала для верхней строки окна
+            count = len(self.buffer.filtered(self.min_severity))
+            self._scroll_to(int(float(value) * count) + self.rows)
+        elif action == "scroll":
+            step = self.rows if units == "pages" else 1
+            self._scroll_to(self._shown_end + int(value) * step)
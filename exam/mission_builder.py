@@ -0,0 +1,215 @@
+# mission_builder.py
+#
+# Построение полётного задания (MISSION_ITEM_INT) для ArduCopter.
+# Поточечные функции add_waypoint_* удобны для пары точек,
+# пакетная build_mission_from_offsets — для маршрутов из тысяч точек.
+
+import time
+
+import numpy as np
+from pymavlink import mavutil, mavwp  # для связи с дроном по MAVLink
+from pyproj import Geod               # Точные геодезические расчеты (WGS84)
+
+from geo_frame import get_frame       # NED от базовой точки (кэшированный Transformer)
+
+# Для расчета координат
+geod = Geod(ellps="WGS84")  # ellps="WGS84" = стандарт Земли для GPS
+
+
+def add_waypoint_latlon(
+    wp_loader: mavwp.MAVWPLoader,  # Контейнер для точек миссии
+    master: mavutil.mavfile,       # MAVLink соединение
+    lat_deg: float,                # Широта в градусах
+    lon_deg: float,                # Долгота в градусах
+    alt_m: float,                  # Высота в метрах (относительная)
+    current: int = 0,              # current=1 означает "текущая точка"
+    frame: int = None,             # Система координат миссии
+    # Тип команды (NAV_WAYPOINT = лететь к точке)
+    command: int = None,
+):
+    """
+    Добавить точку миссии по абсолютным координатам lat/lon (в градусах).
+    Координаты конвертируются в формат degE7 для MISSION_ITEM_INT.
+    """
+    if frame is None:
+        # относительная высота над землёй
+        frame = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
+    if command is None:
+        command = mavutil.mavlink.MAV_CMD_NAV_WAYPOINT  # лететь к точке
+
+    autocontinue = 1
+
+    lat_int = int(lat_deg * 1e7)
+    lon_int = int(lon_deg * 1e7)
+
+    wp_loader.add(
+        mavutil.mavlink.MAVLink_mission_item_int_message(
+            master.target_system,       # ID дрона
+            master.target_component,    # ID автопилота
+            # Временный порядковый номер точки (перезапишется)
+            0,
+            frame,                      # Система координат
+            command,                    # Команда
+            current,                    # Текущая точка да/нет
+            autocontinue,               # Продолжать автоматически да/нет
+            # param1-4 (радиус, задержка и т.д. - не используем)
+            0, 0, 0, 0,
+            lat_int, lon_int, alt_m     # Координаты и высота
+        )
+    )
+
+
+def add_waypoint_offset_m(
+    wp_loader: mavwp.MAVWPLoader,
+    master: mavutil.mavfile,
+    base_lat_deg: float,
+    base_lon_deg: float,
+    north_m: float,
+    east_m: float,
+    alt_m: float,
+    current: int = 0,
+    frame: int = None,
+    command: int = None,
+):
+    """
+    Добавить точку миссии по относительному смещению в метрах
+    от базовой точки (base_lat_deg/base_lon_deg).
+
+    north_m > 0  -> смещение на север
+    east_m  > 0  -> смещение на восток
+    """
+    if frame is None:
+        frame = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
+    if command is None:
+        command = mavutil.mavlink.MAV_CMD_NAV_WAYPOINT
+
+    # Смещение в метрах -> координаты WGS84 в системе NED от базовой точки
+    # (азимутальная проекция: то же, что geod.fwd по азимуту и расстоянию)
+    lat_new, lon_new, _ = get_frame(base_lat_deg, base_lon_deg).to_geodetic(north_m, east_m)
+
+    # Используем функцию добавления по абсолютным координатам
+    add_waypoint_latlon(
+        wp_loader,
+        master,
+        lat_new,
+        lon_new,
+        alt_m,
+        current=current,
+        frame=frame,
+        command=command,
+    )
+
+    return lat_new, lon_new  # опционально можно использовать снаружи
+
+
+def offsets_to_latlon(base_lat_deg: float,
+                      base_lon_deg: float,
+                      north_m,
+                      east_m):
+    """
+    Пересчитать массивы смещений (север/восток, м) от базовой точки
+    в массивы lat/lon (градусы) одним векторным вызовом.
+    Возвращает (lat_deg, lon_deg) — массивы numpy.
+    """
+    north, east = np.broadcast_arrays(
+        np.asarray(north_m, dtype=np.float64),
+        np.asarray(east_m, dtype=np.float64),
+    )
+
+    # То же, что в add_waypoint_offset_m, но сразу для всех точек
+    lat_new, lon_new, _ = get_frame(base_lat_deg, base_lon_deg).to_geodetic(north, east)
+    return lat_new, lon_new
+
+
+def add_waypoints_latlon(
+    wp_loader: mavwp.MAVWPLoader,
+    master: mavutil.mavfile,
+    lat_deg,
+    lon_deg,
+    alt_m,
+    current_seq: int = None,
+    frame: int = None,
+    command: int = None,
+) -> mavwp.MAVWPLoader:
+    """
+    Пакетный вариант add_waypoint_latlon: добавить в конец wp_loader
+    точки из массивов lat_deg/lon_deg/alt_m (alt_m может быть числом).
+    current_seq: номер точки (внутри этого пакета), которая получит current=1.
+    """
+    if frame is None:
+        frame = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
+    if command is None:
+        command = mavutil.mavlink.MAV_CMD_NAV_WAYPOINT
+
+    lat, lon, alt = np.broadcast_arrays(
+        np.asarray(lat_deg, dtype=np.float64),
+        np.asarray(lon_deg, dtype=np.float64),
+        np.asarray(alt_m, dtype=np.float64),
+    )
+
+    # degE7 для всех точек сразу; trunc — как int() в add_waypoint_latlon
+    lat_int = np.trunc(lat.ravel() * 1e7).astype(np.int64).tolist()
+    lon_int = np.trunc(lon.ravel() * 1e7).astype(np.int64).tolist()
+    alt_list = alt.ravel().tolist()
+
+    target_system = master.target_system
+    target_component = master.target_component
+    item_cls = mavutil.mavlink.MAVLink_mission_item_int_message
+    first_seq = wp_loader.count()
+
+    items = [
+        item_cls(
+            target_system, target_component,
+            first_seq + i,                  # seq сразу правильный
+            frame, command,
+            1 if i == current_seq else 0,   # current
+            1,                              # autocontinue
+            0, 0, 0, 0,
+            lat_i, lon_i, alt_i,
+        )
+        for i, (lat_i, lon_i, alt_i) in enumerate(zip(lat_int, lon_int, alt_list))
+    ]
+
+    # MAVWPLoader.add(list) делает deepcopy каждой точки и переписывает seq —
+    # для тысяч точек это дороже самой геодезии. Точки созданы здесь же
+    # и уже пронумерованы, поэтому добавляем их в список загрузчика напрямую.
+    wp_loader.wpoints.extend(items)
+    wp_loader.last_change = time.time()
+    return wp_loader
+
+
+def build_mission_from_offsets(
+    master: mavutil.mavfile,
+    base_lat_deg: float,
+    base_lon_deg: float,
+    north_m,
+    east_m,
+    alt_m,
+    wp_loader: mavwp.MAVWPLoader = None,
+    current_seq: int = None,
+    frame: int = None,
+    command: int = None,
+) -> mavwp.MAVWPLoader:
+    """
+    Построить миссию из массивов смещений в метрах от базовой точки.
+
+    north_m, east_m, alt_m — массивы одинаковой длины (или числа);
+    расчёт координат выполняется одним вызовом PROJ, перевод в degE7 —
+    одной операцией numpy, а загрузчик заполняется за один проход.
+    Если wp_loader не передан, создаётся новый MAVWPLoader.
+    """
+    if wp_loader is None:
+        wp_loader = mavwp.MAVWPLoader()
+
+    lat, lon = offsets_to_latlon(base_lat_deg, base_lon_deg, north_m, east_m)
+
+    return add_waypoints_latlon(
+        wp_loader,
+        master,
+        lat,
+        lon,
+        alt_m,
+        current_seq=current_seq,
+        frame=frame,
+        command=command,
+    )
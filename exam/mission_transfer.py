@@ -0,0 +1,388 @@
+# mission_transfer.py
+#
+# Загрузка полётного задания в автопилот по протоколу MAVLink Mission
+# с таймаутами, повторами и статистикой.
+
+import copy
+from dataclasses import dataclass
+import json
+import os
+import time
+import weakref
+
+from pymavlink import mavutil, mavwp  # для работы с протоколом MAVLink
+
+
+class MissionTransferError(Exception):
+    """
+    Загрузка миссии не завершилась: автопилот отверг её или перестал отвечать.
+    """
+
+
+@dataclass
+class TransferStats:
+    """
+    Итоги одной загрузки миссии.
+    """
+    count: int = 0            # Количество переданных пунктов миссии
+    requested: int = 0        # Разных пунктов запрошено автопилотом (прогресс)
+    sent: int = 0             # Отправлено пакетов ITEM (вместе с повторами)
+    retries: int = 0          # Повторные отправки COUNT/ITEM по таймауту
+    duplicates: int = 0       # Повторные запросы уже отправленных пунктов
+    elapsed_s: float = 0.0    # Время от COUNT до MISSION_ACK, с
+    rtt_s: float = 0.0        # Сглаженное время «пункт -> следующий запрос», с
+
+    @property
+    def progress(self) -> float:
+        """
+        Доля пунктов, которые автопилот уже запросил (0..1).
+        """
+        return self.requested / self.count if self.count else 0.0
+
+    @property
+    def items_per_s(self) -> float:
+        if self.elapsed_s <= 0:
+            return 0.0
+        return self.count / self.elapsed_s
+
+
+_REQUEST_TYPES = ['MISSION_REQUEST_INT', 'MISSION_REQUEST', 'MISSION_ACK']
+
+# Хэши пунктов последней загруженной миссии:
+# master -> {target_system: [hash пункта 0, hash пункта 1, ...]}
+# WeakKeyDictionary — чтобы закрытое соединение не держалось в памяти.
+# Между запусками скрипта (новое соединение) хэши хранятся в файле
+# state_path: {"sysid": [hash, ...]} — см. upload_mission_incremental.
+_uploaded_hashes = weakref.WeakKeyDictionary()
+
+
+class _Transfer:
+    """
+    Логика обмена без ввода-вывода: какой пакет отправить в ответ на
+    сообщение автопилота или на таймаут. Используется и синхронным
+    _transfer (recv_match), и асинхронным _transfer_async (AsyncLink.recv).
+
+    Таймаут повтора подстраивается под канал, как в TCP: сглаженное время
+    ответа + 4 отклонения, но не меньше min_timeout и не больше timeout.
+    При отсутствии ответа таймаут удваивается до timeout; только повторы
+    на максимальном таймауте расходуют max_retries.
+    """
+
+    def __init__(self, target_system: int, first: int, last: int,
+                 timeout: float, max_retries: int, stats: TransferStats,
+                 min_timeout: float = 0.02):
+        self.target_system = target_system
+        self.first = first
+        self.last = last
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.min_timeout = min_timeout
+        self.stats = stats
+
+        self.requested = bytearray(last - first + 1)   # 1 = пункт уже запрашивался
+        self.last_sent = None                          # seq последнего отправленного пункта
+        self.retries_left = max_retries
+
+        self.srtt = None         # сглаженное время ответа
+        self.rttvar = 0.0        # его разброс
+        self.rto = timeout       # текущий таймаут повтора
+        self.sent_at = None      # когда отправлен пункт без повтора (для замера)
+
+    def on_timeout(self):
+        """
+        Ответа нет: пакет или запрос потерялся в канале.
+        Возвращает seq пункта для повтора или _RESTART (повторить начало обмена).
+        """
+        if self.rto >= self.timeout:
+            if self.retries_left == 0:
+                raise MissionTransferError(
+                    f"Нет ответа от автопилота после {self.max_retries} повторов "
+                    f"(пункты {self.first}..{self.last}, отправлено {self.stats.sent})")
+            self.retries_left -= 1
+        self.rto = min(self.timeout, self.rto * 2)
+        self.stats.retries += 1
+        self.sent_at = None   # по повторам время ответа не меряем (алгоритм Карна)
+        return _RESTART if self.last_sent is None else self.last_sent
+
+    def on_message(self, msg):
+        """
+        Ответ автопилота. Возвращает seq пункта для отправки, _DONE
+        (обмен завершён) или None (ничего не отправлять).
+        """
+        if msg.get_srcSystem() != self.target_system:
+            return None  # сообщение от другого аппарата
+        self.retries_left = self.max_retries
+
+        if self.sent_at is not None:
+            sample = time.perf_counter() - self.sent_at
+            if self.srtt is None:
+                self.srtt, self.rttvar = sample, sample / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+                self.srtt = 0.875 * self.srtt + 0.125 * sample
+            self.rto = min(self.timeout, max(self.min_timeout, self.srtt + 4 * self.rttvar))
+            self.stats.rtt_s = self.srtt
+            self.sent_at = None
+
+        if msg.get_type() == 'MISSION_ACK':
+            if msg.type == mavutil.mavlink.MAV_MISSION_ACCEPTED:
+                if self.last_sent is None and self.last >= self.first:
+                    return None  # устаревший ACK от предыдущей операции
+                return _DONE
+            if msg.type == mavutil.mavlink.MAV_MISSION_INVALID_SEQUENCE:
+                return None  # ответ на наш дубликат, автопилот ждёт другой пункт
+            raise MissionTransferError(f"Автопилот отклонил миссию: MISSION_ACK type={msg.type}")
+
+        seq = msg.seq
+        if seq < self.first or seq > self.last:
+            return None
+        if self.requested[seq - self.first]:
+            self.stats.duplicates += 1
+        else:
+            self.requested[seq - self.first] = 1
+            self.stats.requested += 1
+            self.sent_at = time.perf_counter()
+
+        self.stats.sent += 1
+        self.last_sent = seq
+        return seq
+
+
+# Особые ответы _Transfer
+_RESTART = object()
+_DONE = object()
+
+
+def _item_for(master, wp_loader: mavwp.MAVWPLoader, seq: int):
+    """
+    Пункт seq, адресованный аппарату master. Одну и ту же миссию можно
+    грузить в несколько аппаратов: чужой target_system подменяется в копии.
+    """
+    item = wp_loader.wp(seq)
+    if item.target_system != master.target_system or item.target_component != master.target_component:
+        item = copy.copy(item)
+        item.target_system = master.target_system
+        item.target_component = master.target_component
+    return item
+
+
+def _transfer(master, wp_loader, first: int, last: int, start_send,
+              timeout: float, max_retries: int, stats: TransferStats,
+              min_timeout: float = 0.02) -> None:
+    """
+    Общий цикл обмена: start_send() начинает передачу (COUNT или
+    WRITE_PARTIAL_LIST), затем автопилот запрашивает пункты first..last
+    и завершает обмен MISSION_ACK.
+    """
+    transfer = _Transfer(master.target_system, first, last, timeout, max_retries, stats, min_timeout)
+    start_send()
+
+    while True:
+        msg = master.recv_match(type=_REQUEST_TYPES, blocking=True, timeout=transfer.rto)
+        action = transfer.on_timeout() if msg is None else transfer.on_message(msg)
+        if action is _DONE:
+            return
+        if action is _RESTART:
+            start_send()
+        elif action is not None:
+            master.mav.send(_item_for(master, wp_loader, action))
+
+
+async def _transfer_async(link, wp_loader, first: int, last: int, start_send,
+                          timeout: float, max_retries: int, stats: TransferStats,
+                          min_timeout: float = 0.02) -> None:
+    """
+    То же, что _transfer, для AsyncLink (async_link.py): ожидание ответа
+    через await, поэтому в одном потоке идут обмены с многими аппаратами.
+    """
+    transfer = _Transfer(link.target_system, first, last, timeout, max_retries, stats, min_timeout)
+    start_send()
+
+    while True:
+        msg = await link.recv(_REQUEST_TYPES, timeout=transfer.rto)
+        action = transfer.on_timeout() if msg is None else transfer.on_message(msg)
+        if action is _DONE:
+            return
+        if action is _RESTART:
+            start_send()
+        elif action is not None:
+            link.mav.send(_item_for(link, wp_loader, action))
+
+
+def upload_mission(master: mavutil.mavlink_connection,
+                   wp_loader: mavwp.MAVWPLoader,
+                   timeout: float = 1.0,
+                   max_retries: int = 5) -> TransferStats:
+    """
+    Загрузить миссию в автопилот по протоколу MAVLink Mission:
+    COUNT -> (REQUEST / REQUEST_INT -> ITEM / ITEM_INT) * N -> ACK.
+
+    - Запросы обслуживаются в том порядке, в каком пришли: повторный или
+      внеочередной REQUEST просто получает запрошенный пункт.
+    - Если автопилот не ответил, повторяется последний отправленный пакет
+      (COUNT или ITEM). Таймаут повтора подстраивается под время ответа
+      канала (не больше timeout секунд); после max_retries повторов подряд
+      на максимальном таймауте выбрасывается MissionTransferError.
+    - CLEAR_ALL не нужен: MISSION_COUNT сам заменяет старую миссию.
+    Возвращает TransferStats (пунктов в секунду, число повторов и т.д.).
+    """
+    count = wp_loader.count()
+    stats = TransferStats(count=count)
+    start = time.perf_counter()
+
+    _forget_hashes(master)
+    _transfer(master, wp_loader, 0, count - 1,
+              lambda: master.waypoint_count_send(count),
+              timeout, max_retries, stats)
+    _remember_hashes(master, mission_hashes(wp_loader))
+
+    stats.elapsed_s = time.perf_counter() - start
+    return stats
+
+
+async def upload_mission_async(link, wp_loader: mavwp.MAVWPLoader,
+                               timeout: float = 1.0,
+                               max_retries: int = 5,
+                               stats: TransferStats = None) -> TransferStats:
+    """
+    upload_mission для AsyncLink. stats можно передать заранее
+    и читать из другого потока как прогресс (requested / count).
+    """
+    count = wp_loader.count()
+    if stats is None:
+        stats = TransferStats()
+    stats.count = count
+    start = time.perf_counter()
+
+    _forget_hashes(link)
+    await _transfer_async(link, wp_loader, 0, count - 1,
+                          lambda: link.mav.mission_count_send(
+                              link.target_system, link.target_component, count),
+                          timeout, max_retries, stats)
+    _remember_hashes(link, mission_hashes(wp_loader))
+
+    stats.elapsed_s = time.perf_counter() - start
+    return stats
+
+
+def item_hash(item) -> int:
+    """
+    Хэш содержимого пункта миссии (всё, кроме seq и target_*).
+    """
+    return hash((item.frame, item.command, item.current, item.autocontinue,
+                 item.param1, item.param2, item.param3, item.param4,
+                 item.x, item.y, item.z))
+
+
+def mission_hashes(wp_loader: mavwp.MAVWPLoader) -> list:
+    return [item_hash(item) for item in wp_loader.wpoints]
+
+
+def changed_ranges(old_hashes: list, new_hashes: list, max_gap: int = 2) -> list:
+    """
+    Диапазоны (first, last) изменившихся пунктов для списков одинаковой длины.
+    Диапазоны, между которыми не больше max_gap неизменных пунктов,
+    склеиваются: лишний пункт дешевле отдельного обмена WRITE_PARTIAL_LIST.
+    """
+    ranges = []
+    for seq, (old, new) in enumerate(zip(old_hashes, new_hashes)):
+        if old == new:
+            continue
+        if ranges and seq - ranges[-1][1] <= max_gap + 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return [tuple(r) for r in ranges]
+
+
+def _remember_hashes(master, hashes: list, state_path: str = None) -> None:
+    _uploaded_hashes.setdefault(master, {})[master.target_system] = hashes
+    if state_path is not None:
+        _write_saved_hashes(state_path, master.target_system, hashes)
+
+
+def _forget_hashes(master, state_path: str = None) -> None:
+    _uploaded_hashes.get(master, {}).pop(master.target_system, None)
+    if state_path is not None:
+        _write_saved_hashes(state_path, master.target_system, None)
+
+
+def _read_saved_hashes(state_path: str) -> dict:
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}   # файла ещё нет или он повреждён — как будто ничего не загружали
+
+
+def _write_saved_hashes(state_path: str, target_system: int, hashes) -> None:
+    saved = _read_saved_hashes(state_path)
+    if hashes is None:
+        if saved.pop(str(target_system), None) is None:
+            return
+    else:
+        saved[str(target_system)] = hashes
+    # Через временный файл: прерванная запись не оставит половину JSON
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(saved, f)
+    os.replace(tmp_path, state_path)
+
+
+def _uploaded(master, state_path: str = None):
+    hashes = _uploaded_hashes.get(master, {}).get(master.target_system)
+    if hashes is None and state_path is not None:
+        hashes = _read_saved_hashes(state_path).get(str(master.target_system))
+    return hashes
+
+
+def forget_mission(master: mavutil.mavlink_connection, state_path: str = None) -> None:
+    """
+    Забыть, что было загружено в аппарат (например, миссию поменяли из
+    Mission Planner): следующая upload_mission_incremental загрузит всё.
+    state_path — тот же файл, что у upload_mission_incremental.
+    """
+    _forget_hashes(master, state_path)
+
+
+def upload_mission_incremental(master: mavutil.mavlink_connection,
+                               wp_loader: mavwp.MAVWPLoader,
+                               timeout: float = 1.0,
+                               max_retries: int = 5,
+                               state_path: str = None) -> TransferStats:
+    """
+    Загрузить только изменившиеся пункты миссии.
+
+    Для каждого аппарата запоминаются хэши пунктов последней загруженной
+    миссии. Если число пунктов не изменилось, изменённые диапазоны
+    передаются через MISSION_WRITE_PARTIAL_LIST; иначе (или если о
+    загрузках в аппарат ничего не известно) выполняется полная upload_mission.
+
+    state_path: JSON-файл, где хэши хранятся по sysid между запусками
+    (каждый запуск скрипта — новое соединение). Если миссию в аппарате
+    меняли не этой функцией, перед загрузкой нужен forget_mission.
+    """
+    new_hashes = mission_hashes(wp_loader)
+    old_hashes = _uploaded(master, state_path)
+
+    if old_hashes is None or len(old_hashes) != len(new_hashes):
+        # Пока обмен не завершён, содержимое аппарата неизвестно
+        _forget_hashes(master, state_path)
+        stats = upload_mission(master, wp_loader, timeout, max_retries)
+        _remember_hashes(master, new_hashes, state_path)
+        return stats
+
+    stats = TransferStats()
+    start = time.perf_counter()
+
+    _forget_hashes(master, state_path)
+    for first, last in changed_ranges(old_hashes, new_hashes):
+        stats.count += last - first + 1
+        _transfer(master, wp_loader, first, last,
+                  lambda first=first, last=last: master.mav.mission_write_partial_list_send(
+                      master.target_system, master.target_component, first, last),
+                  timeout, max_retries, stats)
+    _remember_hashes(master, new_hashes, state_path)
+
+    stats.elapsed_s = time.perf_counter() - start
+    return stats
@@ -0,0 +1,167 @@
+# patrol_partition.py
+#
+# Раздел точек патрулирования между несколькими аппаратами.
+# Матрица расстояний (база + все точки) строится один раз на плоскости
+# NED от базы одной операцией numpy. Точки упорядочиваются по азимуту
+# от базы, и каждый аппарат получает свой сектор — непрерывный отрезок
+# этого порядка. Границы секторов сдвигаются по одной точке, пока
+# выравниваются загрузки «длина маршрута / запас хода» соседних секторов.
+# Длина сектора при балансировке — обход ближайшим соседом по подматрице
+# общей матрицы (с кэшем по сектору), 2-opt из route_planner улучшает
+# только итоговые маршруты, поэтому повторный раздел, например после
+# потери аппарата, занимает миллисекунды.
+#
+#   partitioner = PatrolPartitioner(base_lat, base_lon, checkpoints, perimeter, spacing_m=100)
+#   plans = partitioner.partition({1: 6000, 2: 6000, 3: 4000})   # sysid -> запас хода, м
+#   missions = build_patrol_missions(plans, alt_m=30, masters=fleet.vehicles)
+#   plans = partitioner.partition({1: 6000, 3: 4000})            # аппарат 2 выбыл
+
+import numpy as np
+
+from geo_frame import get_frame
+from route_planner import (RoutePlan, build_route_mission, distance_matrix,
+                           nearest_neighbour_order, route_points, tour_length_m, two_opt)
+
+
+def battery_range_m(remaining_pct: float, full_range_m: float, reserve_pct: float = 20.0) -> float:
+    """
+    Запас хода по остатку батареи (battery_remaining_pct из DroneState):
+    full_range_m — дальность на полном заряде, reserve_pct — неприкосновенный
+    остаток на возврат и посадку.
+    """
+    return full_range_m * max(remaining_pct - reserve_pct, 0.0) / 100.0
+
+
+class PatrolPartitioner:
+    """
+    Раздел точек облёта (как у plan_route: контрольные точки и периметр)
+    между аппаратами, вылетающими с одной базы.
+    two_opt_passes — проходов 2-opt для каждого итогового маршрута.
+    """
+
+    def __init__(self, base_lat_deg: float, base_lon_deg: float,
+                 checkpoints=(), perimeter=None, spacing_m: float = None,
+                 two_opt_passes: int = 10):
+        self.base_lat_deg = base_lat_deg
+        self.base_lon_deg = base_lon_deg
+        self.two_opt_passes = two_opt_passes
+        self.lat_deg, self.lon_deg, self.is_checkpoint = route_points(checkpoints, perimeter, spacing_m)
+
+        # Узел 0 — база, 1..N — точки; матрица — один раз на все разделы
+        self._nodes_lat = np.concatenate([[base_lat_deg], self.lat_deg])
+        self._nodes_lon = np.concatenate([[base_lon_deg], self.lon_deg])
+        north, east, _ = get_frame(base_lat_deg, base_lon_deg).to_ned(self._nodes_lat, self._nodes_lon)
+        self.dist = distance_matrix(east, north)
+
+        # Порядок по азимуту от базы; начинается после самого широкого
+        # пустого угла, чтобы крайние секторы не оказались по разные стороны от него
+        azimuth = np.arctan2(east[1:], north[1:])
+        order = np.argsort(azimuth)
+        if len(order) > 1:
+            gaps = np.diff(np.append(azimuth[order], azimuth[order[0]] + 2 * np.pi))
+            order = np.roll(order, -(int(gaps.argmax()) + 1))
+        self.order = order
+        self._routes = {}    # (начало, конец) сектора -> (узлы ближайшим соседом, длина, м)
+        self._two_opt = {}   # (начало, конец) сектора -> (узлы после 2-opt, длина, м)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _route(self, lo: int, hi: int):
+        """
+        Обход база -> точки order[lo:hi] -> база ближайшим соседом:
+        (узлы по порядку, длина на плоскости). Для балансировки хватает
+        этой оценки; 2-opt — только для итоговых маршрутов (_improved).
+        """
+        key = (lo, hi)
+        route = self._routes.get(key)
+        if route is None:
+            nodes = np.concatenate([[0], self.order[lo:hi] + 1])
+            sub = self.dist[np.ix_(nodes, nodes)]
+            order = nearest_neighbour_order(sub, start=0)
+            length = float(sub[order, np.roll(order, -1)].sum())
+            route = self._routes[key] = (nodes[order], length)
+        return route
+
+    def _improved(self, lo: int, hi: int):
+        """
+        Маршрут сектора после 2-opt: (узлы по порядку, длина на плоскости).
+        """
+        key = (lo, hi)
+        route = self._two_opt.get(key)
+        if route is None:
+            nodes, _ = self._route(lo, hi)
+            sub = self.dist[np.ix_(nodes, nodes)]
+            order = two_opt(sub, np.arange(len(nodes)), self.two_opt_passes)
+            length = float(sub[order, np.roll(order, -1)].sum())
+            route = self._two_opt[key] = (nodes[order], length)
+        return route
+
+    def _cuts(self, budgets: np.ndarray) -> np.ndarray:
+        """
+        Границы секторов: сначала пропорционально запасу хода, затем
+        каждая граница сдвигается по одной точке, пока так уменьшается
+        большая из загрузок двух её соседних секторов. Проходы по всем
+        границам повторяются, и перегрузка растекается по цепочке
+        секторов, а не только к соседям самого загруженного.
+        """
+        n = len(self.order)
+        cuts = np.round(np.concatenate([[0], np.cumsum(budgets)]) / budgets.sum() * n).astype(np.int64)
+
+        def load(k: int, cuts) -> float:
+            return self._route(cuts[k], cuts[k + 1])[1] / budgets[k]
+
+        for _ in range(n):
+            moved = False
+            for boundary in range(1, len(budgets)):
+                left, right = boundary - 1, boundary
+                best = max(load(left, cuts), load(right, cuts))
+                best_cut = cuts[boundary]
+                for shift in (-1, 1):
+                    trial = cuts.copy()
+                    trial[boundary] += shift
+                    if not trial[left] <= trial[boundary] <= trial[right + 1]:
+                        continue
+                    pair_load = max(load(left, trial), load(right, trial))
+                    if pair_load < best - 1e-9:
+                        best, best_cut = pair_load, trial[boundary]
+                if best_cut != cuts[boundary]:
+                    cuts[boundary] = best_cut
+                    moved = True
+            if not moved:
+                break
+        return cuts
+
+    def partition(self, budgets: dict) -> dict:
+        """
+        budgets: {sysid: запас хода, м} (например, battery_range_m) — аппараты,
+        между которыми делятся точки. Возвращает {sysid: RoutePlan}; длины
+        маршрутов — по WGS84. Превышение запаса видно по plan.length_m > budget:
+        точки делятся всегда, даже если запаса на всех не хватает.
+        """
+        sysids = list(budgets)
+        if not sysids:
+            return {}
+        weights = np.array([max(float(budgets[sysid]), 1.0) for sysid in sysids])
+        cuts = self._cuts(weights)
+
+        plans = {}
+        for k, sysid in enumerate(sysids):
+            nn_nodes, _ = self._route(cuts[k], cuts[k + 1])
+            nodes, _ = self._improved(cuts[k], cuts[k + 1])
+            visit = nodes[1:] - 1
+            plans[sysid] = RoutePlan(
+                self.base_lat_deg, self.base_lon_deg,
+                self.lat_deg[visit], self.lon_deg[visit], self.is_checkpoint[visit],
+                tour_length_m(self._nodes_lat, self._nodes_lon, nodes),
+                tour_length_m(self._nodes_lat, self._nodes_lon, nn_nodes),
+            )
+        return plans
+
+
+def build_patrol_missions(plans: dict, alt_m: float, masters: dict) -> dict:
+    """
+    {sysid: MAVWPLoader} — миссия build_route_mission для каждого плана раздела.
+    masters: {sysid: соединение} (например, fleet.vehicles) — для target_system.
+    """
+    return {sysid: build_route_mission(masters[sysid], plan, alt_m) for sysid, plan in plans.items()}
@@ -6,12 +6,24 @@
 
 
 # подключаем нужные библиотеки
-from pymavlink import mavutil, mavwp  # для связи с дроном по MAVLink
-from pyproj import Geod               # Точные геодезические расчеты (WGS84)
-import math
-
-# Для расчета координат
-geod = Geod(ellps="WGS84")  # ellps="WGS84" = стандарт Земли для GPS
+import os
+import threading
+import time
+
+from pymavlink import mavutil  # для связи с дроном по MAVLink
+from drone_monitor import DroneState, monitor_loop, request_home_position
+# Геозона по периметру: при выходе за неё — возврат на базу (RTL)
+from geo_frame import get_frame
+from geofence import Geofence, offset_polygon
+from return_base import watch_geofence
+# Построение точек миссии (геодезия WGS84 через pyproj)
+from mission_builder import offsets_to_latlon
+# Порядок облёта периметра и контрольных точек
+from route_planner import build_route_mission, plan_route
+# Раздел точек между несколькими аппаратами
+from patrol_partition import PatrolPartitioner, build_patrol_missions
+# Загрузка миссии с таймаутами и повторами (только изменённые пункты)
+from mission_transfer import upload_mission_incremental
 
 
 def connect():
@@ -45,174 +57,113 @@ def get_current_position(master):
     return lat, lon
 
 
-def add_waypoint_latlon(
-    wp_loader: mavwp.MAVWPLoader,  # Контейнер для точек миссии
-    master: mavutil.mavfile,       # MAVLink соединение
-    lat_deg: float,                # Широта в градусах
-    lon_deg: float,                # Долгота в градусах
-    alt_m: float,                  # Высота в метрах (относительная)
-    current: int = 0,              # current=1 означает "текущая точка"
-    frame: int = None,             # Система координат миссии
-    # Тип команды (NAV_WAYPOINT = лететь к точке)
-    command: int = None,
-):
+def get_home_position(master, timeout=3.0):
     """
-    Добавить точку миссии по абсолютным координатам lat/lon (в градусах).
-    Координаты конвертируются в формат degE7 для MISSION_ITEM_INT.
+    Точка home аппарата из HOME_POSITION: (lat_deg, lon_deg) или None,
+    если автопилот не ответил за timeout. В отличие от текущей позиции,
+    home не «плавает» от шума GPS между запусками.
     """
-    if frame is None:
-        # относительная высота над землёй
-        frame = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
-    if command is None:
-        command = mavutil.mavlink.MAV_CMD_NAV_WAYPOINT  # лететь к точке
-
-    autocontinue = 1
-
-    lat_int = int(lat_deg * 1e7)
-    lon_int = int(lon_deg * 1e7)
-
-    wp_loader.add(
-        mavutil.mavlink.MAVLink_mission_item_int_message(
-            master.target_system,       # ID дрона
-            master.target_component,    # ID автопилота
-            # Временный порядковый номер точки (перезапишется)
-            0,
-            frame,                      # Система координат
-            command,                    # Команда
-            current,                    # Текущая точка да/нет
-            autocontinue,               # Продолжать автоматически да/нет
-            # param1-4 (радиус, задержка и т.д. - не используем)
-            0, 0, 0, 0,
-            lat_int, lon_int, alt_m     # Координаты и высота
-        )
-    )
+    request_home_position(master)
+    msg = master.recv_match(type='HOME_POSITION', blocking=True, timeout=timeout)
+    if msg is None:
+        return None
+    return msg.latitude / 1e7, msg.longitude / 1e7
 
 
-def add_waypoint_offset_m(
-    wp_loader: mavwp.MAVWPLoader,
-    master: mavutil.mavfile,
-    base_lat_deg: float,
-    base_lon_deg: float,
-    north_m: float,
-    east_m: float,
-    alt_m: float,
-    current: int = 0,
-    frame: int = None,
-    command: int = None,
-):
-    """
-    Добавить точку миссии по относительному смещению в метрах
-    от базовой точки (base_lat_deg/base_lon_deg).
+# База патруля (lat, lon). None — home аппарата (HOME_POSITION).
+# Все точки миссии считаются от базы: при неизменной базе сдвиг одной
+# контрольной точки меняет один пункт миссии, и дозагружается только он.
+BASE_LATLON = None
+
+# Хэши последней загруженной миссии по sysid — между запусками скрипта
+MISSION_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "perimeter_security_mission.json")
+
+# Вершины периметра охраняемой зоны: (север, восток) от базы, м
+PERIMETER_M = [
+    (-50.0, -50.0),
+    (450.0, -50.0),
+    (450.0, 1400.0),
+    (-50.0, 1400.0),
+]
+
+# Контрольные точки: (север, восток) от базы, м
+CHECKPOINTS_M = [
+    (400.0, 300.0),    # береговая наблюдательная точка
+    (50.0, 1350.0),    # контрольная точка патрулирования
+]
 
-    north_m > 0  -> смещение на север
-    east_m  > 0  -> смещение на восток
+# Шаг точек вдоль границы периметра, м
+PERIMETER_SPACING_M = 100.0
+
+# Запас геозоны за периметром, м: патруль летит по самой границе
+# периметра, и шум GPS не должен вызывать возврат на базу
+GEOFENCE_MARGIN_M = 30.0
+
+
+def patrol_points(lat_deg, lon_deg):
     """
-    if frame is None:
-        frame = mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT
-    if command is None:
-        command = mavutil.mavlink.MAV_CMD_NAV_WAYPOINT
-
-    # Длина вектора и азимут (0° = север, 90° = восток)
-    distance = math.hypot(north_m, east_m)
-    if distance == 0:
-        azimuth_deg = 0.0
-    else:
-        # arctan(y/x), x - ось севера, y - ось востока
-        azimuth_deg = math.degrees(math.atan2(east_m, north_m))
-
-    # Вычисляем новые координаты по геодезии WGS84
-    # geod.fwd принимает (lon, lat, azimuth_deg, distance_m)
-    lon_new, lat_new, _ = geod.fwd(
-        base_lon_deg, base_lat_deg, azimuth_deg, distance)
-
-    # Используем функцию добавления по абсолютным координатам
-    add_waypoint_latlon(
-        wp_loader,
-        master,
-        lat_new,
-        lon_new,
-        alt_m,
-        current=current,
-        frame=frame,
-        command=command,
-    )
+    Контрольные точки и вершины периметра в координатах:
+    ([(lat, lon), ...], [(lat, lon), ...]).
+    """
+    # Смещения в координаты — одним пакетом (один вызов geod.fwd)
+    per_lat, per_lon = offsets_to_latlon(lat_deg, lon_deg,
+                                         [north for north, _ in PERIMETER_M],
+                                         [east for _, east in PERIMETER_M])
+    cp_lat, cp_lon = offsets_to_latlon(lat_deg, lon_deg,
+                                       [north for north, _ in CHECKPOINTS_M],
+                                       [east for _, east in CHECKPOINTS_M])
+    return list(zip(cp_lat, cp_lon)), list(zip(per_lat, per_lon))
+
 
-    return lat_new, lon_new  # опционально можно использовать снаружи
+def build_geofence(lat_deg, lon_deg, margin_m=GEOFENCE_MARGIN_M):
+    """
+    Геозона патруля: периметр PERIMETER_M, раздвинутый наружу на
+    margin_m (каждая сторона — по своей нормали), в системе NED от базы.
+    """
+    north, east = offset_polygon([north for north, _ in PERIMETER_M],
+                                 [east for _, east in PERIMETER_M], margin_m)
+    fence_lat, fence_lon = offsets_to_latlon(lat_deg, lon_deg, north, east)
+    return Geofence(get_frame(lat_deg, lon_deg), perimeter=list(zip(fence_lat, fence_lon)))
 
 
 def build_mission(master, lat_deg, lon_deg, alt_m=15.0):
     """
     Создаем список точек полета
 
-    Пример миссии:
     • Точка 0: текущая позиция (current=1)
-    • Точка 1: 100м севернее
-    • Точка 2: 100м восточнее
+    • Дальше — граница периметра через PERIMETER_SPACING_M и контрольные
+      точки в порядке, при котором облёт самый короткий
+    • В конце — возврат на базу (RTL)
     """
-    wp = mavwp.MAVWPLoader()  # загрузчик точек миссии
-
-    # Точка 0: текущая позиция, текущий пункт миссии
-    add_waypoint_latlon(
-        wp_loader=wp,
-        master=master,
-        lat_deg=lat_deg,
-        lon_deg=lon_deg,
-        alt_m=alt_m,
-        current=1,  # текущий пункт
-    )
-
-    # Точка 1: смещение в метрах от текущей позиции
-    add_waypoint_offset_m(
-        wp_loader=wp,
-        master=master,
-        base_lat_deg=lat_deg,
-        base_lon_deg=lon_deg,
-        north_m=400.0,   # 100 м на север
-        east_m=300.0,    # 100 м на восток
-        alt_m=alt_m,
-        current=0,
-    )
-
-    # Точка 2: смещение в метрах от текущей позиции
-    add_waypoint_offset_m(
-        wp_loader=wp,
-        master=master,
-        base_lat_deg=lat_deg,
-        base_lon_deg=lon_deg,
-        north_m=50.0,   # на север
-        east_m=1350.0,    # на восток
-        alt_m=alt_m,
-        current=0,
-    )
-
-    return wp
+    checkpoints, perimeter = patrol_points(lat_deg, lon_deg)
+    plan = plan_route(lat_deg, lon_deg,
+                      checkpoints=checkpoints,
+                      perimeter=perimeter,
+                      spacing_m=PERIMETER_SPACING_M)
+    print(f"Маршрут: {len(plan)} точек, {plan.length_m:.0f} м")
+    return build_route_mission(master, plan, alt_m)
 
 
-def upload_mission(master, wp_loader):
+def build_fleet_missions(masters, lat_deg, lon_deg, budgets_m, alt_m=15.0):
     """
-    Загрузить миссию в автопилот по протоколу MAVLink Mission:
-    CLEAR_ALL -> COUNT -> (REQUEST / REQUEST_INT -> ITEM / ITEM_INT) * N -> ACK.
+    Патруль несколькими аппаратами с одной базы: точки периметра и
+    контрольные точки делятся между ними с учётом запаса хода.
+
+    masters: {sysid: соединение} (например, fleet.vehicles)
+    budgets_m: {sysid: запас хода, м} (patrol_partition.battery_range_m)
+    Возвращает (partitioner, {sysid: MAVWPLoader}); если аппарат выбыл,
+    partitioner.partition с оставшимися аппаратами пересчитывает раздел
+    без повторного построения матрицы расстояний.
     """
-    # Очистить старую миссию
-    master.waypoint_clear_all_send()
-
-    count = wp_loader.count()
-    print(f"Загружаем миссию из {count} точек")
-    master.waypoint_count_send(count)
-
-    for i in range(count):
-        # Ждём запрос очередного пункта
-        msg = master.recv_match(
-            type=['MISSION_REQUEST_INT', 'MISSION_REQUEST'],
-            blocking=True
-        )
-        seq = msg.seq
-        print(f"Отправка пункта миссии seq={seq}")
-        master.mav.send(wp_loader.wp(seq))
-
-    # Ждём подтверждение
-    ack = master.recv_match(type='MISSION_ACK', blocking=True)
-    print(f"MISSION_ACK: {ack}")
+    checkpoints, perimeter = patrol_points(lat_deg, lon_deg)
+    partitioner = PatrolPartitioner(lat_deg, lon_deg, checkpoints, perimeter,
+                                    spacing_m=PERIMETER_SPACING_M)
+    plans = partitioner.partition(budgets_m)
+    for sysid, plan in plans.items():
+        print(f"Аппарат {sysid}: {len(plan)} точек, {plan.length_m:.0f} м "
+              f"из {budgets_m[sysid]:.0f} м запаса")
+    return partitioner, build_patrol_missions(plans, alt_m, masters)
 
 
 def main():
@@ -220,14 +171,44 @@ def main():
     # 1. Подключиться к дрону
     master = connect()
 
-    # 2. Получить текущие координаты и вывести
-    lat, lon = get_current_position(master)
+    # 2. База патруля: заданная BASE_LATLON или home аппарата
+    base = BASE_LATLON or get_home_position(master)
+    if base is None:
+        # Без home точки плавают вместе с GPS, и каждый запуск меняет всю миссию
+        print("HOME_POSITION не получен — база по текущей позиции")
+        base = get_current_position(master)
+    lat, lon = base
+    print(f"База патруля: lat={lat:.7f}, lon={lon:.7f}")
 
     # 3. Создать простую миссию с использованием новых функций
     wp_loader = build_mission(master, lat, lon, alt_m=30.0)
 
     # 4. Загрузить полётное задание в контроллер
-    upload_mission(master, wp_loader)
+    print(f"Загружаем миссию из {wp_loader.count()} точек")
+    stats = upload_mission_incremental(master, wp_loader, state_path=MISSION_STATE_PATH)
+    print(f"Миссия загружена: {stats.count} точек за {stats.elapsed_s:.2f} с "
+          f"({stats.items_per_s:.0f} точек/с, повторов: {stats.retries})")
+
+    # 5. Следить за геозоной во время патруля: выход за периметр — RTL
+    state = DroneState()
+    stop_flag = {"stop": False}
+    monitor_thread = threading.Thread(
+        target=monitor_loop,
+        args=(master, state, lambda: stop_flag["stop"]),
+        daemon=True,
+    )
+    monitor_thread.start()
+    geofence_monitor = watch_geofence(build_geofence(lat, lon))
+    print(f"Геозона: периметр + {GEOFENCE_MARGIN_M:.0f} м, Ctrl+C — выход")
+    try:
+        while monitor_thread.is_alive():
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        geofence_monitor.detach()
+        stop_flag["stop"] = True
+        monitor_thread.join(timeout=2.0)
 
 
 if __name__ == "__main__":
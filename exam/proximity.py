@@ -0,0 +1,263 @@
+# proximity.py
+#
+# Контроль расстояния между аппаратами флота.
+# На каждом такте позиции всех аппаратов (последние DroneSnapshot)
+# одним вызовом PROJ переводятся в общую систему NED, по ним строится
+# KD-дерево, и пары ближе порога находятся обходом двух деревьев
+# (пары узлов, чьи рамки дальше порога, отбрасываются целиком) —
+# вместо проверки всех N² пар. Конфликт сообщается один раз при
+# сближении и снимается, когда аппараты разошлись на порог + гистерезис.
+#
+#   monitor = ProximityMonitor(threshold_m=15, on_conflict=print)
+#   monitor.check(fleet.snapshots())          # один такт
+#   monitor.start(fleet.snapshots, rate_hz=10)  # или в фоновом потоке
+
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from geo_frame import LocalFrame, get_frame
+
+
+class KDTree:
+    """
+    KD-дерево точек (N, D) с листьями до leaf_size точек.
+    Узлы хранятся списками (рамка, диапазон в self.index, потомки):
+    деревья здесь небольшие и строятся заново на каждом такте,
+    а обход по спискам Python быстрее поэлементной работы с numpy.
+    """
+
+    def __init__(self, points, leaf_size: int = 16):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.index = np.arange(len(self.points))
+        self.lo = []        # Рамка узла: минимумы по осям (кортеж)
+        self.hi = []        # ... и максимумы
+        self.start = []     # Точки узла: self.index[start:end]
+        self.end = []
+        self.children = []  # (левый, правый) или None у листа
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self.lo)
+        block = self.points[self.index[start:end]]
+        lo, hi = block.min(axis=0), block.max(axis=0)
+        self.lo.append(tuple(lo.tolist()))
+        self.hi.append(tuple(hi.tolist()))
+        self.start.append(start)
+        self.end.append(end)
+        self.children.append(None)
+        if end - start <= self.leaf_size:
+            return node
+
+        # Деление по самой длинной стороне рамки на две равные половины
+        axis = int(np.argmax(hi - lo))
+        mid = (start + end) // 2
+        order = np.argpartition(block[:, axis], mid - start)
+        self.index[start:end] = self.index[start:end][order]
+        left = self._build(start, mid)
+        right = self._build(mid, end)
+        self.children[node] = (left, right)
+        return node
+
+    def _gap_sq(self, a: int, b: int) -> float:
+        """
+        Квадрат расстояния между рамками узлов a и b (0, если пересекаются).
+        """
+        gap = 0.0
+        for lo_a, hi_a, lo_b, hi_b in zip(self.lo[a], self.hi[a], self.lo[b], self.hi[b]):
+            d = lo_b - hi_a if lo_b > hi_a else lo_a - hi_b
+            if d > 0:
+                gap += d * d
+        return gap
+
+    def query_pairs(self, radius: float):
+        """
+        Все пары точек ближе radius: (i, j, расстояние) массивами numpy, i < j.
+        """
+        empty = np.empty(0, dtype=np.int64)
+        if len(self.points) < 2:
+            return empty, empty, np.empty(0)
+
+        radius_sq = radius * radius
+        leaf_a, leaf_b = [], []   # Пары листьев, рамки которых ближе radius
+        stack = [(0, 0)]
+        while stack:
+            a, b = stack.pop()
+            if a != b and self._gap_sq(a, b) > radius_sq:
+                continue
+            children_a, children_b = self.children[a], self.children[b]
+            if children_a is None and children_b is None:
+                leaf_a.append(a)
+                leaf_b.append(b)
+            elif a == b:
+                left, right = children_a
+                stack += [(left, left), (left, right), (right, right)]
+            elif children_b is None or (children_a is not None and
+                                        self.end[a] - self.start[a] >= self.end[b] - self.start[b]):
+                stack += [(child, b) for child in children_a]
+            else:
+                stack += [(a, child) for child in children_b]
+
+        # Все пары точек всех найденных пар листьев — одним набором операций numpy
+        start = np.array(self.start)
+        size = np.array(self.end) - start
+        leaf_a, leaf_b = np.array(leaf_a), np.array(leaf_b)
+        counts = size[leaf_a] * size[leaf_b]
+        pair = np.repeat(np.arange(len(leaf_a)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = size[leaf_b][pair]
+        i = self.index[start[leaf_a][pair] + k // width]
+        j = self.index[start[leaf_b][pair] + k % width]
+        keep = (leaf_a != leaf_b)[pair] | (i < j)   # внутри листа каждая пара — один раз
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+        distance = np.sqrt(np.sum((self.points[i] - self.points[j]) ** 2, axis=1))
+        close = distance < radius
+        return i[close], j[close], distance[close]
+
+
+class ProximityEvent(NamedTuple):
+    """
+    Сближение (или расхождение) пары аппаратов.
+    """
+    time: float
+    sysid_a: int
+    sysid_b: int
+    distance_m: float
+
+
+class ProximityMonitor:
+    """
+    Контроль расстояния между аппаратами по их DroneSnapshot.
+
+    threshold_m: сближение ближе порога — конфликт (on_conflict(event)).
+    hysteresis_m: конфликт снимается (on_clear(event)), когда пара
+                  разошлась дальше threshold_m + hysteresis_m.
+    frame: общая система NED; None — с началом в первой увиденной позиции.
+    vertical: учитывать разницу высот (высота над своим home, alt_rel_m);
+              False — только горизонтальное расстояние.
+    """
+
+    def __init__(self, threshold_m: float, on_conflict=None, on_clear=None,
+                 hysteresis_m: float = 2.0, frame: LocalFrame = None,
+                 vertical: bool = True, leaf_size: int = 16):
+        self.threshold_m = threshold_m
+        self.hysteresis_m = hysteresis_m
+        self.on_conflict = on_conflict
+        self.on_clear = on_clear
+        self.frame = frame
+        self.vertical = vertical
+        self.leaf_size = leaf_size
+        self.conflicts = {}   # (sysid_a, sysid_b) -> ProximityEvent начала конфликта
+        self.ticks = 0
+        self.tick_time_s = 0.0   # Время последнего такта
+        self.errors = 0          # Тактов фонового потока, завершившихся ошибкой
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def positions(self, snapshots: dict):
+        """
+        {sysid: DroneSnapshot} -> (sysid массивом, точки (N, 3) или (N, 2) в метрах).
+        Аппараты без GPS пропускаются.
+        """
+        items = [(sysid, s) for sysid, s in snapshots.items() if s.lat_deg != 0.0 or s.lon_deg != 0.0]
+        sysids = np.array([sysid for sysid, _ in items], dtype=np.int64)
+        if not items:
+            return sysids, np.empty((0, 3 if self.vertical else 2))
+
+        lat = np.array([s.lat_deg for _, s in items])
+        lon = np.array([s.lon_deg for _, s in items])
+        if self.frame is None:
+            self.frame = get_frame(round(float(lat[0]), 6), round(float(lon[0]), 6))
+        north, east, _ = self.frame.to_ned(lat, lon)
+        if not self.vertical:
+            return sysids, np.column_stack([north, east])
+        down = np.array([-s.alt_rel_m for _, s in items])
+        return sysids, np.column_stack([north, east, down])
+
+    def check(self, snapshots: dict) -> list:
+        """
+        Один такт: найти сближения, вызвать колбэки.
+        Возвращает список новых конфликтов (ProximityEvent).
+        """
+        started = time.perf_counter()
+        now = time.time()
+        sysids, points = self.positions(snapshots)
+        tree = KDTree(points, self.leaf_size)
+        # Один запрос на порог + гистерезис: и новые, и ещё не разошедшиеся пары
+        i, j, distance = tree.query_pairs(self.threshold_m + self.hysteresis_m)
+
+        close = {}
+        for a, b, d in zip(sysids[i].tolist(), sysids[j].tolist(), distance.tolist()):
+            close[(a, b) if a < b else (b, a)] = d
+
+        new = []
+        for pair, d in close.items():
+            if pair not in self.conflicts and d < self.threshold_m:
+                event = ProximityEvent(now, pair[0], pair[1], d)
+                self.conflicts[pair] = event
+                new.append(event)
+                if self.on_conflict is not None:
+                    self.on_conflict(event)
+        for pair in [pair for pair in self.conflicts if pair not in close]:
+            del self.conflicts[pair]
+            if self.on_clear is not None:
+                a, b = pair
+                d = self._distance(sysids, points, a, b)
+                self.on_clear(ProximityEvent(now, a, b, d))
+
+        self.ticks += 1
+        self.tick_time_s = time.perf_counter() - started
+        return new
+
+    @staticmethod
+    def _distance(sysids, points, a: int, b: int) -> float:
+        index_a = np.nonzero(sysids == a)[0]
+        index_b = np.nonzero(sysids == b)[0]
+        if not len(index_a) or not len(index_b):
+            return float("nan")   # один из аппаратов пропал (нет GPS или соединения)
+        return float(np.linalg.norm(points[index_a[0]] - points[index_b[0]]))
+
+    # ---------- фоновый поток ----------
+
+    def start(self, snapshots_fn, rate_hz: float = 10.0, on_error=None) -> "ProximityMonitor":
+        """
+        Проверять check(snapshots_fn()) с частотой rate_hz в фоновом потоке
+        (например, snapshots_fn = fleet.snapshots). Колбэки — в этом потоке.
+        Ошибка такта не останавливает контроль: она считается в self.errors
+        и передаётся в on_error(исключение) (по умолчанию — печать).
+        """
+        self._stop.clear()
+
+        def run():
+            period = 1.0 / rate_hz
+            next_tick = time.monotonic()
+            while not self._stop.is_set():
+                try:
+                    self.check(snapshots_fn())
+                except Exception as error:
+                    self.errors += 1
+                    self.last_error = error
+                    if on_error is not None:
+                        on_error(error)
+                    else:
+                        print(f"Контроль сближения: ошибка такта: {error!r}")
+                next_tick += period
+                self._stop.wait(max(next_tick - time.monotonic(), 0.0))
+
+        self._thread = threading.Thread(target=run, name="proximity", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
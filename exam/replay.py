@@ -0,0 +1,129 @@
+# replay.py
+#
+# Повтор записанного полёта (.tlog) через тот же monitor_loop и те же
+# обработчики DroneState — для аналитики патрулей и проверки изменений
+# обработчиков без дрона.
+#
+# Запуск из папки exam:
+#   python replay.py flight.tlog            -> как можно быстрее
+#   python replay.py flight.tlog --speed 1  -> в реальном времени
+
+import argparse
+from dataclasses import dataclass
+import time
+
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+from drone_monitor import DroneState, monitor_loop, registry as default_registry
+
+
+class ReplayConnection:
+    """
+    Обёртка над файловым соединением pymavlink, которую можно передать
+    в monitor_loop вместо master.
+
+    speed: None — отдавать сообщения как можно быстрее;
+           1.0 — с исходными интервалами; 100.0 — в 100 раз быстрее.
+    Остальные атрибуты (target_system, sysid_state, ...) берутся из файла.
+    """
+
+    def __init__(self, path: str, speed: float = None):
+        self.log = mavutil.mavlink_connection(path)
+        self.speed = speed
+        self.finished = False   # True, когда файл прочитан до конца
+        self.messages = 0       # Сколько сообщений отдано
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._wall_start = None
+
+    def __getattr__(self, name):
+        return getattr(self.log, name)
+
+    def recv_match(self, condition=None, type=None, blocking=False, timeout=None):
+        # Файл не «ждёт» новых данных: blocking/timeout не нужны,
+        # а blocking=True на конце файла зациклил бы pymavlink.
+        msg = self.log.recv_match(condition=condition, type=type)
+        if msg is None:
+            self.finished = True
+            return None
+
+        self.messages += 1
+        timestamp = msg._timestamp
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+            self._wall_start = time.perf_counter()
+        self.last_timestamp = timestamp
+
+        if self.speed:
+            # Держим исходные интервалы между сообщениями (с ускорением speed)
+            due = self._wall_start + (timestamp - self.first_timestamp) / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return msg
+
+    def close(self) -> None:
+        self.log.close()
+
+
+@dataclass
+class ReplayStats:
+    """
+    Итоги повтора записи.
+    """
+    messages: int = 0           # Сообщений прошло через monitor_loop
+    elapsed_s: float = 0.0      # Время повтора, с
+    log_duration_s: float = 0.0 # Длительность записанного полёта, с
+
+    @property
+    def messages_per_s(self) -> float:
+        return self.messages / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    @property
+    def speedup(self) -> float:
+        return self.log_duration_s / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def replay_flight(path: str,
+                  state: DroneState = None,
+                  speed: float = None,
+                  registry=default_registry,
+                  history=None) -> ReplayStats:
+    """
+    Прогнать запись path через monitor_loop в текущем потоке.
+    Обработчики получают сообщения с их исходным временем приёма
+    (msg._timestamp), поэтому DroneState и история выглядят как в полёте.
+    """
+    if state is None:
+        state = DroneState()
+
+    conn = ReplayConnection(path, speed=speed)
+    start = time.perf_counter()
+    try:
+        monitor_loop(conn, state, lambda: conn.finished, registry, history)
+    finally:
+        conn.close()
+
+    stats = ReplayStats(messages=conn.messages, elapsed_s=time.perf_counter() - start)
+    if conn.first_timestamp is not None:
+        stats.log_duration_s = conn.last_timestamp - conn.first_timestamp
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повтор записанного полёта (.tlog)")
+    parser.add_argument("path", help="файл .tlog")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="ускорение (1 = реальное время); по умолчанию как можно быстрее")
+    args = parser.parse_args()
+
+    state = DroneState()
+    stats = replay_flight(args.path, state, speed=args.speed)
+
+    print(f"Сообщений: {stats.messages} за {stats.elapsed_s:.2f} с "
+          f"({stats.messages_per_s:.0f} сообщений/с, x{stats.speedup:.0f} к реальному времени)")
+    print(f"Последнее состояние: {state.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
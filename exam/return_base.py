@@ -3,8 +3,13 @@ import time
 
 from pymavlink import mavutil
 
-from drone_monitor import DroneState, monitor_loop
-from flight_control import set_mode_guided
+from drone_monitor import DroneState, monitor_loop, request_home_position
+from flight_control import set_mode, set_mode_guided
+from geo_frame import LocalFrame
+from geofence import Geofence, GeofenceMonitor
+from stream_rates import StreamRateManager
+from telemetry_recorder import TelemetryRecorder
+from vehicle_profile import request_autopilot_version
 
 
 def connect(connection_string: str = "tcp:127.0.0.1:14550") -> mavutil.mavlink_connection:
@@ -21,14 +26,40 @@ def connect(connection_string: str = "tcp:127.0.0.1:14550") -> mavutil.mavlink_c
         return None
 
     print(f"Подключено к системе {master.target_system}, компонент {master.target_component}")
+
+    # Прошивка и возможности попадут в профиль аппарата через monitor_loop,
+    # home — в начало системы NED (DroneState.frame)
+    request_autopilot_version(master)
+    request_home_position(master)
     return master
 
 
-def goto_local_ned(master, x=0, y=0, z=-10, coordinate_frame=mavutil.mavlink.MAV_FRAME_LOCAL_NED):
+def goto_local_ned(master, x=0, y=0, z=-10, coordinate_frame=mavutil.mavlink.MAV_FRAME_LOCAL_NED,
+                   frame: LocalFrame = None):
     """
     Полёт в точку (x, y, z) в системе LOCAL_NED (X — север, Y — восток, Z — вниз).
     Дрон уже должен быть ARM и в GUIDED.
+
+    frame: если задана система NED с началом в home (DroneState.frame),
+    (x, y, z) — метры от home: точка пересчитывается в lat/lon и уходит
+    SET_POSITION_TARGET_GLOBAL_INT с высотой над home. Без frame LOCAL_NED
+    отсчитывается от начала EKF, которое может не совпадать с home.
     """
+    if frame is not None:
+        lat, lon, _ = frame.to_geodetic(x, y)
+        master.mav.set_position_target_global_int_send(
+            0,
+            master.target_system,
+            master.target_component,
+            mavutil.mavlink.MAV_FRAME_GLOBAL_RELATIVE_ALT_INT,
+            0b0000111111111000,         # только позиция
+            int(lat * 1e7), int(lon * 1e7), -z,
+            0, 0, 0,
+            0, 0, 0,
+            0, 0
+        )
+        return
+
     coordinate_frame = mavutil.mavlink.MAV_FRAME_LOCAL_NED  # или MAV_FRAME_LOCAL_OFFSET_NED / BODY_OFFSET_NED
 
     type_mask = 0b0000111111111000  # 4088: используем ТОЛЬКО позицию x,y,z [web:5][web:23]
@@ -45,6 +76,34 @@ def goto_local_ned(master, x=0, y=0, z=-10, coordinate_frame=mavutil.mavlink.MAV
         0, 0                        # yaw / yaw_rate игнорируются маской
     )
 
+def return_to_base(master, state: DroneState = None, timeout: float = 5.0) -> None:
+    """
+    Возврат на базу: режим RTL (с подтверждением по state, как set_mode).
+    timeout=0 — только отправить SET_MODE.
+    """
+    set_mode(master, "RTL", timeout, state)
+
+
+def watch_geofence(fence: Geofence, rates: StreamRateManager = None) -> GeofenceMonitor:
+    """
+    Проверять геозону на каждый GLOBAL_POSITION_INT и при нарушении
+    возвращаться на базу. Колбэк вызывается в потоке мониторинга —
+    ждать там подтверждения режима нельзя (этот же поток принимает
+    HEARTBEAT), поэтому RTL только отправляется; дождаться его можно
+    через state.wait_mode("RTL").
+    rates: частоты телеметрии переключаются в фазу "precision" (возврат
+    и посадка) — в отдельном потоке по той же причине.
+    """
+    def on_breach(master, state):
+        print(f"Выход из геозоны: {state.lat_deg:.7f} {state.lon_deg:.7f}, возврат на базу")
+        return_to_base(master, timeout=0)
+        if rates is not None:
+            threading.Thread(target=rates.set_phase, args=("precision",),
+                             name="stream-rates", daemon=True).start()
+
+    return GeofenceMonitor(fence, on_breach)
+
+
 if __name__ == "__main__":
     master = connect(connection_string="tcp:127.0.0.1:14550")
 
@@ -52,6 +111,10 @@ if __name__ == "__main__":
 
     stop_flag = {"stop": False}
 
+    # Все принятые сообщения пишутся в .tlog фоновым потоком
+    recorder = TelemetryRecorder(time.strftime("return_base_%Y%m%d_%H%M%S.tlog"))
+    recorder.attach(master)
+
     # В отдельном потоке запускаем цикл мониторинга
     monitor_thread = threading.Thread(
         target=monitor_loop,
@@ -61,15 +124,44 @@ if __name__ == "__main__":
 
     monitor_thread.start()
 
-    set_mode_guided(master)
+    # Режим подтверждается по DroneState, который обновляет поток мониторинга
+    set_mode_guided(master, state)
+
+    # Частоты телеметрии — по подпискам реестра; перелёт — фаза "cruise"
+    rates = StreamRateManager(master)
+    rates.set_phase("cruise")
+
+    # Геозона — квадрат 2 * GEOFENCE_HALF_SIDE_M вокруг home; при выходе — RTL.
+    # Без начала NED (home или первая точка GPS) её не построить — тогда не летим
+    GEOFENCE_HALF_SIDE_M = 100
+    if state.wait_until(lambda s: state.frame is not None, timeout=10) is None:
+        rates.detach()
+        stop_flag["stop"] = True
+        monitor_thread.join(timeout=2.0)
+        recorder.close()
+        raise SystemExit("Нет HOME_POSITION и GPS за 10 с: геозону не построить, полёт отменён")
+    half = GEOFENCE_HALF_SIDE_M
+    lat, lon, _ = state.frame.to_geodetic([-half, -half, half, half], [-half, half, half, -half])
+    geofence_monitor = watch_geofence(Geofence(state.frame, perimeter=list(zip(lat, lon))), rates)
 
-    time.sleep(1)
     print("Старт перемещения")
-    goto_local_ned(master, x=5, y=2, z=-7)
-    for _ in range(10):
-        print(state.lat_deg, state.lon_deg)
-        time.sleep(1)
-
+    # Метры от home (state.frame)
+    goto_local_ned(master, x=5, y=2, z=-7, frame=state.frame)
+
+    # Ждём набора высоты без опроса: поток спит, пока monitor_loop не
+    # опубликует подходящий снимок (согласованная пара lat/lon)
+    snapshot = state.wait_until(lambda s: s.alt_rel_m >= 7 * 0.95, timeout=10)
+    if snapshot is None:
+        snapshot = state.snapshot()
+        print(f"Высота 7 м не достигнута за 10 с, текущая {snapshot.alt_rel_m:.1f} м")
+    print(snapshot.lat_deg, snapshot.lon_deg)
+    print(f"NED от home: {snapshot.north_m:.1f} {snapshot.east_m:.1f} {snapshot.down_m:.1f} м")
+
+    geofence_monitor.detach()
+    rates.detach()
     stop_flag["stop"] = True
     monitor_thread.join(timeout=2.0)
 
+    recorder.close()
+    print(f"Записано сообщений: {recorder.recorded}, потеряно: {recorder.dropped}")
+
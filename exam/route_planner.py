@@ -0,0 +1,218 @@
+# route_planner.py
+#
+# Маршрут патрулирования по периметру и контрольным точкам.
+# Граница периметра (многоугольник) уплотняется до точек через заданный
+# шаг, вместе с контрольными точками они упорядочиваются эвристикой
+# коммивояжёра (ближайший сосед + 2-opt) так, чтобы облёт из базы и
+# обратно был как можно короче, и маршрут превращается в MAVWPLoader.
+#
+#   plan = plan_route(base_lat, base_lon, checkpoints, perimeter, spacing_m=100)
+#   print(plan.length_m, plan.nearest_neighbour_length_m)
+#   wp_loader = build_route_mission(master, plan, alt_m=30)
+
+from dataclasses import dataclass
+
+import numpy as np
+from pymavlink import mavutil, mavwp  # для связи с дроном по MAVLink
+
+from geo_frame import get_frame
+from mission_builder import add_waypoint_latlon, add_waypoints_latlon, geod
+
+
+def _as_latlon(points):
+    """
+    [(lat, lon), ...] или массив (N, 2) -> (lat_deg, lon_deg) массивы numpy.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points[:, 0], points[:, 1]
+
+
+def densify_polygon(lat_deg, lon_deg, spacing_m: float):
+    """
+    Точки по границе многоугольника через spacing_m (не реже) по геодезическим
+    линиям WGS84. Все стороны считаются одним вызовом geod.inv, все новые
+    точки — одним вызовом geod.fwd. Вершины сохраняются; замыкающая вершина
+    (равная первой) не обязательна. Возвращает (lat_deg, lon_deg).
+    """
+    lat = np.asarray(lat_deg, dtype=np.float64)
+    lon = np.asarray(lon_deg, dtype=np.float64)
+    if len(lat) > 1 and lat[0] == lat[-1] and lon[0] == lon[-1]:
+        lat, lon = lat[:-1], lon[:-1]
+
+    # Стороны: вершина i -> вершина i+1 (последняя -> первая)
+    azimuth_deg, _, length_m = geod.inv(lon, lat, np.roll(lon, -1), np.roll(lat, -1))
+    counts = np.maximum(np.ceil(length_m / spacing_m).astype(np.int64), 1)
+
+    # Для каждой новой точки: её сторона и номер на стороне (0 — сама вершина)
+    edge = np.repeat(np.arange(len(lat)), counts)
+    index_on_edge = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    distance_m = (length_m / counts)[edge] * index_on_edge
+
+    lon_new, lat_new, _ = geod.fwd(lon[edge], lat[edge], azimuth_deg[edge], distance_m)
+    return np.asarray(lat_new), np.asarray(lon_new)
+
+
+def route_points(checkpoints=(), perimeter=None, spacing_m: float = None):
+    """
+    Точки облёта: контрольные точки, затем вершины периметра (при spacing_m —
+    граница, уплотнённая до точек через spacing_m).
+    Возвращает (lat_deg, lon_deg, is_checkpoint) — массивы numpy.
+    """
+    cp_lat, cp_lon = _as_latlon(checkpoints)
+    lat_parts, lon_parts = [cp_lat], [cp_lon]
+    if perimeter is not None:
+        per_lat, per_lon = _as_latlon(perimeter)
+        if spacing_m is not None:
+            per_lat, per_lon = densify_polygon(per_lat, per_lon, spacing_m)
+        lat_parts.append(per_lat)
+        lon_parts.append(per_lon)
+    lat = np.concatenate(lat_parts)
+    lon = np.concatenate(lon_parts)
+    return lat, lon, np.arange(len(lat)) < len(cp_lat)
+
+
+def distance_matrix(x, y) -> np.ndarray:
+    """
+    Попарные расстояния (N, N) между точками плоскости, одна операция numpy.
+    """
+    return np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+
+
+def tour_length_m(lat_deg, lon_deg, order) -> float:
+    """
+    Длина замкнутого обхода точек в порядке order по геодезическим
+    линиям WGS84 (все участки — одним вызовом geod.inv).
+    """
+    order = np.asarray(order)
+    following = np.roll(order, -1)
+    _, _, legs_m = geod.inv(lon_deg[order], lat_deg[order], lon_deg[following], lat_deg[following])
+    return float(np.sum(legs_m))
+
+
+def nearest_neighbour_order(dist: np.ndarray, start: int = 0) -> np.ndarray:
+    """
+    Обход «каждый раз в ближайшую непосещённую точку» из start.
+    """
+    n = len(dist)
+    order = np.empty(n, dtype=np.int64)
+    remaining = np.ones(n, dtype=bool)
+    current = start
+    for i in range(n):
+        order[i] = current
+        remaining[current] = False
+        if i == n - 1:
+            break
+        current = int(np.where(remaining, dist[current], np.inf).argmin())
+    return order
+
+
+def two_opt(dist: np.ndarray, order, max_passes: int = 50) -> np.ndarray:
+    """
+    Улучшение замкнутого обхода перестановками 2-opt: ребра (a, b) и (c, d)
+    заменяются на (a, c) и (b, d), если так короче (участок b..c
+    разворачивается). Для каждого ребра выигрыш по всем остальным рёбрам
+    считается одной операцией numpy. Первая точка обхода (база) остаётся
+    первой. Проходы повторяются, пока есть улучшения (не больше max_passes).
+    """
+    order = np.array(order, dtype=np.int64)
+    n = len(order)
+    if n < 4:
+        return order
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            a, b = order[i], order[i + 1]
+            # рёбра (c, d) = (order[j], order[j + 1]) для j = i+2 .. n-1
+            c = order[i + 2:]
+            d = np.append(order[i + 3:], order[0])
+            gain = dist[a, b] + dist[c, d] - dist[a, c] - dist[b, d]
+            if i == 0:
+                gain[-1] = 0.0   # ребро (последняя, база) соседствует с (база, b)
+            k = int(gain.argmax())
+            if gain[k] > 1e-9:
+                j = i + 2 + k
+                order[i + 1:j + 1] = order[i + 1:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+@dataclass
+class RoutePlan:
+    """
+    Маршрут облёта: база, затем точки lat_deg/lon_deg по порядку и возврат на базу.
+    """
+    base_lat_deg: float
+    base_lon_deg: float
+    lat_deg: np.ndarray       # Точки маршрута в порядке облёта (без базы)
+    lon_deg: np.ndarray
+    is_checkpoint: np.ndarray  # True — контрольная точка, False — точка периметра
+    length_m: float                    # Длина замкнутого маршрута по WGS84, м
+    nearest_neighbour_length_m: float  # Та же длина до улучшения 2-opt, м
+
+    def __len__(self) -> int:
+        return len(self.lat_deg)
+
+
+def plan_route(base_lat_deg: float,
+               base_lon_deg: float,
+               checkpoints=(),
+               perimeter=None,
+               spacing_m: float = None,
+               two_opt_passes: int = 50) -> RoutePlan:
+    """
+    Спланировать облёт контрольных точек и периметра из базы с возвратом.
+
+    checkpoints: [(lat, lon), ...] — точки, которые надо посетить.
+    perimeter: [(lat, lon), ...] — вершины многоугольника периметра;
+               при spacing_m граница уплотняется до точек через spacing_m,
+               иначе посещаются только вершины.
+    Порядок — ближайший сосед из базы, затем 2-opt, по матрице расстояний
+    в системе NED от базы (geo_frame).
+    """
+    lat, lon, is_checkpoint = route_points(checkpoints, perimeter, spacing_m)
+
+    # Узел 0 — база, 1..N — точки маршрута
+    nodes_lat = np.concatenate([[base_lat_deg], lat])
+    nodes_lon = np.concatenate([[base_lon_deg], lon])
+    north, east, _ = get_frame(base_lat_deg, base_lon_deg).to_ned(nodes_lat, nodes_lon)
+    dist = distance_matrix(east, north)
+
+    order = nearest_neighbour_order(dist, start=0)
+    nearest_neighbour_length_m = tour_length_m(nodes_lat, nodes_lon, order)
+    order = two_opt(dist, order, two_opt_passes)
+
+    visit = order[1:] - 1
+    return RoutePlan(
+        base_lat_deg, base_lon_deg,
+        lat[visit], lon[visit], is_checkpoint[visit],
+        tour_length_m(nodes_lat, nodes_lon, order),
+        nearest_neighbour_length_m,
+    )
+
+
+def build_route_mission(master: mavutil.mavfile,
+                        plan: RoutePlan,
+                        alt_m: float,
+                        wp_loader: mavwp.MAVWPLoader = None,
+                        return_to_base: bool = True) -> mavwp.MAVWPLoader:
+    """
+    Миссия по маршруту: точка 0 — база (current=1), затем точки плана;
+    return_to_base — в конце MAV_CMD_NAV_RETURN_TO_LAUNCH.
+    """
+    if wp_loader is None:
+        wp_loader = mavwp.MAVWPLoader()
+
+    add_waypoints_latlon(
+        wp_loader, master,
+        np.concatenate([[plan.base_lat_deg], plan.lat_deg]),
+        np.concatenate([[plan.base_lon_deg], plan.lon_deg]),
+        alt_m,
+        current_seq=0,
+    )
+    if return_to_base:
+        add_waypoint_latlon(wp_loader, master, 0.0, 0.0, 0.0,
+                            command=mavutil.mavlink.MAV_CMD_NAV_RETURN_TO_LAUNCH)
+    return wp_loader
@@ -0,0 +1,230 @@
+# stream_rates.py
+#
+# Частоты телеметрии по потребностям подписчиков.
+# Вместо того чтобы разбирать всё, что автопилот шлёт по умолчанию,
+# через MAV_CMD_SET_MESSAGE_INTERVAL запрашиваются ровно те сообщения
+# и частоты, которые нужны обработчикам реестра drone_monitor, а ненужные
+# потоки отключаются. Частоты зависят от фазы полёта: на посадке выше,
+# на маршруте ниже. Интервалы в ArduPilot действуют только на тот канал,
+# по которому пришла команда, — Mission Planner на своём канале не страдает.
+#
+#   rates = StreamRateManager(master)
+#   rates.apply()                   # по текущим подпискам, фаза "normal"
+#   rates.set_phase("precision")    # посадка: позиция 20 Гц
+#   rates.require('ATTITUDE', 10, owner="stabilizer")
+#   print(rates.effective_rates())  # фактические частоты, Гц
+
+import threading
+import time
+
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+from command_ack import CommandError, send_command
+from drone_monitor import registry as default_registry
+
+# Частоты для фаз полёта, Гц (только для сообщений, на которые есть подписка)
+PHASE_RATES = {
+    "normal": {'GLOBAL_POSITION_INT': 5.0, 'SYS_STATUS': 1.0},
+    "cruise": {'GLOBAL_POSITION_INT': 2.0, 'SYS_STATUS': 0.5},
+    "precision": {'GLOBAL_POSITION_INT': 20.0, 'SYS_STATUS': 1.0},   # взлёт, посадка
+}
+
+# Эти сообщения не являются потоками телеметрии (ответы на запросы,
+# протокольные) или нужны всегда — их интервалы никогда не трогаем.
+_NEVER_DISABLE = frozenset([
+    'HEARTBEAT', 'COMMAND_ACK', 'COMMAND_LONG', 'AUTOPILOT_VERSION', 'STATUSTEXT',
+    'PARAM_VALUE', 'TIMESYNC', 'MISSION_ACK', 'MISSION_COUNT', 'MISSION_REQUEST',
+    'MISSION_REQUEST_INT', 'MISSION_ITEM', 'MISSION_ITEM_INT', 'MISSION_CURRENT',
+    'MISSION_ITEM_REACHED', 'HOME_POSITION', 'BAD_DATA',
+])
+
+
+def set_message_interval(master, msg_type: str, rate_hz: float, timeout: float = 1.0):
+    """
+    MAV_CMD_SET_MESSAGE_INTERVAL для одного сообщения.
+    rate_hz > 0 — частота; 0 — отключить; None — вернуть частоту по умолчанию.
+    """
+    if rate_hz is None:
+        interval_us = 0
+    elif rate_hz <= 0:
+        interval_us = -1
+    else:
+        interval_us = int(1e6 / rate_hz)
+    msg_id = getattr(mavutil.mavlink, f"MAVLINK_MSG_ID_{msg_type}")
+    return send_command(master, mavutil.mavlink.MAV_CMD_SET_MESSAGE_INTERVAL,
+                        (msg_id, interval_us), timeout)
+
+
+class StreamRateManager:
+    """
+    Запрошенные частоты сообщений для одного соединения.
+
+    Нужная частота сообщения = максимум из:
+      - частоты фазы (PHASE_RATES), если на сообщение есть подписка в registry
+        (подписка на сообщение без частоты фазы оставляет частоту по умолчанию);
+      - требований require(msg_type, rate_hz, owner) от отдельных модулей.
+    Пришедшие потоки, которые никому не нужны, отключаются (disable_unused).
+
+    Фазу меняют flight_control.takeoff/land (rates=...) и return_base:
+    взлёт и посадка — "precision", после набора высоты взлёта — "cruise"
+    (set_phase_when).
+
+    Изменения отправляются в apply() (его вызывают set_phase/require/release):
+    команды по одной, потому что COMMAND_ACK для SET_MESSAGE_INTERVAL не
+    говорит, к какому сообщению он относится, и одновременно ожидать
+    можно только одну такую команду (command_ack). Поэтому полётные
+    команды отправляются раньше смены частот, а не после неё.
+    """
+
+    def __init__(self, master,
+                 registry=default_registry,
+                 phase: str = "normal",
+                 disable_unused: bool = True,
+                 timeout: float = 1.0):
+        if phase not in PHASE_RATES:
+            raise ValueError(f"Неизвестная фаза: {phase}")
+        self.master = master
+        self.registry = registry
+        self.phase = phase
+        self.disable_unused = disable_unused
+        self.timeout = timeout
+
+        self.requested = {}   # msg_type -> частота, подтверждённая автопилотом (0 = отключено)
+        self.failed = {}      # msg_type -> CommandError последней попытки
+        self._requirements = {}   # msg_type -> {owner: rate_hz}
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()   # apply() из разных потоков — по очереди
+        self._phase_changes = 0   # Номер последней смены фазы (для set_phase_when)
+
+        # Счётчики принятых сообщений для effective_rates()
+        self._counts = {}
+        self._last_counts = {}
+        self._last_time = time.perf_counter()
+        master.message_hooks.append(self._on_message)
+
+    def _on_message(self, mav, msg) -> None:
+        # хук pymavlink: вызывается для каждого принятого сообщения
+        msg_type = msg.get_type()
+        self._counts[msg_type] = self._counts.get(msg_type, 0) + 1
+
+    def detach(self) -> None:
+        if self._on_message in self.master.message_hooks:
+            self.master.message_hooks.remove(self._on_message)
+
+    # ---------- что нужно ----------
+
+    def require(self, msg_type: str, rate_hz: float, owner="default") -> None:
+        """
+        Модулю owner нужно msg_type не реже rate_hz.
+        """
+        with self._lock:
+            self._requirements.setdefault(msg_type, {})[owner] = rate_hz
+        self.apply()
+
+    def release(self, msg_type: str, owner="default") -> None:
+        with self._lock:
+            owners = self._requirements.get(msg_type, {})
+            owners.pop(owner, None)
+            if not owners:
+                self._requirements.pop(msg_type, None)
+        self.apply()
+
+    def set_phase(self, phase: str) -> None:
+        """
+        Сменить фазу полёта ("normal", "cruise", "precision") и частоты.
+        """
+        if phase not in PHASE_RATES:
+            raise ValueError(f"Неизвестная фаза: {phase}")
+        with self._lock:
+            self.phase = phase
+            self._phase_changes += 1
+        self.apply()
+
+    def set_phase_when(self, state, predicate, phase: str, timeout: float = None) -> threading.Thread:
+        """
+        Сменить фазу на phase, когда predicate(снимок DroneState) станет
+        истинным, например "cruise" после набора высоты взлёта. Ждёт
+        отдельный поток; если фазу за это время сменили ещё раз (посадка
+        во время набора высоты) или истёк timeout, фаза не меняется.
+        """
+        if phase not in PHASE_RATES:
+            raise ValueError(f"Неизвестная фаза: {phase}")
+        with self._lock:
+            changes = self._phase_changes
+
+        def run():
+            if state.wait_until(predicate, timeout) is None:
+                return
+            with self._lock:
+                if self._phase_changes != changes:
+                    return
+            self.set_phase(phase)
+
+        thread = threading.Thread(target=run, name="stream-rates-phase", daemon=True)
+        thread.start()
+        return thread
+
+    def desired_rates(self) -> dict:
+        """
+        msg_type -> нужная частота, Гц (0 — отключить, None — частота
+        автопилота по умолчанию) по подпискам, требованиям и фазе.
+        Сообщение, на которое есть подписка, никогда не отключается.
+        """
+        phase_rates = PHASE_RATES[self.phase]
+        desired = {}
+        for msg_type in self.registry.types():
+            # Подписка без частоты фазы: поток нужен, частота — по умолчанию автопилота
+            desired[msg_type] = phase_rates.get(msg_type)
+        with self._lock:
+            for msg_type, owners in self._requirements.items():
+                desired[msg_type] = max(desired.get(msg_type) or 0.0, max(owners.values()))
+
+        if self.disable_unused:
+            for msg_type in list(self._counts):
+                if msg_type not in desired and msg_type not in _NEVER_DISABLE:
+                    desired[msg_type] = 0.0
+        return desired
+
+    # ---------- отправка ----------
+
+    def apply(self) -> dict:
+        """
+        Отправить SET_MESSAGE_INTERVAL для сообщений, у которых нужная
+        частота отличается от подтверждённой. Возвращает {msg_type: Гц}
+        для изменённых; отказы — в self.failed.
+        """
+        with self._apply_lock:
+            return self._apply()
+
+    def _apply(self) -> dict:
+        changed = {}
+        for msg_type, rate_hz in self.desired_rates().items():
+            if self.requested.get(msg_type) == rate_hz:
+                continue
+            try:
+                set_message_interval(self.master, msg_type, rate_hz, self.timeout)
+            except CommandError as error:
+                self.failed[msg_type] = error
+                continue
+            self.failed.pop(msg_type, None)
+            self.requested[msg_type] = rate_hz
+            changed[msg_type] = rate_hz
+        return changed
+
+    # ---------- что получается ----------
+
+    def effective_rates(self) -> dict:
+        """
+        Фактические частоты сообщений, Гц, с прошлого вызова
+        (или с создания менеджера).
+        """
+        now = time.perf_counter()
+        elapsed = now - self._last_time
+        counts = dict(self._counts)
+        rates = {}
+        if elapsed > 0:
+            for msg_type, count in counts.items():
+                rates[msg_type] = (count - self._last_counts.get(msg_type, 0)) / elapsed
+        self._last_counts = counts
+        self._last_time = now
+        return rates
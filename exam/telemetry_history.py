@@ -0,0 +1,96 @@
+# telemetry_history.py
+#
+# История телеметрии фиксированного размера (кольцевой буфер на numpy).
+# Заполняется в monitor_loop, читается кем угодно: удержание высоты,
+# тренд батареи и т.п. больше не держат собственные растущие списки.
+
+import numpy as np
+
+from drone_monitor import DroneSnapshot
+
+# Одна запись истории
+HISTORY_DTYPE = np.dtype([
+    ("time", np.float64),                   # Время приёма, time.time()
+    ("lat_deg", np.float64),                # Широта, градусы
+    ("lon_deg", np.float64),                # Долгота, градусы
+    ("alt_rel_m", np.float32),              # Относительная высота, м
+    ("battery_voltage_v", np.float32),      # Напряжение батареи, В
+    ("battery_remaining_pct", np.float32),  # Остаток батареи, %
+])
+
+
+class TelemetryHistory:
+    """
+    Кольцевой буфер на capacity последних записей.
+
+    Каждая запись пишется дважды — в позицию i и i + capacity, поэтому
+    любые последние n <= capacity записей лежат в памяти подряд и
+    возвращаются срезом (view) без копирования. Память постоянна:
+    2 * capacity * HISTORY_DTYPE.itemsize байт.
+
+    Пишет один поток (monitor_loop). Возвращаемые view остаются верными,
+    пока не добавлено ещё capacity записей; если данные нужны дольше —
+    сделайте .copy().
+    """
+
+    def __init__(self, capacity: int = 36_000):  # 36000 = час при 10 Гц
+        self.capacity = capacity
+        self._buf = np.zeros(2 * capacity, dtype=HISTORY_DTYPE)
+        self._count = 0   # всего добавлено записей
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, snapshot: DroneSnapshot) -> None:
+        """
+        Добавить запись из снимка DroneState.
+        """
+        i = self._count % self.capacity
+        row = (snapshot.recv_time, snapshot.lat_deg, snapshot.lon_deg, snapshot.alt_rel_m,
+               snapshot.battery_voltage_v, snapshot.battery_remaining_pct)
+        self._buf[i] = row
+        self._buf[i + self.capacity] = row
+        self._count += 1  # публикуем запись только после того, как она записана
+
+    def latest(self, n: int = None) -> np.ndarray:
+        """
+        Последние n записей (все, если n не задан) — view, от старых к новым.
+        """
+        count = self._count
+        size = min(count, self.capacity)
+        if n is None or n > size:
+            n = size
+        end = count % self.capacity + self.capacity if count >= self.capacity else count
+        return self._buf[end - n:end]
+
+    def window(self, t_start: float, t_end: float = None) -> np.ndarray:
+        """
+        Записи с t_start <= time <= t_end — view, от старых к новым.
+        """
+        records = self.latest()
+        times = records["time"]
+        lo = np.searchsorted(times, t_start, side="left")
+        hi = len(records) if t_end is None else np.searchsorted(times, t_end, side="right")
+        return records[lo:hi]
+
+    def last_seconds(self, seconds: float) -> np.ndarray:
+        """
+        Записи за последние seconds секунд (по времени последней записи).
+        """
+        records = self.latest()
+        if len(records) == 0:
+            return records
+        return self.window(records["time"][-1] - seconds)
+
+    def rate(self, field: str, seconds: float) -> float:
+        """
+        Средняя скорость изменения поля за последние seconds секунд
+        (например, "battery_remaining_pct" -> %/с, "alt_rel_m" -> м/с).
+        """
+        records = self.last_seconds(seconds)
+        if len(records) < 2:
+            return 0.0
+        dt = records["time"][-1] - records["time"][0]
+        if dt <= 0:
+            return 0.0
+        return float(records[field][-1] - records[field][0]) / dt
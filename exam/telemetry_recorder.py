@@ -0,0 +1,121 @@
+# telemetry_recorder.py
+#
+# Запись всех принятых MAVLink-сообщений в файл .tlog для разбора полётов.
+# Поток приёма только кладёт пакет в очередь; на диск пишет фоновый поток
+# крупными блоками.
+
+from collections import deque
+import struct
+import threading
+
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+# Заголовок записи .tlog: время приёма в микросекундах, uint64 big-endian.
+# Такой формат читает mavutil.mavlink_connection("flight.tlog") и Mission Planner.
+_TLOG_TIMESTAMP = struct.Struct(">Q")
+
+
+class TelemetryRecorder:
+    """
+    Асинхронная запись .tlog.
+
+    recorder = TelemetryRecorder("flight.tlog")
+    recorder.attach(master)   # все сообщения master попадут в файл
+    ...
+    recorder.close()
+
+    Очередь ограничена max_queue пакетами: если диск не успевает,
+    новые пакеты отбрасываются и считаются в dropped, а поток приёма
+    никогда не ждёт.
+    """
+
+    def __init__(self, path: str,
+                 max_queue: int = 100_000,
+                 write_block_bytes: int = 1 << 20,
+                 flush_interval_s: float = 0.5):
+        self.path = path
+        self.max_queue = max_queue
+        self.write_block_bytes = write_block_bytes
+        self.flush_interval_s = flush_interval_s
+
+        self.recorded = 0   # Пакетов записано в файл
+        self.dropped = 0    # Пакетов отброшено из-за переполнения очереди
+        self.bytes_written = 0
+
+        # deque.append/popleft потокобезопасны и не берут блокировок в Python-коде,
+        # поэтому это дешевле queue.Queue на горячем пути.
+        self._queue = deque()
+        self._stop = threading.Event()
+        self._file = open(path, "ab")
+        self._thread = threading.Thread(target=self._writer_loop, name="tlog-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, msg) -> None:
+        """
+        Поставить сообщение в очередь на запись. Вызывается из потока приёма.
+        """
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append((msg._timestamp, msg.get_msgbuf()))
+
+    def _on_message(self, mav, msg) -> None:
+        # хук pymavlink: вызывается для каждого принятого сообщения
+        if msg.get_type() != 'BAD_DATA':
+            self.record(msg)
+
+    def attach(self, master: mavutil.mavlink_connection) -> None:
+        """
+        Записывать все сообщения, которые примет master (до фильтра recv_match).
+        """
+        if self._on_message not in master.message_hooks:
+            master.message_hooks.append(self._on_message)
+
+    def detach(self, master: mavutil.mavlink_connection) -> None:
+        if self._on_message in master.message_hooks:
+            master.message_hooks.remove(self._on_message)
+
+    def _drain(self) -> None:
+        """
+        Забрать всё из очереди и записать блоками по write_block_bytes.
+        """
+        queue = self._queue
+        pack = _TLOG_TIMESTAMP.pack
+        block = bytearray()
+        count = 0
+        while queue:
+            timestamp, msgbuf = queue.popleft()
+            block += pack(int(timestamp * 1e6))
+            block += msgbuf
+            count += 1
+            if len(block) >= self.write_block_bytes:
+                self._write(block, count)
+                block = bytearray()
+                count = 0
+        if block:
+            self._write(block, count)
+
+    def _write(self, block: bytearray, count: int) -> None:
+        self._file.write(block)
+        self.bytes_written += len(block)
+        self.recorded += count
+
+    def _writer_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval_s):
+            self._drain()
+            self._file.flush()
+        self._drain()
+
+    def close(self) -> None:
+        """
+        Дописать очередь и закрыть файл.
+        """
+        self._stop.set()
+        self._thread.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
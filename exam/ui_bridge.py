@@ -0,0 +1,125 @@
+# ui_bridge.py
+#
+# Мост между телеметрией и интерфейсом на Tkinter.
+# Tk можно трогать только из его собственного потока, а сообщения MAVLink
+# приходят в потоке мониторинга с частотой до сотен в секунду. Поэтому
+# интерфейс не получает каждое сообщение: раз в кадр (root.after) мост
+# берёт последний снимок DroneState и, если он изменился, перерисовывает
+# виджеты один раз. Стоимость интерфейса зависит от частоты кадров,
+# а не от частоты сообщений.
+# Команды (ARM, TAKEOFF, LAND) ждут COMMAND_ACK, поэтому выполняются в
+# отдельном потоке; результат возвращается в поток Tk на следующем кадре.
+#
+#   bridge = TelemetryBridge(root, state, fps=20)
+#   bridge.bind(lambda s: status_var.set(f"Высота {s.alt_rel_m:.1f} м"))
+#   btn_arm.config(command=lambda: bridge.run(flight_control.arm, master,
+#                                             on_done=lambda ack: log("ARM")))
+#   bridge.start()
+
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import time
+
+from drone_monitor import DroneState
+
+
+class TelemetryBridge:
+    """
+    Перерисовка интерфейса по последнему снимку с фиксированной частотой.
+
+    root: окно Tk (нужен только метод after).
+    state: DroneState, который обновляет monitor_loop / AsyncLink.
+    fps: частота кадров; за кадр каждая функция bind вызывается
+         не больше одного раза, и только если пришёл новый снимок.
+    """
+
+    def __init__(self, root, state: DroneState, fps: float = 20.0):
+        self.root = root
+        self.state = state
+        self.fps = fps
+
+        self.frames = 0       # Кадров (срабатываний after)
+        self.repaints = 0     # Кадров, в которых снимок изменился и была перерисовка
+        self.frame_time_s = 0.0   # Суммарное время работы кадров в потоке Tk
+
+        self._renderers = []
+        self._last_seq = None
+        self._after_id = None
+        # Один поток для команд: они выполняются по очереди, как нажаты кнопки
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-command")
+        self._results = queue.SimpleQueue()   # (callback, значение) для потока Tk
+
+    def bind(self, render) -> None:
+        """
+        render(snapshot) вызывается в потоке Tk при каждом новом снимке
+        (не чаще fps раз в секунду).
+        """
+        self._renderers.append(render)
+        self._last_seq = None   # новый обработчик должен получить текущее состояние
+
+    # ---------- кадры ----------
+
+    def start(self) -> None:
+        if self._after_id is None:
+            self._schedule()
+
+    def stop(self) -> None:
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=False)
+
+    def _schedule(self) -> None:
+        self._after_id = self.root.after(int(1000 / self.fps), self._tick)
+
+    def _tick(self) -> None:
+        try:
+            self.frame()
+        finally:
+            self._schedule()
+
+    def frame(self) -> bool:
+        """
+        Один кадр: результаты команд и перерисовка по новому снимку.
+        Возвращает True, если была перерисовка.
+        """
+        start = time.perf_counter()
+        self.frames += 1
+        while True:
+            try:
+                callback, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            callback(value)
+
+        snapshot = self.state.snapshot()
+        repainted = snapshot.seq != self._last_seq
+        if repainted:
+            # Все сообщения с прошлого кадра схлопнуты в один снимок
+            self._last_seq = snapshot.seq
+            self.repaints += 1
+            for render in self._renderers:
+                render(snapshot)
+        self.frame_time_s += time.perf_counter() - start
+        return repainted
+
+    # ---------- команды ----------
+
+    def run(self, fn, *args, on_done=None, on_error=None):
+        """
+        Выполнить fn(*args) (например flight_control.arm) вне потока Tk.
+        on_done(результат) или on_error(исключение) вызываются уже в потоке
+        Tk на ближайшем кадре. Возвращает concurrent.futures.Future.
+        """
+        future = self._executor.submit(fn, *args)
+
+        def deliver(done):
+            error = done.exception()
+            if error is None:
+                if on_done is not None:
+                    self._results.put((on_done, done.result()))
+            elif on_error is not None:
+                self._results.put((on_error, error))
+
+        future.add_done_callback(deliver)
+        return future
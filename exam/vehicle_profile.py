@@ -0,0 +1,164 @@
+# vehicle_profile.py
+#
+# Профиль аппарата: то, что не меняется от HEARTBEAT к HEARTBEAT
+# (таблицы режимов, ID, тип автопилота, прошивка, возможности).
+# Строится один раз на соединение и перестраивается только при смене
+# типа автопилота/аппарата или версии прошивки.
+
+from dataclasses import dataclass, field
+import weakref
+
+from pymavlink import mavutil  # для работы с протоколом MAVLink
+
+
+@dataclass(frozen=True)
+class VehicleProfile:
+    """
+    Неизменяемый снимок сведений об аппарате.
+    """
+    target_system: int = 0
+    target_component: int = 0
+    autopilot: int = mavutil.mavlink.MAV_AUTOPILOT_INVALID  # MAV_AUTOPILOT_* из HEARTBEAT
+    mav_type: int = 0                                       # MAV_TYPE_* из HEARTBEAT
+    firmware_version: int = 0   # flight_sw_version из AUTOPILOT_VERSION (0 = неизвестна)
+    capabilities: int = 0       # биты MAV_PROTOCOL_CAPABILITY_* (0 = неизвестны)
+
+    mode_map: dict = field(default_factory=dict)     # имя режима -> номер custom_mode
+    mode_names: dict = field(default_factory=dict)   # номер custom_mode -> имя режима
+
+    def has_capability(self, flag: int) -> bool:
+        return bool(self.capabilities & flag)
+
+
+# master -> {target_system: VehicleProfile}
+_profiles = weakref.WeakKeyDictionary()
+
+# Типы аппаратов, HEARTBEAT которых не означает «автопилот» (как в pymavlink)
+_NOT_VEHICLE_TYPES = frozenset([
+    mavutil.mavlink.MAV_TYPE_GCS,
+    mavutil.mavlink.MAV_TYPE_GIMBAL,
+    mavutil.mavlink.MAV_TYPE_ADSB,
+    mavutil.mavlink.MAV_TYPE_ONBOARD_CONTROLLER,
+])
+
+
+def is_vehicle_heartbeat(msg) -> bool:
+    """
+    HEARTBEAT автопилота, а не GCS, подвеса, камеры и т.п.
+    """
+    return (msg.type not in _NOT_VEHICLE_TYPES
+            and msg.autopilot != mavutil.mavlink.MAV_AUTOPILOT_INVALID
+            and msg.get_srcComponent() != mavutil.mavlink.MAV_COMP_ID_GIMBAL)
+
+
+def is_from_vehicle(master, msg) -> bool:
+    """
+    HEARTBEAT msg прислал сам аппарат master.target_system: автопилот
+    или компонент, к которому привязано соединение. HEARTBEAT подвеса
+    или компаньон-компьютера с тем же sysid профиль и режим не трогают.
+    """
+    return (msg.get_srcSystem() == master.target_system
+            and (is_vehicle_heartbeat(msg) or msg.get_srcComponent() == master.target_component))
+
+
+def _build(master, target_system: int, target_component: int,
+           autopilot: int, mav_type: int,
+           firmware_version: int = 0, capabilities: int = 0) -> VehicleProfile:
+    if autopilot == mavutil.mavlink.MAV_AUTOPILOT_PX4:
+        mode_map = dict(mavutil.px4_map)
+    else:
+        mode_map = mavutil.mode_mapping_byname(mav_type) or {}
+
+    profile = VehicleProfile(
+        target_system=target_system,
+        target_component=target_component,
+        autopilot=autopilot,
+        mav_type=mav_type,
+        firmware_version=firmware_version,
+        capabilities=capabilities,
+        mode_map=mode_map,
+        mode_names={mode_id: name for name, mode_id in mode_map.items()},
+    )
+    _profiles.setdefault(master, {})[target_system] = profile
+    return profile
+
+
+def get_profile(master: mavutil.mavlink_connection, target_system: int = None) -> VehicleProfile:
+    """
+    Профиль аппарата target_system (по умолчанию master.target_system).
+    Если HEARTBEAT ещё не обрабатывался, профиль строится по данным,
+    которые pymavlink уже собрал в соединении.
+    """
+    if target_system is None:
+        target_system = master.target_system
+    profile = _profiles.get(master, {}).get(target_system)
+    if profile is not None:
+        return profile
+
+    sysid_state = master.sysid_state.get(target_system)
+    mav_type = getattr(sysid_state, "mav_type", None)
+    if mav_type is None:
+        # HEARTBEAT от аппарата ещё не было — профиль пустой и не кэшируется
+        return VehicleProfile(target_system=target_system,
+                              target_component=master.target_component)
+
+    return _build(master, target_system, master.target_component,
+                  sysid_state.mav_autopilot, mav_type)
+
+
+def profile_from_heartbeat(master, msg) -> VehicleProfile:
+    """
+    Профиль для аппарата, приславшего HEARTBEAT msg.
+    Перестраивается только если сменился тип автопилота или аппарата;
+    HEARTBEAT не от автопилота (подвес, GCS, ...) профиль не меняет.
+    """
+    target_system = msg.get_srcSystem()
+    profile = _profiles.get(master, {}).get(target_system)
+    if profile is not None and profile.autopilot == msg.autopilot and profile.mav_type == msg.type:
+        return profile
+    if not is_vehicle_heartbeat(msg) and msg.get_srcComponent() != master.target_component:
+        return get_profile(master, target_system)
+
+    firmware_version = profile.firmware_version if profile else 0
+    capabilities = profile.capabilities if profile else 0
+    return _build(master, target_system, msg.get_srcComponent(),
+                  msg.autopilot, msg.type, firmware_version, capabilities)
+
+
+def profile_from_autopilot_version(master, msg) -> VehicleProfile:
+    """
+    Учесть AUTOPILOT_VERSION: прошивку и биты возможностей.
+    Профиль перестраивается только если они изменились.
+    """
+    target_system = msg.get_srcSystem()
+    profile = get_profile(master, target_system)
+    if profile.firmware_version == msg.flight_sw_version and profile.capabilities == msg.capabilities:
+        return profile
+
+    return _build(master, target_system, profile.target_component,
+                  profile.autopilot, profile.mav_type,
+                  msg.flight_sw_version, msg.capabilities)
+
+
+def invalidate_profile(master: mavutil.mavlink_connection, target_system: int = None) -> None:
+    """
+    Сбросить профиль (например, после перезагрузки автопилота).
+    """
+    if target_system is None:
+        target_system = master.target_system
+    _profiles.get(master, {}).pop(target_system, None)
+
+
+def request_autopilot_version(master: mavutil.mavlink_connection) -> None:
+    """
+    Попросить автопилот прислать AUTOPILOT_VERSION (прошивка, возможности).
+    Ответ обработает monitor_loop.
+    """
+    master.mav.command_long_send(
+        master.target_system,
+        master.target_component,
+        mavutil.mavlink.MAV_CMD_REQUEST_MESSAGE,
+        0,
+        mavutil.mavlink.MAVLINK_MSG_ID_AUTOPILOT_VERSION,
+        0, 0, 0, 0, 0, 0
+    )
@@ -1,3 +1,4 @@
+import threading
 import time
 from pymavlink import mavutil
 
@@ -5,15 +6,15 @@ TARGET_SYSTEM = 1  # ID дрона
 TARGET_COMPONENT = 1  # ID автопилота
 GUIDED_MODE = 4  # ID режима
 TARGET_HIG = 3  # целевая высота
-current_alt = 0  # высота для работы алгоритма
+ALT_TIMEOUT_S = 30  # сколько ждать набора высоты, с
 
 # Отправка команд
 
 
 def connect_to_autopilot(connection_string):
     print(f"Подключаемся к автопилоту по адресу: {connection_string}...")
-    master = mavutil.mavlink.connection(connection_string)
-    master = wait_hearbeat()
+    master = mavutil.mavlink_connection(connection_string)
+    master.wait_heartbeat()
     print("Соединение было установлено.")
     return master
 # Подключение к дрону
@@ -26,16 +27,54 @@ def send_command(master, command, param1=0, param7=0):
         command,
         0,
         param1,
+        0, 0, 0, 0, 0,
         param7
     )
-    return master.recv_match(type='COMMAND_ACK', blocking=True, timeout=5)
+    # Ждём ACK именно этой команды: ACK на другую команду пропускаем
+    return master.recv_match(type='COMMAND_ACK', blocking=True, timeout=5,
+                             condition=f'COMMAND_ACK.command=={command}')
+
+
+class AltitudeState:
+    """
+    Высота над home, которую обновляет поток мониторинга.
+    wait_until спит на условной переменной и просыпается на каждом
+    новом GLOBAL_POSITION_INT (как DroneState.wait_until в exam/).
+    """
+
+    def __init__(self):
+        self.alt_rel_m = 0.0
+        self._changed = threading.Condition()
+
+    def update(self, alt_rel_m):
+        with self._changed:
+            self.alt_rel_m = alt_rel_m
+            self._changed.notify_all()
+
+    def wait_until(self, predicate, timeout=None):
+        """
+        Ждать, пока predicate(self) не станет истинным.
+        Возвращает True или False по таймауту.
+        """
+        with self._changed:
+            return self._changed.wait_for(lambda: predicate(self), timeout)
+
+
+def monitor_altitude(master, state, stop_event):
+    """
+    Поток мониторинга: единственный читатель соединения во время набора высоты.
+    """
+    while not stop_event.is_set():
+        msg = master.recv_match(type='GLOBAL_POSITION_INT', blocking=True, timeout=1)
+        if msg:
+            state.update(msg.relative_alt / 1000)  # мм -> м
 
 
 # Миссия
 def simple_mission():
     # Подключение к симулятору
     print('Подключаемся к симулятору.')
-    connection_string = 'udp: 127:0:0:1:14550'
+    connection_string = 'udp:127.0.0.1:14550'
     master = connect_to_autopilot(connection_string)
     # Переключаем режим
     print('Переключаем режим.')
@@ -46,23 +85,26 @@ def simple_mission():
     # Арминг
     print('Армимся.')
     ack = send_command(
-        master, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, param1=0)
+        master, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, param1=1)
 
     # Взлет
     print('Взлетаем.')
     ack = send_command(
         master, mavutil.mavlink.MAV_CMD_NAV_TAKEOFF, param7=TARGET_HIG)
-    # Удержание высоты
+    # Удержание высоты: высоту читает поток мониторинга, основной поток
+    # спит, пока не придёт подходящее значение
     print('Пытаемся удержать высоту.')
-    while current_alt < TARGET_HIG * 0.98:
-        msg = master.recv_math(type='GLOBAL_POSITION_INT',
-                               blocking=True, timeout=1)
-        if msg:
-            current_alt = msg.relative_alt / 1000
-            print("Текущая высота:", current_alt)
-        if time.time() - start_time > 30:
-            print("Ошибка времени ожидания. Прерывание")
-            break
+    state = AltitudeState()
+    stop_event = threading.Event()
+    monitor_thread = threading.Thread(target=monitor_altitude,
+                                      args=(master, state, stop_event), daemon=True)
+    monitor_thread.start()
+    reached = state.wait_until(lambda s: s.alt_rel_m >= TARGET_HIG * 0.98, timeout=ALT_TIMEOUT_S)
+    stop_event.set()
+    monitor_thread.join(timeout=2.0)
+    print("Текущая высота:", state.alt_rel_m)
+    if not reached:
+        print("Ошибка времени ожидания. Прерывание")
     # Блок ожидания
     print("Ждем 5 секунд.")
     time.sleep(5)
@@ -75,5 +117,6 @@ def simple_mission():
     send_command(
         master, mavutil.mavlink.MAV_CMD_COMPONENT_ARM_DISARM, param1=0)
 
-    if __name__ == '__main__':
-        simple_mission()
+
+if __name__ == '__main__':
+    simple_mission()